@@ -1,65 +1,150 @@
 import importlib
-import inspect
 import types
 
-from aorta.backends import qpid_proton
 from aorta.backends.base import BaseMessagingBackend
 from aorta.backends.ireceiver import IReceiver
 from aorta.backends.isender import ISender
 
 
+#: Maps the names of the registered backends to the paths of their modules
+#: or classes. Backends are imported when they are first loaded.
+BACKENDS = {
+    'mock': 'aorta.backends.mock',
+    'qpid_proton': 'aorta.backends.qpid_proton',
+}
+
+#: The entry point group under which other packages provide backends.
+ENTRY_POINT_GROUP = 'aorta.backends'
+
+RESOLVED = {}
+ENTRY_POINTS = None
+
+
+def register(name, backend):
+    """Register `backend`, the path of a module or class or a backend
+    class, under `name`, so that it can be loaded by name.
+    """
+    BACKENDS[name] = backend
+    RESOLVED.pop(name, None)
+
+
+def get_entry_points():
+    """Return a dictionary mapping names to the entry points in the
+    :data:`ENTRY_POINT_GROUP` group. The entry points are looked up once.
+    """
+    global ENTRY_POINTS
+    if ENTRY_POINTS is None:
+        try:
+            from importlib.metadata import entry_points
+            try:
+                found = entry_points(group=ENTRY_POINT_GROUP)
+            except TypeError: # Python < 3.10
+                found = entry_points().get(ENTRY_POINT_GROUP, [])
+        except ImportError: # Python < 3.8
+            import pkg_resources
+            found = pkg_resources.iter_entry_points(ENTRY_POINT_GROUP)
+        ENTRY_POINTS = {x.name: x for x in found}
+    return ENTRY_POINTS
+
+
+def get_module_backend(module):
+    """Return the ``MessagingBackend`` class of `module`."""
+    if not hasattr(module, 'MessagingBackend'):
+        raise ImportError(
+            "{0} does not specify a MessagingBackend class"
+                .format(module)
+        )
+    if not isinstance(module.MessagingBackend, type)\
+    or not issubclass(module.MessagingBackend, BaseMessagingBackend):
+        raise TypeError("Invalid backend class.")
+    return module.MessagingBackend
+
+
+def import_backend(path):
+    """Import the backend class specified by `path`, which is the path of
+    a module holding a ``MessagingBackend`` attribute or the path of a
+    class.
+    """
+    try:
+        return get_module_backend(importlib.import_module(path))
+    except ImportError as e:
+        # Assume module path/class name
+        try:
+            module_name, class_name = path.rsplit('.', 1)
+        except ValueError:
+            raise e
+
+        module = importlib.import_module(module_name)
+        try:
+            return getattr(module, class_name)
+        except AttributeError:
+            raise ImportError("Module {0} has no attribute named {1}".format(module_name, class_name))
+
+
+def resolve(backend):
+    """Return the backend class specified by the string `backend`, which
+    is the name of a registered backend, the name of an entry point in
+    the :data:`ENTRY_POINT_GROUP` group, or the path of a module or class.
+    Resolved classes are cached.
+    """
+    try:
+        return RESOLVED[backend]
+    except KeyError:
+        pass
+
+    target = BACKENDS.get(backend)
+    if target is None:
+        entry_point = get_entry_points().get(backend)
+        target = entry_point.load() if entry_point is not None else backend
+    if isinstance(target, str):
+        target = import_backend(target)
+    elif isinstance(target, types.ModuleType):
+        target = get_module_backend(target)
+    if not isinstance(target, type) or not issubclass(target, BaseMessagingBackend):
+        raise TypeError("Invalid backend class.")
+    RESOLVED[backend] = target
+    return target
+
+
 def load(backend, *args, **kwargs):
-    """Loads a messaging backend given its module or class name.
+    """Loads a messaging backend given its name, module or class name.
 
-    Try to import `backend` as a module and get the `MessagingBackend`
-    attribute. If the import fails, assume that it is a combination
-    of module path/class name. If the import succeeds but the resulting
-    attribute does not inherit from :class:`~aorta.backends.base.MessagingBackend`,
-    raise a :exc:`TypeError`.
+    If `backend` is a string, resolve it to a backend class using
+    :func:`resolve`. If `backend` is a module, get its `MessagingBackend`
+    attribute. If the resulting attribute does not inherit from
+    :class:`~aorta.backends.base.BaseMessagingBackend`, raise a
+    :exc:`TypeError`.
 
     If `backend` is a class and inherits from the base backend class,
-    instantiate if. If `backend` is an instance of such a class, do
+    instantiate it with the positional arguments `args` and the keyword
+    arguments `kwargs`. If `backend` is an instance of such a class, do
     nothing.
 
     The :func:`load` function will always return an instance of a
     backend.
     """
-    INVALID_TYPE = TypeError("Invalid backend class.")
-    if isinstance(backend, types.ModuleType):
-        module = backend
-        if not hasattr(module, 'MessagingBackend'):
-            raise ImportError(
-                "{0} does not specify a MessagingBackend class"
-                    .format(backend)
-            )
-        if not inspect.isclass(module.MessagingBackend)\
-        or not issubclass(module.MessagingBackend, BaseMessagingBackend):
-            raise INVALID_TYPE
-
-        backend = load(module.MessagingBackend, *args, **kwargs)
-    elif isinstance(backend, str):
-        try:
-            module = importlib.import_module(backend)
-            backend = load(module)
-        except ImportError as e:
-            # Assume module path/class name
-            try:
-                module_name, class_name = backend.rsplit('.', 1)
-            except ValueError:
-                raise e
+    if isinstance(backend, str):
+        backend = resolve(backend)
+    elif isinstance(backend, types.ModuleType):
+        backend = get_module_backend(backend)
 
-            module = importlib.import_module(module_name)
-            try:
-                backend = load(getattr(module, class_name), *args, **kwargs)
-            except AttributeError:
-                raise ImportError("Module {0} has no attribute named {1}".format(module_name, class_name))
-    elif inspect.isclass(backend):
+    if isinstance(backend, type):
         if not issubclass(backend, BaseMessagingBackend):
-            raise INVALID_TYPE
+            raise TypeError("Invalid backend class.")
         backend = backend(*args, **kwargs)
-    elif isinstance(backend, BaseMessagingBackend):
-        pass
-    else:
-        raise INVALID_TYPE
+    elif not isinstance(backend, BaseMessagingBackend):
+        raise TypeError("Invalid backend class.")
 
     return backend
+
+
+def __getattr__(name):
+    # The backend modules are imported on first access, so that importing
+    # aorta does not import the AMQP libraries. Backends that can not be
+    # imported are reported as missing attributes.
+    if BACKENDS.get(name) == '{0}.{1}'.format(__name__, name):
+        try:
+            return importlib.import_module(BACKENDS[name])
+        except ImportError:
+            pass
+    raise AttributeError("module {0} has no attribute {1}".format(__name__, name))
@@ -0,0 +1,101 @@
+import asyncio
+import collections
+
+from aorta.backends import load
+
+
+class LoopBridge:
+    """Transfers the outcome of :class:`~aorta.backends.future.SendFuture`
+    objects to :class:`asyncio.Future` objects of an event loop.
+
+    Resolved futures are collected and transferred in batches, so that
+    the event loop is woken up at most once per batch instead of once
+    per message.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.__resolved = collections.deque()
+        self.__pending = False
+
+    def wrap(self, send_future):
+        """Return an :class:`asyncio.Future` that is resolved with the
+        outcome of `send_future`.
+        """
+        future = self.loop.create_future()
+        send_future.add_done_callback(
+            lambda send_future: self.__notify(send_future, future))
+        return future
+
+    def __notify(self, send_future, future):
+        self.__resolved.append((send_future, future))
+        if not self.__pending:
+            self.__pending = True
+            self.loop.call_soon_threadsafe(self.__transfer)
+
+    def __transfer(self):
+        self.__pending = False
+        while self.__resolved:
+            send_future, future = self.__resolved.popleft()
+            if future.done():
+                continue
+            try:
+                future.set_result(send_future.result(0))
+            except Exception as e:
+                future.set_exception(e)
+
+
+class AsyncMessagingBackend:
+    """Provides an :mod:`asyncio` interface to a messaging backend. The
+    coroutines of this class resolve when the remote peer settles the
+    message, without blocking the event loop.
+    """
+
+    def __init__(self, backend):
+        """Initialize a new :class:`AsyncMessagingBackend` instance.
+
+        Args:
+            backend: indicates the backend to use. May be a string pointing
+                to the module holding the backend, or an actual instance.
+        """
+        self.backend = load(backend)
+        self.__bridge = None
+
+    def get_bridge(self):
+        """Return the :class:`LoopBridge` for the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self.__bridge is None or self.__bridge.loop is not loop:
+            self.__bridge = LoopBridge(loop)
+        return self.__bridge
+
+    async def send_message(self, dsn, message, timeout=None, forward=False):
+        """Send a message to the specified `dsn` and wait until it is
+        accepted by the remote peer.
+
+        Returns:
+            The message identifier.
+
+        Raises:
+            aorta.exc.DeliveryFailed: the message was rejected, released
+                or timed out.
+        """
+        send_future = self.backend.send_message(dsn, message,
+            timeout=timeout, forward=forward)
+        return await self.get_bridge().wrap(send_future)
+
+    async def send_many(self, dsn, messages, timeout=None, forward=False):
+        """Send multiple messages to the specified `dsn` and wait until
+        all of them are settled by the remote peer.
+
+        Returns:
+            A list holding the message identifier or the exception for
+            each message, in the order of `messages`.
+        """
+        bridge = self.get_bridge()
+        send_futures = self.backend.send_many(dsn, messages,
+            timeout=timeout, forward=forward)
+        return await asyncio.gather(
+            *[bridge.wrap(x) for x in send_futures], return_exceptions=True)
+
+    def __getattr__(self, attname):
+        return getattr(self.backend, attname)
@@ -0,0 +1,151 @@
+import collections
+import itertools
+import time
+import zlib
+
+from aorta.backends.isender import ISender
+
+
+class BalancedSender(ISender):
+    """Spreads outgoing messages across multiple senders: the senders of
+    the nodes of a cluster, as listed by a DSN such as
+    ``amqp://h1:5672,h2:5672/channel``, and the senders of the links of
+    a sharded channel; see :meth:`~aorta.backends.base.BaseMessagingBackend.get_sender`.
+
+    The sender of each message is selected by a strategy:
+
+    - ``round_robin``: the senders take turns.
+    - ``least_in_flight``: the sender with the fewest messages that are
+      not yet settled.
+    - ``sticky``: the sender is selected by the key of the message, so
+      that messages with the same key are sent by the same sender, in
+      order. The key is a message property or a callable accepting the
+      message and returning a string. Messages without a key are sent
+      round robin.
+
+    Senders of which the connection is lost are skipped, so that messages
+    fail over to the other nodes immediately. Sticky keys are mapped to
+    senders with rendezvous hashing, so only the keys of an unavailable
+    sender move. If no sender is available, the strategy selects among
+    all senders. Messages that were already sent to a node when its
+    connection was lost are retransmitted when it reconnects.
+    """
+    strategies = ['round_robin', 'least_in_flight', 'sticky']
+
+    @property
+    def dsn(self):
+        return self.__dsn
+
+    @property
+    def senders(self):
+        return list(self.__senders)
+
+    @property
+    def available(self):
+        return any(x.available for x in self.__senders)
+
+    @property
+    def in_flight(self):
+        return sum(x.in_flight for x in self.__senders)
+
+    def __init__(self, dsn, senders, strategy='round_robin', key=None):
+        """Initialize a new :class:`BalancedSender` instance.
+
+        Args:
+            dsn: the DSN of the channel.
+            senders: a list holding the senders.
+            strategy: one of the strategies listed above.
+            key: the message property or callable providing the key of
+                the ``sticky`` strategy.
+        """
+        if strategy not in self.strategies:
+            raise ValueError("Invalid strategy: {0}".format(strategy))
+        if strategy == 'sticky' and key is None:
+            raise ValueError("The sticky strategy requires a key.")
+        self.__dsn = dsn
+        self.__senders = list(senders)
+        self.__seeds = {
+            sender: zlib.crc32("{0}#{1}".format(sender.dsn, i).encode())
+            for i, sender in enumerate(self.__senders)
+        }
+        self.__counter = itertools.count()
+        self.__key = key
+        self.__select = getattr(self, 'select_' + strategy)
+
+    def get_candidates(self):
+        candidates = [x for x in self.__senders if x.available]
+        return candidates or self.__senders
+
+    def get_key(self, message):
+        if callable(self.__key):
+            return self.__key(message)
+        return (message.get('properties') or {}).get(self.__key)
+
+    def select_round_robin(self, message):
+        candidates = self.get_candidates()
+        return candidates[next(self.__counter) % len(candidates)]
+
+    def select_least_in_flight(self, message):
+        return min(self.get_candidates(), key=lambda x: x.in_flight)
+
+    def select_sticky(self, message):
+        key = self.get_key(message)
+        if key is None:
+            return self.select_round_robin(message)
+        key = str(key).encode()
+        seeds = self.__seeds
+        return max(self.get_candidates(),
+            key=lambda x: zlib.crc32(key, seeds[x]))
+
+    def select(self, message):
+        """Return the sender of the node to which `message` is sent."""
+        return self.__select(message)
+
+    def destroy(self):
+        for sender in self.__senders:
+            sender.destroy()
+
+    def send(self, message, blocking=False, timeout=None, dsn=None):
+        """Sends a message to the node selected by the strategy. See
+        :meth:`aorta.backends.qpid_proton.sender.Sender.send`. The message
+        is recorded in the outbox of the backend under `dsn`, which
+        defaults to the DSN of the balanced sender, so that it is replayed
+        through the balanced sender.
+        """
+        return self.select(message).send(message, blocking=blocking,
+            timeout=timeout, dsn=dsn or self.__dsn)
+
+    def send_many(self, messages, blocking=False, timeout=None, recorded=False,
+        dsn=None):
+        """Sends multiple messages, spread across the nodes by the
+        strategy. The messages sent to the same node are passed to its
+        sender in a single batch, in order. See
+        :meth:`aorta.backends.qpid_proton.sender.Sender.send_many`.
+        """
+        futures = self.queue_many(messages, timeout=timeout, recorded=recorded,
+            dsn=dsn)
+        if blocking or timeout:
+            timeout = ((timeout or 0) / 1000) or None
+            deadline = time.monotonic() + timeout if timeout else None
+            for future in futures:
+                remaining = deadline - time.monotonic() if deadline else None
+                if not future.wait(remaining):
+                    break
+        return futures
+
+    def queue_many(self, messages, timeout=None, recorded=False, dsn=None):
+        """Like :meth:`send_many`, but return the futures without waiting
+        for the outcome of the send operations.
+        """
+        messages = list(messages)
+        batches = collections.OrderedDict()
+        for i, message in enumerate(messages):
+            batches.setdefault(self.select(message), []).append(i)
+
+        futures = [None] * len(messages)
+        for sender, indices in batches.items():
+            batch = sender.queue_many([messages[i] for i in indices],
+                timeout=timeout, recorded=recorded, dsn=dsn or self.__dsn)
+            for i, future in zip(indices, batch):
+                futures[i] = future
+        return futures
@@ -1,9 +1,21 @@
+import collections
+import functools
 import itertools
 import logging
-import re
+import operator
 import threading
-import uuid
-import queue
+import time
+
+from aorta.backends import ids
+from aorta.backends.balancer import BalancedSender
+from aorta.backends.dsn import parse_dsn
+from aorta.backends.dsn import parse_nodes
+from aorta.backends.dedup import DeduplicationWindow
+from aorta.backends.dispatch import DispatchQueue
+from aorta.backends.dispatch import Partitioner
+from aorta.backends.dispatch import PriorityDispatchQueue
+from aorta.backends.metrics import Metrics
+from aorta.event import LazyEvent
 
 
 EXC_NOTIMPLEMENTED = NotImplementedError("Subclasses must override this method.")
@@ -29,34 +41,153 @@ class BaseMessagingBackend:
 
     @property
     def deliveries(self):
-        return self.__deliveries
+        return self.__deliveries.value
+
+    @property
+    def deduplication(self):
+        return self.__deduplication
+
+    @property
+    def outbox(self):
+        return self.__outbox
+
+    @property
+    def metrics(self):
+        return self.__metrics
 
-    def __init__(self):
+    def __init__(self, deduplication=None, dispatchers=1, partition_key='receiver',
+        batch_size=64, outbox=None, metrics=None, message_ids='sortable',
+        priorities=None):
+        """Initialize a new messaging backend.
+
+        Args:
+            deduplication: a :class:`~aorta.backends.dedup.DeduplicationWindow`
+                shared by all receivers of the backend. If `deduplication`
+                is ``None``, a window with the default capacity is used.
+            dispatchers: the number of threads dispatching incoming
+                messages to the listeners.
+            partition_key: determines how incoming messages are assigned
+                to the dispatch threads; see :class:`~aorta.backends.dispatch.Partitioner`.
+                The order of messages with the same key is preserved.
+            batch_size: the maximum number of messages a dispatch thread
+                takes from its queue at once.
+            outbox: an :class:`~aorta.backends.outbox.Outbox` recording
+                outgoing messages until they are accepted. Pending messages
+                are sent again by :meth:`replay`.
+            metrics: the :class:`~aorta.backends.metrics.Metrics` to which
+                the backend reports. If `metrics` is ``None``, the backend
+                creates its own registry.
+            message_ids: the name of the :class:`~aorta.backends.ids.IdGenerator`
+                generating the identifiers of outgoing messages, or an
+                :class:`~aorta.backends.ids.IdGenerator` instance. Defaults
+                to time-sortable identifiers.
+            priorities: a dictionary mapping priorities to the weights of
+                their lanes in the queues of the dispatch threads, or ``None``
+                to dispatch messages in the order in which they are received.
+                The priority of a message is determined by its listener; see
+                :meth:`~aorta.listener.base.Listener.get_priority`. See
+                :class:`~aorta.backends.dispatch.PriorityDispatchQueue` for
+                how the lanes are scheduled. Messages with different
+                priorities may be dispatched out of order.
+        """
         self.__senders = {}
         self.__listeners = {}
         self.__receivers = {}
         self.__lock = threading.RLock()
-        self.__deliveries = 0
-        self.__incoming = queue.Queue()
-        self.__stopped = False
-        self.__thread = threading.Thread(target=self.__main__, daemon=True)
+        self.__metrics = metrics if metrics is not None else Metrics()
+        self.__deliveries = self.__metrics.counter('aorta_deliveries_total',
+            "Number of messages accepted by the remote peer.")
+        self.__partitioner = Partitioner(dispatchers, partition_key)
+        self.__priorities = priorities
+        if priorities is None:
+            self.__incoming = [DispatchQueue() for i in range(dispatchers)]
+        else:
+            self.__incoming = [PriorityDispatchQueue(priorities)
+                for i in range(dispatchers)]
+        self.__batch_size = batch_size
+        self.__threads = [
+            threading.Thread(target=self.__main__, args=[x], daemon=True)
+            for x in self.__incoming
+        ]
         self.__opts = {}
+        self.__deduplication = deduplication
+        if deduplication is None:
+            self.__deduplication = DeduplicationWindow()
+        self.__outbox = outbox
+        self.__generate_id = ids.get(message_ids)
+
+        self.__metrics.gauge('aorta_in_flight_messages',
+            lambda: sum(x.in_flight for x in self.senders.values()),
+            "Number of messages sent and not yet settled.")
+        self.__metrics.gauge('aorta_incoming_queue_depth',
+            lambda: sum(map(len, self.__incoming)),
+            "Number of received messages waiting to be dispatched.")
+        for priority in (priorities or {}):
+            self.__metrics.gauge('aorta_incoming_lane_depth',
+                functools.partial(self.__get_lane_depth, priority),
+                "Number of received messages waiting to be dispatched in a priority lane.",
+                priority=str(priority))
+        self.__metrics.gauge('aorta_duplicate_messages',
+            lambda: self.__deduplication.hits,
+            "Number of duplicate messages discarded.")
 
     def start(self):
-        self.__thread.start()
+        for thread in self.__threads:
+            thread.start()
+
+        # Creating a sender replays the pending messages for its DSN, so
+        # messages recorded before a crash are sent again.
+        if self.__outbox is not None:
+            dsns = [dsn for dsn, message in self.__outbox.pending()]
+            for dsn in collections.OrderedDict.fromkeys(dsns):
+                self.get_sender(dsn)
+
+    def replay(self):
+        """Send all messages in the :attr:`outbox` that were not accepted
+        by the remote peer again. Return the number of messages sent.
+
+        Pending messages are replayed automatically when the sender for
+        their DSN is created; see :meth:`get_sender`.
+        """
+        if self.__outbox is None:
+            return 0
+        pending = collections.OrderedDict()
+        for dsn, message in self.__outbox.pending():
+            pending.setdefault(dsn, []).append(message)
+        for dsn, messages in pending.items():
+            self.logger.info(
+                "Replaying {0} message(s) to {1}".format(len(messages), dsn))
+            self.get_sender(dsn).send_many(messages, recorded=True)
+        return sum(map(len, pending.values()))
 
     def is_running(self):
         """Return a boolean indicating if the backend is running and
         processing messages.
         """
-        return self.__thread.is_alive()
+        return any(thread.is_alive() for thread in self.__threads)
 
     def register_delivery(self):
-        with self.__lock:
-            self.__deliveries += 1
+        self.__deliveries.inc()
+
+    def is_duplicate(self, dsn, message_id):
+        """Return a boolean indicating if the message identified by
+        `message_id` was already received from `dsn`. Messages without
+        an identifier are never considered duplicates.
+        """
+        if message_id is None:
+            return False
+        return self.__deduplication.seen((dsn, message_id))
+
+    def forget_message(self, dsn, message_id):
+        """Forget that the message identified by `message_id` was received
+        from `dsn`, so that it is not considered a duplicate if it is
+        delivered again.
+        """
+        if message_id is not None:
+            self.__deduplication.forget((dsn, message_id))
 
     def generate_message_id(self):
-        return uuid.uuid4().hex
+        return self.__generate_id()
 
     def add_listener(self, listener):
         """Adds a new listener to the backend and include it in the
@@ -64,32 +195,109 @@ class BaseMessagingBackend:
         """
         listener.setup(self.listen)
         with self.__lock:
-            if listener.receiver_id in self.listeners:
+            if listener.receiver_id in self.__listeners:
                 # TODO: Handle the creation of duplicate listeners.
                 pass
 
-            self.__listeners[listener.receiver_id] = listener
+            # The listeners are replaced instead of updated, so that the
+            # dispatch threads can read them without acquiring the lock.
+            listeners = dict(self.__listeners)
+            listeners[listener.receiver_id] = listener
+            self.__listeners = listeners
+
+    def get(self, partition=0):
+        """Return the latest message in the queue of the specified
+        `partition`.
+        """
+        return self.__incoming[partition].get()
+
+    def put(self, receiver, message):
+        """Put a message on the incoming message queue of the partition
+        it is assigned to, in the lane of its priority if the backend
+        has priority lanes.
+        """
+        incoming = self.__incoming[self.__partitioner(receiver, message)]
+        if self.__priorities is None:
+            incoming.put((receiver, message))
+        else:
+            incoming.put((receiver, message), self.get_priority(receiver, message))
+
+    def get_priority(self, receiver, message):
+        """Return the priority of `message`, as determined by the listener
+        of `receiver`. Messages of orphaned receivers have priority 0.
+        """
+        listener = self.__listeners.get(receiver.receiver_id)
+        if listener is None:
+            return 0
+        return listener.get_priority(message)
 
-    def get(self):
-        """Return the latest message in the queue."""
-        return self.__incoming.get()
+    def __get_lane_depth(self, priority):
+        return sum(x.depth(priority) for x in self.__incoming)
 
-    def put(self, *args):
-        """Put a message on the incoming message queue."""
-        self.__incoming.put(args)
+    def configure(self, dsn, **options):
+        """Configure the sender for the specified `dsn`. The `options` are
+        passed as keyword arguments to :meth:`create_sender` and must be
+        provided before the first message is sent to `dsn`.
+        """
+        if options.get('links', 1) < 1:
+            raise ValueError("The number of links must be positive.")
+        with self.__lock:
+            if dsn in self.__senders:
+                raise RuntimeError(
+                    "Sender for {0} is already created.".format(dsn))
+            self.__opts.setdefault(dsn, {}).update(options)
 
     def get_sender(self, dsn):
-        """Get a sender for the specified Data Source Name (DSN) `dsn`."""
-        host, port, channel = re.match('^(.*)\:([0-9]{1,5})/(.*)$', dsn).groups()
+        """Get a sender for the specified Data Source Name (DSN) `dsn`.
+
+        If the backend has an :attr:`outbox`, a newly created sender first
+        sends the messages recorded for `dsn` that were not accepted by
+        the remote peer, for example before a crash.
+
+        If `dsn` lists multiple nodes, or the ``links`` option specified
+        with :meth:`configure` is greater than one, the sender is a
+        :class:`~aorta.backends.balancer.BalancedSender` spreading the
+        messages across ``links`` senders per node. Each link of a node
+        uses a separate connection. The ``strategy`` and ``key`` options
+        of the balanced sender are specified with :meth:`configure`, like
+        the options of the senders it creates.
+        """
+        sender = self.__senders.get(dsn)
+        if sender is not None:
+            return sender
+
+        nodes = parse_nodes(dsn)
+        pending = None
         with self.__lock:
             if dsn not in self.__senders:
-                self.__senders[dsn] = self.create_sender(host, port, channel)
+                # Take the pending messages before the sender is visible
+                # to other threads, so that new messages are not included.
+                if self.__outbox is not None:
+                    pending = [m for d, m in self.__outbox.pending() if d == dsn]
+                options = dict(self.__opts.get(dsn, {}))
+                links = options.pop('links', 1)
+                if len(nodes) == 1 and links == 1:
+                    sender = self.create_sender(*nodes[0], **options)
+                else:
+                    balancing = {k: options.pop(k)
+                        for k in ('strategy', 'key') if k in options}
+                    senders = [
+                        self.create_sender(*node, connection=i, **options)
+                        for node in nodes for i in range(links)
+                    ]
+                    sender = BalancedSender(dsn, senders, **balancing)
+                self.__senders[dsn] = sender
             sender = self.__senders[dsn]
+
+        if pending:
+            self.logger.info(
+                "Replaying {0} message(s) to {1}".format(len(pending), dsn))
+            sender.send_many(pending, recorded=True)
         return sender
 
     def listen(self, dsn, options=None):
         """Listen for messages coming from the specified `dsn`."""
-        host, port, channel = re.match('^(.*)\:([0-9]{1,5})/(.*)$', dsn).groups()
+        host, port, channel = parse_dsn(dsn)
         with self.__lock:
             if dsn not in self.__receivers:
                 self.__receivers[dsn] = self\
@@ -99,6 +307,12 @@ class BaseMessagingBackend:
                 # to be reconfiguring the connection options.
                 pass
             receiver = self.__receivers[dsn]
+
+        # Wait for the receiver outside of the lock, so that an unreachable
+        # server does not block the creation of other senders and receivers.
+        if not receiver.wait():
+            self.logger.warning("Receiver (id: {0}) is not attached to {1}"
+                .format(receiver.receiver_id, dsn))
         return receiver
 
     def _create_receiver(self, host, port, channel, *args, **kwargs):
@@ -115,45 +329,117 @@ class BaseMessagingBackend:
         Args:
             dsn: a string specifying the host, port and channel.
             message: the message to send.
+            block: a boolean indicating if the call must block until the
+                outcome of the send operation is known.
+            timeout: the number of milliseconds after which the send
+                operation times out.
             forward: a boolean indicating is the message is being forwared.
 
         Returns:
-            None
+            aorta.backends.future.SendFuture
         """
         if message.id is None and not forward:
             message.id = self.generate_message_id()
         sender = self.get_sender(dsn)
-        return sender.send(message, blocking=block, timeout=timeout)
+        return sender.send(message, blocking=block, timeout=timeout, dsn=dsn)
+
+    def send_many(self, dsn, messages, block=False, timeout=None, forward=False):
+        """Send multiple messages to the specified `channel` in a single
+        batch.
+
+        Args:
+            dsn: a string specifying the host, port and channel.
+            messages: an iterable of messages to send.
+            block: a boolean indicating if the call must block until the
+                outcome of all send operations is known.
+            timeout: the number of milliseconds after which the send
+                operations time out.
+            forward: a boolean indicating is the messages are being forwared.
+
+        Returns:
+            A list of :class:`~aorta.backends.future.SendFuture` objects
+            in the order of `messages`.
+        """
+        messages = list(messages)
+        if not forward:
+            for message in messages:
+                if message.id is None:
+                    message.id = self.generate_message_id()
+        sender = self.get_sender(dsn)
+        return sender.send_many(messages, blocking=block, timeout=timeout,
+            dsn=dsn)
 
     def destroy(self):
         handlers = itertools.chain(self.senders.values(), self.receivers.values())
         for handler in handlers:
             handler.destroy()
 
-        self.__stopped = True
-        if self.__thread.is_alive():
-            self.__thread.join()
+        if self.__outbox is not None:
+            self.__outbox.close()
+
+        for listener in self.__listeners.values():
+            listener.close()
+        for incoming in self.__incoming:
+            incoming.close()
+        for thread in self.__threads:
+            if thread.is_alive():
+                thread.join()
 
     def dispatch(self, receiver, message):
-        """Dispatches a message to the appropriate listener."""
-        try:
-            with self.__lock:
-                listener = self.listeners.get(receiver.receiver_id)
-            if listener is None:
-                self.logger.warning(
-                    "Orphaned receiver (id: {0})".format(receiver.receiver_id))
-                return
-
-            listener.dispatch(message)
-        except Exception:
-            self.logger.exception("Caught fatal exception")
-
-    def __main__(self):
-        while True:
+        """Dispatches a message to the appropriate listener; see
+        :meth:`dispatch_batch`.
+        """
+        self.dispatch_batch([(receiver, message)])
+
+    def dispatch_batch(self, batch):
+        """Dispatches a batch of ``(receiver, message)`` tuples to the
+        appropriate listeners. Consecutive messages from the same receiver
+        are passed to :meth:`~aorta.listener.base.Listener.dispatch_batch`
+        in a single call. Messages that the listener does not subscribe
+        to are discarded before they are decoded.
+
+        The receiver is notified of the messages that the listener failed
+        to dispatch with :meth:`~aorta.backends.ireceiver.IReceiver.notify_failed`,
+        and of all messages with :meth:`~aorta.backends.ireceiver.IReceiver.notify_dispatched`.
+        """
+        listeners = self.__listeners
+        for receiver, items in itertools.groupby(batch, operator.itemgetter(0)):
+            messages = [message for _, message in items]
+            failed = messages
             try:
-                receiver, msg = self.__incoming.get(True, 0.1)
-            except queue.Empty:
-                if self.__stopped:
-                    break
-            else:
-                self.dispatch(receiver, msg)
+                listener = listeners.get(receiver.receiver_id)
+                if listener is None:
+                    self.logger.warning(
+                        "Orphaned receiver (id: {0})".format(receiver.receiver_id))
+                    continue
+
+                failed = []
+                subscribed = [x for x in messages if listener.is_subscribed(x)]
+                if subscribed:
+                    started = time.monotonic()
+                    failed = listener.dispatch_batch(receiver.decode(subscribed)) or []
+                    self.__metrics.histogram('aorta_dispatch_seconds',
+                        "Time spent dispatching a batch of messages to a listener.",
+                        listener=listener.receiver_id)\
+                        .observe(time.monotonic() - started)
+                    self.__metrics.counter('aorta_dispatched_messages_total',
+                        "Number of messages dispatched to a listener.",
+                        listener=listener.receiver_id)\
+                        .inc(len(subscribed))
+            except Exception:
+                self.logger.exception("Caught fatal exception")
+                failed = messages
+            finally:
+                if failed:
+                    receiver.notify_failed([
+                        x.message if isinstance(x, LazyEvent) else x
+                        for x in failed
+                    ])
+                receiver.notify_dispatched(messages)
+
+    def __main__(self, incoming):
+        while True:
+            batch = incoming.get_batch(self.__batch_size)
+            if not batch:
+                break
+            self.dispatch_batch(batch)
@@ -0,0 +1,99 @@
+import json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class Codec:
+    """Encodes and decodes message bodies. Messages with an encoded body
+    carry the :attr:`content_type` of the codec, which is used by the
+    receiving side to select the codec to decode the body with.
+    """
+
+    #: The name under which the codec is registered.
+    name = None
+
+    #: The content type of encoded message bodies, or ``None`` if the
+    #: body is passed to the backend as-is.
+    content_type = None
+
+    def encode(self, body):
+        return body
+
+    def decode(self, body):
+        return body
+
+
+class AMQPCodec(Codec):
+    """Passes message bodies to the backend as-is, so that they are
+    encoded using the native AMQP type system.
+    """
+    name = 'amqp'
+
+
+class JSONCodec(Codec):
+    """Encodes message bodies as JSON."""
+    name = 'json'
+    content_type = 'application/json'
+
+    def encode(self, body):
+        return json.dumps(body, separators=(',', ':')).encode('utf-8')
+
+    def decode(self, body):
+        # Backends may return binary data as a memoryview.
+        return json.loads(bytes(body))
+
+
+class MsgpackCodec(Codec):
+    """Encodes message bodies using MessagePack. Requires the ``msgpack``
+    package.
+    """
+    name = 'msgpack'
+    content_type = 'application/msgpack'
+
+    def encode(self, body):
+        return msgpack.packb(body, use_bin_type=True)
+
+    def decode(self, body):
+        return msgpack.unpackb(body, raw=False)
+
+
+CODECS = {}
+CONTENT_TYPES = {}
+
+
+def register(codec):
+    """Register `codec` by its name and content type."""
+    CODECS[codec.name] = codec
+    if codec.content_type is not None:
+        CONTENT_TYPES[codec.content_type] = codec
+
+
+def get(codec=None):
+    """Return the codec specified by `codec`, which is either a registered
+    name or a :class:`Codec` instance. If `codec` is ``None``, return the
+    default codec.
+    """
+    if codec is None:
+        return CODECS[AMQPCodec.name]
+    if isinstance(codec, Codec):
+        return codec
+    try:
+        return CODECS[codec]
+    except KeyError:
+        raise LookupError("Unknown codec: {0}".format(codec))
+
+
+def get_by_content_type(content_type):
+    """Return the codec for `content_type`, or ``None`` if there is no
+    codec registered for `content_type`.
+    """
+    return CONTENT_TYPES.get(content_type)
+
+
+register(AMQPCodec())
+register(JSONCodec())
+if msgpack is not None:
+    register(MsgpackCodec())
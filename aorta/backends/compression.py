@@ -0,0 +1,102 @@
+import zlib
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class Compressor:
+    """Compresses and decompresses encoded message bodies. Messages with
+    a compressed body carry the :attr:`name` of the compressor as their
+    content encoding, which is used by the receiving side to select the
+    compressor to decompress the body with.
+    """
+
+    #: The content encoding of compressed message bodies.
+    name = None
+
+    def compress(self, data):
+        raise NotImplementedError("Subclasses must override this method.")
+
+    def decompress(self, data):
+        raise NotImplementedError("Subclasses must override this method.")
+
+
+class ZlibCompressor(Compressor):
+    """Compresses message bodies using :mod:`zlib`."""
+    name = 'deflate'
+
+    def __init__(self, level=6):
+        self.level = level
+
+    def compress(self, data):
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data):
+        return zlib.decompress(data)
+
+
+class LZ4Compressor(Compressor):
+    """Compresses message bodies using the LZ4 frame format. Requires
+    the ``lz4`` package.
+    """
+    name = 'lz4'
+
+    def compress(self, data):
+        return lz4.frame.compress(data)
+
+    def decompress(self, data):
+        return lz4.frame.decompress(data)
+
+
+class ZstdCompressor(Compressor):
+    """Compresses message bodies using Zstandard. Requires the
+    ``zstandard`` package.
+    """
+    name = 'zstd'
+
+    def compress(self, data):
+        return zstandard.ZstdCompressor().compress(data)
+
+    def decompress(self, data):
+        return zstandard.ZstdDecompressor().decompress(data)
+
+
+COMPRESSORS = {}
+
+
+def register(compressor):
+    """Register `compressor` by its name."""
+    COMPRESSORS[compressor.name] = compressor
+
+
+def get(compressor):
+    """Return the compressor specified by `compressor`, which is either
+    a registered name or a :class:`Compressor` instance.
+    """
+    if isinstance(compressor, Compressor):
+        return compressor
+    try:
+        return COMPRESSORS[compressor]
+    except KeyError:
+        raise LookupError("Unknown compressor: {0}".format(compressor))
+
+
+def get_by_encoding(content_encoding):
+    """Return the compressor for `content_encoding`, or ``None`` if there
+    is no compressor registered for `content_encoding`.
+    """
+    return COMPRESSORS.get(content_encoding)
+
+
+register(ZlibCompressor())
+if lz4 is not None:
+    register(LZ4Compressor())
+if zstandard is not None:
+    register(ZstdCompressor())
@@ -0,0 +1,173 @@
+import collections
+import heapq
+import itertools
+import threading
+import time
+
+from aorta.backends import ids
+
+
+class DeduplicationWindow:
+    """Remembers the keys of recently received messages in order to
+    suppress duplicate deliveries.
+
+    The window is bounded both in size and in time: at most `capacity`
+    keys are remembered and, if `ttl` is specified, keys that have not
+    been seen for `ttl` seconds are forgotten. Lookups and insertions
+    are O(1).
+
+    If the keys carry the time at which they were created, such as the
+    identifiers generated by :class:`~aorta.backends.ids.SortableIdGenerator`,
+    the window may be ordered by that time instead; see the `timestamp`
+    argument. Keys are then forgotten `ttl` seconds after they were
+    created, regardless of the order in which they are received, so
+    the window does not need a fixed-size history. Keys created before
+    the window are not remembered and never considered duplicates.
+    Keys that claim to be created more than `skew` seconds in the future,
+    such as random identifiers, are timestamped with the current time.
+    Insertions are O(log n).
+    """
+
+    @property
+    def hits(self):
+        """The number of duplicates detected by the window."""
+        return self.__hits
+
+    @property
+    def misses(self):
+        """The number of keys that were not seen before."""
+        return self.__misses
+
+    def __init__(self, capacity=2000, ttl=None, clock=None, timestamp=None,
+        skew=60.0):
+        """Initialize a new :class:`DeduplicationWindow` instance.
+
+        Args:
+            capacity: the maximum number of keys to remember, or ``None``
+                to bound the window by `ttl` only.
+            ttl: the number of seconds after which a key is forgotten,
+                or ``None`` to bound the window by `capacity` only.
+            clock: a callable returning the current time in seconds.
+                Defaults to :func:`time.monotonic`, or :func:`time.time`
+                if `timestamp` is specified.
+            timestamp: a callable accepting a key and returning the time
+                at which it was created, in seconds since the epoch, such
+                as :func:`get_message_timestamp`. If specified, keys are
+                expired and evicted in the order of their timestamps.
+                Keys for which `timestamp` raises :exc:`TypeError` or
+                :exc:`ValueError` are timestamped with the current time.
+            skew: the number of seconds by which the clock of a sender may
+                run ahead of `clock`.
+        """
+        if capacity is None and ttl is None:
+            raise ValueError("The window must be bounded by capacity or ttl.")
+        if capacity is not None and capacity < 1:
+            raise ValueError("The capacity must be a positive integer.")
+        self.capacity = capacity
+        self.ttl = ttl
+        self.clock = clock or (time.time if timestamp else time.monotonic)
+        self.timestamp = timestamp
+        self.skew = skew
+        self.__keys = collections.OrderedDict()
+        self.__heap = []
+        self.__counter = itertools.count()
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+
+    def __len__(self):
+        return len(self.__keys)
+
+    def __contains__(self, key):
+        with self.__lock:
+            self.__expire(self.clock())
+            return key in self.__keys
+
+    def seen(self, key):
+        """Return a boolean indicating if `key` was seen before and
+        remember it.
+        """
+        now = self.clock()
+        with self.__lock:
+            self.__expire(now)
+            if key in self.__keys:
+                if self.timestamp is None:
+                    self.__keys.move_to_end(key)
+                    self.__keys[key] = now
+                self.__hits += 1
+                return True
+
+            self.__misses += 1
+            if self.timestamp is None:
+                self.__keys[key] = now
+            elif not self.__push(key, now):
+                return False
+            if self.capacity is not None and len(self.__keys) > self.capacity:
+                self.__evict()
+            return False
+
+    def forget(self, key):
+        """Forget `key`, so that it is not considered a duplicate when
+        it is seen again.
+        """
+        with self.__lock:
+            self.__keys.pop(key, None)
+
+    def clear(self):
+        """Forget all keys."""
+        with self.__lock:
+            self.__keys.clear()
+            self.__heap = []
+
+    def __push(self, key, now):
+        try:
+            created = self.timestamp(key)
+        except (TypeError, ValueError):
+            created = now
+        if created > now + self.skew:
+            created = now
+        if self.ttl is not None and created <= now - self.ttl:
+            return False
+        self.__keys[key] = created
+
+        # The counter breaks ties, so that keys are never compared.
+        heapq.heappush(self.__heap, (created, next(self.__counter), key))
+        return True
+
+    def __evict(self):
+        if self.timestamp is None:
+            self.__keys.popitem(last=False)
+            return
+        # Forgotten keys remain in the heap until they are popped.
+        while self.__heap:
+            created, _, key = heapq.heappop(self.__heap)
+            if self.__keys.get(key) == created:
+                del self.__keys[key]
+                return
+
+    def __expire(self, now):
+        if self.ttl is None:
+            return
+        keys = self.__keys
+        threshold = now - self.ttl
+        if self.timestamp is not None:
+            heap = self.__heap
+            while heap and heap[0][0] <= threshold:
+                created, _, key = heapq.heappop(heap)
+                if keys.get(key) == created:
+                    del keys[key]
+            return
+        while keys:
+            key, timestamp = next(iter(keys.items()))
+            if timestamp > threshold:
+                break
+            keys.popitem(last=False)
+
+
+def get_message_timestamp(key):
+    """Return the time at which the message identified by the
+    ``(dsn, message_id)`` key of the deduplication window of a backend
+    was sent, assuming that the sender generates time-sortable identifiers
+    with :class:`~aorta.backends.ids.SortableIdGenerator`.
+    """
+    return ids.get('sortable').timestamp(key[1])
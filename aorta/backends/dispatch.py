@@ -0,0 +1,255 @@
+import bisect
+import collections
+import threading
+
+
+class DispatchQueue:
+    """A FIFO queue holding incoming messages until they are dispatched.
+
+    Consumers are woken up when messages arrive and drain them in
+    batches with :meth:`get_batch`, so that there is a single lock
+    round-trip per batch instead of per message. :meth:`close` wakes
+    up all consumers, which then drain the remaining messages and stop.
+    """
+
+    @property
+    def closed(self):
+        return self.__closed
+
+    def __init__(self):
+        self.__items = collections.deque()
+        self.__condition = threading.Condition(threading.Lock())
+        self.__closed = False
+
+    def __len__(self):
+        return len(self.__items)
+
+    def put(self, item):
+        """Append `item` to the queue and wake up a consumer."""
+        with self.__condition:
+            self.__items.append(item)
+            self.__condition.notify()
+
+    def get(self):
+        """Remove and return the oldest item, blocking until an item
+        is available.
+        """
+        with self.__condition:
+            while not self.__items:
+                self.__condition.wait()
+            return self.__items.popleft()
+
+    def get_batch(self, maxsize):
+        """Remove and return up to `maxsize` items, blocking until at
+        least one item is available. Return an empty list if the queue
+        is closed and all items are drained.
+        """
+        with self.__condition:
+            items = self.__items
+            while not items:
+                if self.__closed:
+                    return []
+                self.__condition.wait()
+            if len(items) <= maxsize:
+                batch = list(items)
+                items.clear()
+            else:
+                batch = [items.popleft() for i in range(maxsize)]
+            return batch
+
+    def close(self):
+        """Close the queue and wake up all consumers."""
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+
+
+class Lane:
+    """Holds the items of a priority of a :class:`PriorityDispatchQueue`."""
+    __slots__ = ['priority', 'weight', 'items', 'deficit']
+
+    def __init__(self, priority, weight):
+        self.priority = priority
+        self.weight = weight
+        self.items = collections.deque()
+        self.deficit = 0
+
+
+class PriorityDispatchQueue:
+    """A queue holding incoming messages in priority lanes until they are
+    dispatched. Items are FIFO-ordered within a lane.
+
+    Consumers take items from the lanes with deficit round robin: each
+    round visits the non-empty lanes from the highest to the lowest
+    priority and takes up to `weight` items from each lane. While all
+    lanes are backlogged, each lane receives a share of the consumers
+    proportional to its weight, so urgent items do not wait behind the
+    backlog of the other lanes and the lowest lane is never starved.
+
+    Like :class:`DispatchQueue`, :meth:`close` wakes up all consumers,
+    which then drain the remaining items and stop.
+    """
+
+    @property
+    def closed(self):
+        return self.__closed
+
+    def __init__(self, lanes):
+        """Initialize a new :class:`PriorityDispatchQueue` instance.
+
+        Args:
+            lanes: a dictionary mapping the priorities of the lanes to
+                their weights, which are positive integers. Items with
+                an unknown priority are queued in the lane with the
+                highest priority below it, or in the lowest lane.
+        """
+        if not lanes:
+            raise ValueError("The queue must have at least one lane.")
+        if any(not isinstance(x, int) or x < 1 for x in lanes.values()):
+            raise ValueError("The weights of the lanes must be positive integers.")
+        self.__lanes = [Lane(priority, weight)
+            for priority, weight in sorted(lanes.items(), reverse=True)]
+        self.__priorities = [-x.priority for x in self.__lanes]
+        self.__index = {x.priority: x for x in self.__lanes}
+        self.__position = 0
+        self.__granted = False
+        self.__size = 0
+        self.__condition = threading.Condition(threading.Lock())
+        self.__closed = False
+
+    def __len__(self):
+        return self.__size
+
+    def depth(self, priority):
+        """Return the number of items in the lane of `priority`."""
+        return len(self.get_lane(priority).items)
+
+    def get_lane(self, priority):
+        """Return the :class:`Lane` holding items with `priority`."""
+        try:
+            return self.__index[priority]
+        except KeyError:
+            pass
+        position = bisect.bisect_left(self.__priorities, -priority)
+        lane = self.__lanes[min(position, len(self.__lanes) - 1)]
+
+        # The index is replaced instead of updated, so that producers
+        # can read it without acquiring the lock.
+        index = dict(self.__index)
+        index[priority] = lane
+        self.__index = index
+        return lane
+
+    def put(self, item, priority=0):
+        """Append `item` to the lane of `priority` and wake up a consumer."""
+        lane = self.get_lane(priority)
+        with self.__condition:
+            lane.items.append(item)
+            self.__size += 1
+            self.__condition.notify()
+
+    def get(self):
+        """Remove and return the next item, blocking until an item
+        is available.
+        """
+        with self.__condition:
+            while not self.__size:
+                self.__condition.wait()
+            return self.__take(1)[0]
+
+    def get_batch(self, maxsize):
+        """Remove and return up to `maxsize` items, blocking until at
+        least one item is available. Return an empty list if the queue
+        is closed and all items are drained.
+        """
+        with self.__condition:
+            while not self.__size:
+                if self.__closed:
+                    return []
+                self.__condition.wait()
+            return self.__take(maxsize)
+
+    def close(self):
+        """Close the queue and wake up all consumers."""
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+
+    def __take(self, maxsize):
+        batch = []
+        lanes = self.__lanes
+        while len(batch) < maxsize and self.__size:
+            lane = lanes[self.__position]
+            items = lane.items
+            if items and not self.__granted:
+                lane.deficit += lane.weight
+                self.__granted = True
+            count = min(lane.deficit, len(items), maxsize - len(batch))
+            if count == len(items):
+                batch.extend(items)
+                items.clear()
+            else:
+                batch.extend(items.popleft() for i in range(count))
+            lane.deficit -= count
+            self.__size -= count
+
+            # A lane keeps its turn if the batch is full before its quantum
+            # is spent, so the next batch continues with it. Empty lanes
+            # lose their deficit, so they cannot save up for a burst.
+            if not items:
+                lane.deficit = 0
+            if not lane.deficit:
+                self.__position = (self.__position + 1) % len(lanes)
+                self.__granted = False
+        return batch
+
+
+class Partitioner:
+    """Assigns incoming messages to the partitions of the dispatch
+    threads of a backend. Messages with the same key are always assigned
+    to the same partition, so that their order is preserved, while
+    messages with different keys may be dispatched concurrently.
+
+    The key is either one of the predefined keys:
+
+    - ``receiver``: the receiver that received the message.
+    - ``event_type``: the ``event_type`` message property.
+    - ``sender_id``: the ``sender_id`` message property.
+
+    or a callable accepting the receiver and the message as its
+    positional arguments and returning a hashable object.
+    """
+    keys = ['receiver', 'event_type', 'sender_id']
+
+    def __init__(self, partitions=1, key='receiver'):
+        """Initialize a new :class:`Partitioner` instance.
+
+        Args:
+            partitions: the number of partitions.
+            key: one of the predefined keys or a callable.
+        """
+        if partitions < 1:
+            raise ValueError("The number of partitions must be positive.")
+        if not callable(key) and key not in self.keys:
+            raise ValueError("Invalid partition key: {0}".format(key))
+        self.partitions = partitions
+        self.key = key
+        if key == 'receiver':
+            self.get_key = self.get_receiver_key
+        elif callable(key):
+            self.get_key = key
+        else:
+            self.get_key = self.get_property_key
+
+    def get_receiver_key(self, receiver, message):
+        return receiver.receiver_id
+
+    def get_property_key(self, receiver, message):
+        properties = getattr(message, 'properties', None) or {}
+        return properties.get(self.key)
+
+    def __call__(self, receiver, message):
+        """Return the partition index for `message`."""
+        if self.partitions == 1:
+            return 0
+        return hash(self.get_key(receiver, message)) % self.partitions
@@ -0,0 +1,60 @@
+import collections
+import functools
+import re
+
+
+class DSN(collections.namedtuple('DSN', ['host', 'port', 'channel'])):
+    """A parsed Data Source Name (DSN) of the form ``host:port/channel``,
+    identifying an AMQP 1.0 server and a channel. Use :func:`parse_dsn` to
+    obtain instances.
+    """
+    __slots__ = []
+
+    @property
+    def address(self):
+        return "{0}:{1}".format(self.host, self.port)
+
+    def __str__(self):
+        return "{0}/{1}".format(self.address, self.channel)
+
+
+#: The optional scheme of a DSN.
+SCHEME = 'amqp://'
+
+NODE_PATTERN = re.compile(r'^(.+)\:([0-9]{1,5})$')
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_nodes(dsn):
+    """Parse the string `dsn`, which may list multiple comma-separated
+    nodes of a cluster, such as ``amqp://h1:5672,h2:5672/channel``, into
+    a tuple of :class:`DSN` objects; one per node. Parsed DSNs are cached.
+    Raise :exc:`ValueError` if `dsn` is not a valid DSN.
+    """
+    if isinstance(dsn, DSN):
+        return (dsn,)
+    spec = dsn[len(SCHEME):] if dsn.startswith(SCHEME) else dsn
+    hosts, sep, channel = spec.partition('/')
+    if not sep:
+        raise ValueError("Invalid DSN: {0}".format(dsn))
+    nodes = []
+    for host in hosts.split(','):
+        match = NODE_PATTERN.match(host)
+        if match is None:
+            raise ValueError("Invalid DSN: {0}".format(dsn))
+        nodes.append(DSN(match.group(1), int(match.group(2)), channel))
+    return tuple(nodes)
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_dsn(dsn):
+    """Parse the string `dsn` into a :class:`DSN` object. Parsed DSNs are
+    cached. Raise :exc:`ValueError` if `dsn` is not a valid DSN or lists
+    multiple nodes; see :func:`parse_nodes`.
+    """
+    if isinstance(dsn, DSN):
+        return dsn
+    nodes = parse_nodes(dsn)
+    if len(nodes) > 1:
+        raise ValueError("DSN lists multiple nodes: {0}".format(dsn))
+    return nodes[0]
@@ -0,0 +1,99 @@
+import logging
+
+from aorta.exc import MessageRejected
+from aorta.exc import MessageReleased
+from aorta.exc import SendTimeout
+
+
+class SendFuture:
+    """Represents the outcome of sending a message. A :class:`SendFuture`
+    is resolved when the remote peer accepts, rejects or releases the
+    message, or when the send operation times out.
+
+    Futures created by the same sender share a single
+    :class:`threading.Condition`, so that keeping many messages in flight
+    does not allocate a synchronization primitive per message.
+    """
+    __slots__ = ['message_id', '_condition', '_state', '_callbacks']
+    logger = logging.getLogger('aorta.outgoing')
+
+    PENDING = 'pending'
+    ACCEPTED = 'accepted'
+    REJECTED = 'rejected'
+    RELEASED = 'released'
+    TIMEOUT = 'timeout'
+
+    @property
+    def state(self):
+        return self._state
+
+    @property
+    def accepted(self):
+        return self._state == self.ACCEPTED
+
+    def __init__(self, message_id, condition):
+        self.message_id = message_id
+        self._condition = condition
+        self._state = self.PENDING
+        self._callbacks = None
+
+    def done(self):
+        """Return a boolean indicating if the future is resolved."""
+        return self._state != self.PENDING
+
+    def add_done_callback(self, func):
+        """Add a callable that is invoked with the future as its sole
+        argument when the future is resolved. If the future is already
+        resolved, `func` is invoked immediately.
+        """
+        with self._condition:
+            if self._state == self.PENDING:
+                if self._callbacks is None:
+                    self._callbacks = []
+                self._callbacks.append(func)
+                return
+        func(self)
+
+    def wait(self, timeout=None):
+        """Block until the future is resolved or `timeout` seconds have
+        passed. Return a boolean indicating if the future is resolved.
+        """
+        if self._state != self.PENDING:
+            return True
+        with self._condition:
+            return self._condition.wait_for(self.done, timeout)
+
+    def result(self, timeout=None):
+        """Block until the future is resolved and return the message
+        identifier if the message was accepted. Raise an exception if
+        the message was rejected, released or timed out.
+        """
+        if not self.wait(timeout) or self._state == self.TIMEOUT:
+            raise SendTimeout(self.message_id)
+        if self._state == self.REJECTED:
+            raise MessageRejected(self.message_id)
+        if self._state == self.RELEASED:
+            raise MessageReleased(self.message_id)
+        return self.message_id
+
+    def resolve(self, state):
+        """Resolve the future with the given `state`. Return a boolean
+        indicating if the state was changed; a future can only be
+        resolved once.
+        """
+        with self._condition:
+            if self._state != self.PENDING:
+                return False
+            self._state = state
+            callbacks, self._callbacks = self._callbacks, None
+            self._condition.notify_all()
+
+        for func in (callbacks or []):
+            try:
+                func(self)
+            except Exception:
+                self.logger.exception("Caught fatal exception")
+        return True
+
+    def __repr__(self):
+        return "<SendFuture: {0} ({1})>".format(self.message_id, self._state)
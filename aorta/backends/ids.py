@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+import uuid
+import weakref
+
+
+class IdGenerator:
+    """Generates the identifiers of outgoing messages. Identifiers are
+    strings holding 32 hexadecimal digits, like the hexadecimal form of
+    a UUID, so that generators can be exchanged without affecting the
+    receivers of the messages.
+    """
+
+    #: The name under which the generator is registered.
+    name = None
+
+    def __call__(self):
+        raise NotImplementedError("Subclasses must override this method.")
+
+    def timestamp(self, message_id):
+        """Return the time at which `message_id` was generated, in seconds
+        since the epoch, or ``None`` if the generator does not encode the
+        time in its identifiers.
+        """
+        return None
+
+
+class UUIDGenerator(IdGenerator):
+    """Generates random (version 4) UUIDs. Each identifier reads 16 bytes
+    from :func:`os.urandom`, and identifiers are not ordered.
+    """
+    name = 'uuid4'
+
+    def __call__(self):
+        return uuid.uuid4().hex
+
+
+class SortableIdGenerator(IdGenerator):
+    """Generates 128-bit identifiers that sort in the order in which they
+    were generated, like ULIDs. An identifier consists of:
+
+    - the time in milliseconds since the epoch (48 bits);
+    - randomness drawn once per process (32 bits), so that processes
+      generating identifiers in the same millisecond do not collide;
+    - a sequence number (48 bits) starting at a random value and
+      incremented for each identifier.
+
+    Identifiers generated by a single process increase monotonically,
+    even if the clock is set back. Identifiers of different processes
+    are ordered by the millisecond in which they were generated.
+    """
+    name = 'sortable'
+
+    def __init__(self, clock=time.time):
+        """Initialize a new :class:`SortableIdGenerator` instance.
+
+        Args:
+            clock: a callable returning the current time in seconds
+                since the epoch.
+        """
+        self.clock = clock
+        self.__last = 0
+        self.reseed()
+
+        # A forked process would generate the same identifiers as its
+        # parent, so the child draws new randomness.
+        if hasattr(os, 'register_at_fork'):
+            ref = weakref.WeakMethod(self.reseed)
+            os.register_at_fork(after_in_child=lambda: ref() and ref()())
+
+    def reseed(self):
+        """Draw the per-process randomness and the initial sequence number.
+        Invoked when the generator is created and in forked processes.
+        """
+        # The lock is replaced, since the fork may have happened while
+        # another thread held it.
+        seed = int.from_bytes(os.urandom(10), 'big')
+        self.__lock = threading.Lock()
+        self.__node = '{0:08x}'.format(seed >> 48)
+
+        # The sequence starts below 2 ** 47, so that it does not wrap
+        # around in practice.
+        self.__sequence = seed & (2 ** 47 - 1)
+
+    def __call__(self):
+        now = int(self.clock() * 1000)
+        with self.__lock:
+            if now < self.__last:
+                now = self.__last
+            self.__last = now
+            self.__sequence = sequence = (self.__sequence + 1) & (2 ** 48 - 1)
+        return '%012x%s%012x' % (now, self.__node, sequence)
+
+    def timestamp(self, message_id):
+        """Return the time encoded in `message_id`. Raise :exc:`ValueError`
+        if `message_id` is not a string of 32 hexadecimal digits. Note
+        that other identifiers of that format, such as random UUIDs,
+        can not be told apart and decode to an arbitrary time.
+        """
+        if len(message_id) != 32:
+            raise ValueError("Invalid identifier: {0}".format(message_id))
+        return int(message_id[:12], 16) / 1000
+
+
+GENERATORS = {}
+
+
+def register(generator):
+    """Register `generator` by its name."""
+    GENERATORS[generator.name] = generator
+
+
+def get(generator):
+    """Return the generator specified by `generator`, which is either a
+    registered name or an :class:`IdGenerator` instance.
+    """
+    if isinstance(generator, IdGenerator):
+        return generator
+    try:
+        return GENERATORS[generator]
+    except KeyError:
+        raise LookupError("Unknown identifier generator: {0}".format(generator))
+
+
+register(UUIDGenerator())
+register(SortableIdGenerator())
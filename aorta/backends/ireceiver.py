@@ -2,3 +2,29 @@ import logging
 
 class IReceiver:
     logger = logging.getLogger('aorta.incoming')
+
+    def wait(self, timeout=None):
+        """Block until the receiver is ready to receive messages or
+        `timeout` seconds have passed. Return a boolean indicating if
+        the receiver is ready.
+        """
+        return True
+
+    def decode(self, messages):
+        """Return `messages` with their bodies decoded. Invoked by the
+        backend on the dispatching thread, before the messages are passed
+        to the listener.
+        """
+        return messages
+
+    def notify_failed(self, messages):
+        """Invoked by the backend when dispatching `messages` to the
+        listener failed, before :meth:`notify_dispatched`.
+        """
+        pass
+
+    def notify_dispatched(self, messages):
+        """Invoked by the backend when `messages` are dispatched to the
+        listener.
+        """
+        pass
@@ -3,3 +3,18 @@ import logging
 
 class ISender:
     logger = logging.getLogger('aorta.outgoing')
+
+    @property
+    def available(self):
+        """Indicates if the connection of the sender is usable. Senders
+        of which the connection was lost are skipped when balancing
+        messages across the nodes of a cluster.
+        """
+        return True
+
+    @property
+    def in_flight(self):
+        """The number of messages that were sent and are not yet settled
+        by the remote peer.
+        """
+        return 0
@@ -0,0 +1,187 @@
+import bisect
+import collections
+import math
+import threading
+
+
+#: The default histogram buckets, in seconds.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    """A monotonically increasing counter. Each thread increments its own
+    cell, so that :meth:`inc` does not acquire a lock; the cells are
+    summed when the value is read.
+    """
+    kind = 'counter'
+
+    @property
+    def value(self):
+        return sum(cell[0] for cell in list(self.__cells))
+
+    def __init__(self):
+        self.__local = threading.local()
+        self.__cells = []
+        self.__lock = threading.Lock()
+
+    def __cell(self):
+        cell = self.__local.cell = [0]
+        with self.__lock:
+            self.__cells.append(cell)
+        return cell
+
+    def inc(self, n=1):
+        """Increment the counter by `n`."""
+        try:
+            self.__local.cell[0] += n
+        except AttributeError:
+            self.__cell()[0] += n
+
+    def collect(self):
+        return self.value
+
+
+class Gauge:
+    """A value that is computed by a callable when it is read."""
+    kind = 'gauge'
+
+    @property
+    def value(self):
+        return self.func()
+
+    def __init__(self, func):
+        self.func = func
+
+    def collect(self):
+        return self.value
+
+
+class Histogram:
+    """Counts observations in fixed buckets. Like :class:`Counter`, each
+    thread records its observations in its own cell.
+    """
+    kind = 'histogram'
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.__local = threading.local()
+        self.__cells = []
+        self.__lock = threading.Lock()
+
+    def __cell(self):
+        # One count per bucket, the count of the +Inf bucket and the sum
+        # of all observations.
+        cell = self.__local.cell = [0] * (len(self.buckets) + 2)
+        with self.__lock:
+            self.__cells.append(cell)
+        return cell
+
+    def observe(self, value):
+        """Record an observation of `value`."""
+        try:
+            cell = self.__local.cell
+        except AttributeError:
+            cell = self.__cell()
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def collect(self):
+        """Return a dictionary holding the cumulative bucket counts as a
+        list of ``(upper bound, count)`` tuples, the number of observations
+        and their sum.
+        """
+        totals = [0] * (len(self.buckets) + 2)
+        for cell in list(self.__cells):
+            for i, value in enumerate(cell):
+                totals[i] += value
+        buckets = []
+        count = 0
+        for bound, n in zip(self.buckets + (math.inf,), totals):
+            count += n
+            buckets.append((bound, count))
+        return {'buckets': buckets, 'count': count, 'sum': totals[-1]}
+
+
+class Metrics:
+    """A registry of the metrics of a messaging backend.
+
+    Metrics are identified by their name and labels. The methods creating
+    metrics return the existing metric if it is already registered, so
+    that they can be used to look up metrics.
+    """
+
+    def __init__(self):
+        self.__metrics = collections.OrderedDict()
+        self.__help = {}
+        self.__lock = threading.Lock()
+
+    def __get(self, name, labels, help, factory):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self.__metrics.get(key)
+        if metric is None:
+            with self.__lock:
+                metric = self.__metrics.get(key)
+                if metric is None:
+                    metric = self.__metrics[key] = factory()
+                    self.__help.setdefault(name, help)
+        return metric
+
+    def counter(self, name, help='', **labels):
+        """Return the :class:`Counter` identified by `name` and `labels`."""
+        return self.__get(name, labels, help, Counter)
+
+    def gauge(self, name, func, help='', **labels):
+        """Return the :class:`Gauge` identified by `name` and `labels`,
+        of which the value is computed by `func`.
+        """
+        return self.__get(name, labels, help, lambda: Gauge(func))
+
+    def histogram(self, name, help='', buckets=DEFAULT_BUCKETS, **labels):
+        """Return the :class:`Histogram` identified by `name` and `labels`."""
+        return self.__get(name, labels, help, lambda: Histogram(buckets))
+
+    def snapshot(self):
+        """Return a dictionary mapping the names of all metrics to a
+        dictionary holding their ``type``, ``help`` and ``samples``, a
+        list of ``(labels, value)`` tuples. The value of a histogram
+        is the dictionary returned by :meth:`Histogram.collect`.
+        """
+        snapshot = collections.OrderedDict()
+        for (name, labels), metric in list(self.__metrics.items()):
+            entry = snapshot.setdefault(name, {
+                'type': metric.kind,
+                'help': self.__help.get(name, ''),
+                'samples': []
+            })
+            entry['samples'].append((dict(labels), metric.collect()))
+        return snapshot
+
+    def render(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        lines = []
+        for name, entry in self.snapshot().items():
+            if entry['help']:
+                lines.append("# HELP {0} {1}".format(name, entry['help']))
+            lines.append("# TYPE {0} {1}".format(name, entry['type']))
+            for labels, value in entry['samples']:
+                if entry['type'] != 'histogram':
+                    lines.append(format_sample(name, labels, value))
+                    continue
+                for bound, count in value['buckets']:
+                    le = '+Inf' if bound == math.inf else repr(float(bound))
+                    lines.append(format_sample(name + '_bucket',
+                        dict(labels, le=le), count))
+                lines.append(format_sample(name + '_sum', labels, value['sum']))
+                lines.append(format_sample(name + '_count', labels, value['count']))
+        return '\n'.join(lines) + '\n'
+
+
+def format_sample(name, labels, value):
+    if labels:
+        name = "{0}{{{1}}}".format(name, ','.join([
+            '{0}="{1}"'.format(k, str(v).replace('\\', '\\\\')
+                .replace('"', '\\"').replace('\n', '\\n'))
+            for k, v in labels.items()
+        ]))
+    return "{0} {1}".format(name, value)
@@ -1,8 +1,52 @@
 from aorta.backends.base import BaseMessagingBackend
+from aorta.backends.dsn import parse_dsn
+from aorta.backends.mock import broker
+from aorta.backends.mock.receiver import Receiver
+from aorta.backends.mock.sender import Sender
 
 
 class MessagingBackend(BaseMessagingBackend):
-    pass
+    """A messaging backend routing messages through an in-process
+    :class:`~aorta.backends.mock.broker.Broker`, without serialization
+    or network I/O.
+
+    Backends connected to the same address share a broker, so a message
+    sent by one backend is dispatched to the listeners of all backends
+    in the process that listen on its channel. Channels deliver to all
+    receivers by default; use :meth:`declare` to make a channel deliver
+    every message to a single receiver.
+    """
+    receiver_class = Receiver
+    sender_class = Sender
+
+    def __init__(self, latency=0.0, credit=None, **kwargs):
+        """Initialize a new :class:`MessagingBackend` instance.
+
+        Args:
+            latency: the number of seconds between publishing a message
+                and its acceptance and delivery to the receivers.
+            credit: the default number of messages a receiver accepts
+                before they are dispatched; see :class:`~aorta.backends.mock.receiver.Receiver`.
+
+        Additional keyword arguments are passed to
+        :class:`~aorta.backends.base.BaseMessagingBackend`.
+        """
+        BaseMessagingBackend.__init__(self, **kwargs)
+        self.latency = latency
+        self.credit = credit
+
+    def get_broker(self, address):
+        """Return the :class:`~aorta.backends.mock.broker.Broker` listening
+        on `address`.
+        """
+        return broker.get_broker(address)
+
+    def declare(self, dsn, mode):
+        """Declare the mode of the channel identified by `dsn`; either
+        ``fanout`` or ``queue``. See :class:`~aorta.backends.mock.broker.Channel`.
+        """
+        dsn = parse_dsn(dsn)
+        self.get_broker(dsn.address).declare(dsn.channel, mode)
 
 
 MockMessagingBackend = MessagingBackend
@@ -0,0 +1,197 @@
+import collections
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+
+class IncomingMessage:
+    """A message as received from the :class:`Broker`. The keys of the
+    published :class:`~aorta.message.Message` are exposed as attributes,
+    like the attributes of a received AMQP message.
+
+    Messages are not copied: all receivers of a message share the same
+    :class:`IncomingMessage`, which refers to the body and properties
+    of the published message.
+    """
+    id = None
+    body = None
+    properties = None
+    content_type = None
+    subject = None
+    annotations = None
+
+    def __init__(self, message):
+        self.__dict__.update(message)
+
+    def __repr__(self):
+        return "<IncomingMessage: {0}>".format(self.id)
+
+
+class Channel:
+    """Holds the receivers attached to a channel of the :class:`Broker`.
+
+    A fanout channel delivers every message to all receivers; a queue
+    channel delivers every message to a single receiver, in round-robin
+    order, and holds messages until a receiver is attached.
+    """
+    FANOUT = 'fanout'
+    QUEUE = 'queue'
+
+    def __init__(self, name, mode=FANOUT):
+        if mode not in (self.FANOUT, self.QUEUE):
+            raise ValueError("Invalid channel mode: {0}".format(mode))
+        self.name = name
+        self.mode = mode
+        self.receivers = []
+        self.backlog = collections.deque()
+        self.cursor = 0
+
+
+class Broker:
+    """An in-process message broker routing messages between the senders
+    and receivers of :class:`~aorta.backends.mock.MessagingBackend`
+    instances connected to the same address.
+
+    Messages are routed without serialization. Each receiver accepts up
+    to its link credit of messages that are not yet dispatched; further
+    messages are held by the broker until the receiver dispatched its
+    pending messages, like a broker waiting for link credit.
+
+    Set :attr:`available` to ``False`` to simulate a node that can not
+    be reached; messages sent to it are released.
+    """
+    logger = logging.getLogger('aorta.mock')
+
+    def __init__(self, address, mode=Channel.FANOUT):
+        """Initialize a new :class:`Broker` instance.
+
+        Args:
+            address: the address of the broker.
+            mode: the default mode of the channels; see :class:`Channel`.
+        """
+        self.address = address
+        self.mode = mode
+        self.available = True
+        self.__channels = {}
+        self.__lock = threading.RLock()
+        self.__timers = []
+        self.__counter = itertools.count()
+        self.__condition = threading.Condition(threading.Lock())
+        self.__thread = None
+
+    def declare(self, channel, mode):
+        """Declare the `mode` of `channel`. Must be invoked before any
+        receiver is attached to the channel.
+        """
+        with self.__lock:
+            existing = self.__channels.get(channel)
+            if existing is not None and existing.receivers:
+                raise RuntimeError(
+                    "Channel {0} is already in use.".format(channel))
+            self.__channels[channel] = Channel(channel, mode)
+
+    def get_channel(self, name):
+        with self.__lock:
+            channel = self.__channels.get(name)
+            if channel is None:
+                channel = self.__channels[name] = Channel(name, self.mode)
+            return channel
+
+    def attach(self, receiver):
+        """Attach `receiver` to its channel."""
+        with self.__lock:
+            channel = self.get_channel(receiver.channel)
+            channel.receivers.append(receiver)
+            self.__drain(channel)
+
+    def detach(self, receiver):
+        """Detach `receiver` from its channel. Messages held for the
+        receiver are discarded.
+        """
+        with self.__lock:
+            channel = self.get_channel(receiver.channel)
+            if receiver in channel.receivers:
+                channel.receivers.remove(receiver)
+            receiver.backlog.clear()
+
+    def publish(self, channel, messages):
+        """Route the :class:`IncomingMessage` objects `messages` to the
+        receivers of `channel`.
+        """
+        with self.__lock:
+            channel = self.get_channel(channel)
+            if channel.mode == Channel.FANOUT:
+                for receiver in channel.receivers:
+                    for message in messages:
+                        receiver.offer(message)
+            else:
+                channel.backlog.extend(messages)
+                self.__drain(channel)
+
+    def release(self, receiver, n):
+        """Return `n` credits to `receiver`, which dispatched `n` messages,
+        and deliver the messages held for it.
+        """
+        with self.__lock:
+            receiver.release(n)
+            channel = self.get_channel(receiver.channel)
+            if channel.mode == Channel.QUEUE:
+                self.__drain(channel)
+
+    def __drain(self, channel):
+        # Deliver the messages held by a queue channel to the receivers
+        # that have credit, in round-robin order.
+        backlog = channel.backlog
+        receivers = channel.receivers
+        while backlog and receivers:
+            for i in range(len(receivers)):
+                receiver = receivers[(channel.cursor + i) % len(receivers)]
+                if receiver.credit > 0:
+                    channel.cursor = (channel.cursor + i + 1) % len(receivers)
+                    receiver.offer(backlog.popleft())
+                    break
+            else:
+                break
+
+    def schedule(self, delay, func, *args):
+        """Invoke `func` with the positional arguments `args` after `delay`
+        seconds on the timer thread of the broker.
+        """
+        with self.__condition:
+            heapq.heappush(self.__timers,
+                (time.monotonic() + delay, next(self.__counter), func, args))
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__main__,
+                    name='aorta-mock-broker', daemon=True)
+                self.__thread.start()
+            self.__condition.notify()
+
+    def __main__(self):
+        timers = self.__timers
+        while True:
+            with self.__condition:
+                while not timers or timers[0][0] > time.monotonic():
+                    timeout = timers[0][0] - time.monotonic() if timers else None
+                    self.__condition.wait(timeout)
+                due, seq, func, args = heapq.heappop(timers)
+            try:
+                func(*args)
+            except Exception:
+                self.logger.exception("Caught fatal exception")
+
+
+BROKERS = {}
+LOCK = threading.Lock()
+
+
+def get_broker(address):
+    """Return the :class:`Broker` listening on `address`, creating it
+    if it does not exist.
+    """
+    with LOCK:
+        broker = BROKERS.get(address)
+        if broker is None:
+            broker = BROKERS[address] = Broker(address)
+        return broker
@@ -0,0 +1,116 @@
+import collections
+import uuid
+
+from aorta.backends.ireceiver import IReceiver
+from aorta.event import LazyEvent
+from aorta.exc import MalformedEvent
+
+
+class Receiver(IReceiver):
+    """Receives messages from a channel of the in-process
+    :class:`~aorta.backends.mock.broker.Broker`.
+    """
+
+    #: The maximum number of messages that are queued for dispatching.
+    high_watermark = 100
+
+    @property
+    def address(self):
+        return "{0}:{1}".format(self.host, self.port)
+
+    @property
+    def dsn(self):
+        return "{0}/{1}".format(self.address, self.channel)
+
+    @property
+    def credit(self):
+        return self.high_watermark - self.pending
+
+    @classmethod
+    def create(cls, backend, *args, **kwargs):
+        return cls(backend, *args, **kwargs)
+
+    def __init__(self, backend, host, port, channel, options=None):
+        """Initialize a new :class:`Receiver` instance.
+
+        Args:
+            backend: the backend owning the receiver.
+            host: the hostname of the broker.
+            port: the port of the broker.
+            channel: the channel to receive messages from.
+            options: a dictionary that may hold the ``high_watermark``
+                key, the link credit of the receiver. Defaults to the
+                credit of the backend.
+        """
+        options = options if isinstance(options, dict) else {}
+        self.high_watermark = options.get('high_watermark',
+            backend.credit or self.high_watermark)
+        if self.high_watermark < 1:
+            raise ValueError("The high watermark must be positive.")
+        self.backend = backend
+        self.host = host
+        self.port = port
+        self.channel = channel
+        self.receiver_id = uuid.uuid4().hex
+        self.pending = 0
+        self.backlog = collections.deque()
+        self.stalls = backend.metrics.counter('aorta_credit_stalls_total',
+            "Number of times a receiver stopped granting link credit.",
+            dsn=self.dsn)
+        self.broker = backend.get_broker(self.address)
+        self.broker.attach(self)
+
+    def destroy(self):
+        """Detaches the receiver from the broker."""
+        self.logger.info("Tearing down connection {0}".format(self.dsn))
+        self.broker.detach(self)
+
+    def offer(self, message):
+        """Invoked by the broker to deliver `message`. The message is
+        queued for dispatching if the receiver has credit, else it is
+        held until queued messages are dispatched.
+        """
+        if self.backend.is_duplicate(self.dsn, message.id):
+            log_msg = "Message (id: {0}, receiver: {1}) is a duplicate"\
+                .format(message.id, self.receiver_id)
+            self.logger.debug(log_msg)
+            return
+        if self.backlog or self.pending >= self.high_watermark:
+            if not self.backlog:
+                self.stalls.inc()
+            self.backlog.append(message)
+            return
+        self.pending += 1
+        self.backend.put(self, message)
+
+    def release(self, n):
+        """Invoked by the broker when `n` messages are dispatched."""
+        self.pending -= n
+        backlog = self.backlog
+        while backlog and self.pending < self.high_watermark:
+            self.pending += 1
+            self.backend.put(self, backlog.popleft())
+
+    def notify_dispatched(self, messages):
+        """Invoked by the backend when `messages` are dispatched to the
+        listener.
+        """
+        self.broker.release(self, len(messages))
+
+    def decode(self, messages):
+        """Wraps messages carrying an event (i.e. specifying the
+        ``event_type`` property) in a :class:`~aorta.event.LazyEvent`.
+        Message bodies are not encoded by the broker, so they are passed
+        as-is. Messages carrying malformed events are dropped.
+        """
+        decoded = []
+        for msg in messages:
+            try:
+                if 'event_type' in (msg.properties or {}):
+                    msg = LazyEvent(msg)
+                decoded.append(msg)
+            except MalformedEvent as e:
+                log_msg = "Message (id: {0}, receiver: {1}) is malformed: {2}"\
+                    .format(msg.id, self.receiver_id, e)
+                self.logger.warning(log_msg)
+        return decoded
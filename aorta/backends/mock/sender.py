@@ -0,0 +1,173 @@
+import threading
+import time
+
+from aorta.backends.future import SendFuture
+from aorta.backends.isender import ISender
+from aorta.backends.mock.broker import IncomingMessage
+
+
+class Sender(ISender):
+    """Publishes messages to a channel of the in-process
+    :class:`~aorta.backends.mock.broker.Broker`.
+
+    Messages are routed on the calling thread, unless the backend
+    simulates latency; then they are routed by the timer thread of the
+    broker after :attr:`latency` seconds. Messages are accepted when
+    they are routed, or released if the broker is not available.
+    """
+
+    @property
+    def address(self):
+        return "{0}:{1}".format(self.host, self.port)
+
+    @property
+    def dsn(self):
+        return "{0}/{1}".format(self.address, self.channel)
+
+    @property
+    def available(self):
+        return self.broker.available
+
+    @property
+    def in_flight(self):
+        return self.__in_flight
+
+    @classmethod
+    def create(cls, backend, *args, **kwargs):
+        return cls(backend, *args, **kwargs)
+
+    def __init__(self, backend, host, port, channel, latency=None, connection=0):
+        """Initialize a new :class:`Sender` instance.
+
+        Args:
+            backend: the backend owning the sender.
+            host: the hostname of the broker.
+            port: the port of the broker.
+            channel: the channel to send messages to.
+            latency: the number of seconds between publishing a message
+                and its acceptance. Defaults to the latency of the backend.
+            connection: the index of the connection carrying the link.
+                Ignored, because the broker is in-process.
+        """
+        self.backend = backend
+        self.host = host
+        self.port = port
+        self.channel = channel
+        self.latency = latency if latency is not None else backend.latency
+        self.broker = backend.get_broker(self.address)
+        self.condition = threading.Condition()
+        self.histogram = backend.metrics.histogram('aorta_send_latency_seconds',
+            "Time from publishing a message until it is accepted.",
+            dsn=self.dsn)
+        self.__in_flight = 0
+        self.__lock = threading.Lock()
+
+    def destroy(self):
+        pass
+
+    def send(self, message, blocking=False, timeout=None, dsn=None):
+        """Sends a message to the broker.
+
+        Args:
+            message: the :class:`~aorta.message.Message` to send.
+            blocking: a boolean indicating if the call must block until
+                the message is accepted.
+            timeout: the number of milliseconds after which the returned
+                future is resolved as timed out if the message was not
+                accepted.
+            dsn: the DSN under which the message is recorded in the outbox
+                of the backend. Defaults to :attr:`dsn`.
+
+        Returns:
+            aorta.backends.future.SendFuture
+        """
+        future, = self.send_many([message], blocking=blocking, timeout=timeout,
+            dsn=dsn)
+        return future
+
+    def send_many(self, messages, blocking=False, timeout=None, recorded=False,
+        dsn=None):
+        """Sends multiple messages to the broker.
+
+        Args:
+            messages: an iterable of :class:`~aorta.message.Message` objects.
+            blocking: a boolean indicating if the call must block until
+                all messages are accepted.
+            timeout: the number of milliseconds after which the pending
+                futures are resolved as timed out.
+            recorded: a boolean indicating if the messages are already
+                recorded in the outbox of the backend.
+            dsn: the DSN under which the messages are recorded in the
+                outbox of the backend. Defaults to :attr:`dsn`.
+
+        Returns:
+            A list of :class:`~aorta.backends.future.SendFuture` objects
+            in the order of `messages`.
+        """
+        futures = self.queue_many(messages, timeout=timeout, recorded=recorded,
+            dsn=dsn)
+        if blocking or timeout:
+            timeout = ((timeout or 0) / 1000) or None
+            deadline = time.monotonic() + timeout if timeout else None
+            for future in futures:
+                remaining = deadline - time.monotonic() if deadline else None
+                if not future.wait(remaining):
+                    break
+        return futures
+
+    def queue_many(self, messages, timeout=None, recorded=False, dsn=None):
+        """Like :meth:`send_many`, but return the futures without waiting
+        for the outcome of the send operations.
+        """
+        messages = list(messages)
+        started = time.monotonic()
+        batch = []
+        for message in messages:
+            assert message.id is not None
+            future = SendFuture(message.id, self.condition)
+            batch.append((IncomingMessage(message), future, started))
+
+        timeout = ((timeout or 0) / 1000) or None
+        outbox = self.backend.outbox
+        if outbox is not None and not recorded:
+            outbox.append(dsn or self.dsn, messages, self.transfer, batch, timeout)
+        else:
+            self.transfer(batch, timeout)
+        return [future for message, future, started in batch]
+
+    def transfer(self, batch, timeout):
+        """Routes a batch of messages to the receivers, after the
+        simulated latency.
+        """
+        if timeout is not None:
+            self.broker.schedule(timeout, self.expire, batch)
+        if not self.latency:
+            self.route(batch)
+            return
+        with self.__lock:
+            self.__in_flight += len(batch)
+        self.broker.schedule(self.latency, self.route, batch, True)
+
+    def route(self, batch, delayed=False):
+        if delayed:
+            with self.__lock:
+                self.__in_flight -= len(batch)
+        batch = [x for x in batch if not x[1].done()]
+        if not self.broker.available:
+            for message, future, started in batch:
+                future.resolve(SendFuture.RELEASED)
+            return
+        self.broker.publish(self.channel, [message for message, _, _ in batch])
+
+        outbox = self.backend.outbox
+        now = time.monotonic()
+        for message, future, started in batch:
+            self.histogram.observe(now - started)
+            self.backend.register_delivery()
+            if outbox is not None:
+                outbox.remove(message.id)
+            future.resolve(SendFuture.ACCEPTED)
+
+    def expire(self, batch):
+        for message, future, started in batch:
+            future.resolve(SendFuture.TIMEOUT)
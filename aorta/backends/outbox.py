@@ -0,0 +1,201 @@
+import collections
+import logging
+import os
+import pickle
+import struct
+import threading
+import time
+
+from aorta.message import Message
+
+
+class Outbox:
+    """Records outgoing messages in an append-only log file until they
+    are accepted by the remote peer, so that they can be replayed after
+    a crash or a lost connection.
+
+    Writes are group-committed: a single writer thread appends all
+    records that accumulated while the previous write was in progress
+    and issues one :func:`os.fsync` per batch. The callback passed to
+    :meth:`append` is invoked once the messages are durable.
+
+    Accepted messages leave their records in the log until it is
+    compacted: when the log is opened, and by the writer thread once
+    the number of removed messages exceeds both :attr:`compaction_threshold`
+    and the number of pending messages.
+    """
+    logger = logging.getLogger('aorta.outbox')
+    header = struct.Struct('!cI')
+    OP_APPEND = b'+'
+    OP_REMOVE = b'-'
+
+    #: The minimum number of removed messages before the log is compacted
+    #: by the writer thread.
+    compaction_threshold = 1024
+
+    def __init__(self, path, interval=0.0):
+        """Initialize a new :class:`Outbox` instance.
+
+        Args:
+            path: the path to the log file. Messages recorded in an
+                existing file and not removed are pending.
+            interval: the minimum number of seconds between two commits.
+                A larger interval allows larger batches at the cost of
+                latency.
+        """
+        self.path = path
+        self.interval = interval
+        self.__messages = collections.OrderedDict()
+        self.__records = []
+        self.__removals = []
+        self.__callbacks = []
+        self.__removed = 0
+        self.__lock = threading.Lock()
+        self.__condition = threading.Condition(self.__lock)
+        self.__closed = False
+        self.__load()
+        self.__file = open(self.path, 'ab')
+        self.__thread = threading.Thread(target=self.__main__, daemon=True)
+        self.__thread.start()
+
+    def __len__(self):
+        return len(self.__messages)
+
+    def __load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            data = f.read()
+
+        offset = 0
+        while offset + self.header.size <= len(data):
+            op, length = self.header.unpack_from(data, offset)
+            start = offset + self.header.size
+            if start + length > len(data):
+                break # Truncated by a crash during a write.
+            payload = pickle.loads(data[start:start+length])
+            if op == self.OP_APPEND:
+                dsn, message = payload
+                self.__messages[message['id']] = (dsn, Message(message))
+            else:
+                self.__messages.pop(payload, None)
+            offset = start + length
+
+        self.__compact(self.__messages.values())
+
+    def __compact(self, pending):
+        # Rewrite the log so that it only holds the pending messages. The
+        # log is replaced atomically, so a crash leaves either log intact.
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(b''.join([
+                self.__encode(self.OP_APPEND, (dsn, dict(message)))
+                for dsn, message in pending
+            ]))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def __encode(self, op, payload):
+        payload = pickle.dumps(payload, pickle.HIGHEST_PROTOCOL)
+        return self.header.pack(op, len(payload)) + payload
+
+    def pending(self):
+        """Return a list of ``(dsn, message)`` tuples holding the messages
+        that were not accepted by the remote peer, in the order they
+        were recorded.
+        """
+        with self.__lock:
+            return list(self.__messages.values())
+
+    def append(self, dsn, messages, callback=None, *args):
+        """Record `messages` for `dsn`. If `callback` is provided, it is
+        invoked with the positional arguments `args` on the writer thread
+        once the messages are durable. Raise :exc:`RuntimeError` if the
+        outbox is closed.
+        """
+        records = [
+            self.__encode(self.OP_APPEND, (dsn, dict(message)))
+            for message in messages
+        ]
+        with self.__condition:
+            if self.__closed:
+                raise RuntimeError("The outbox is closed.")
+            for message in messages:
+                self.__messages[message.id] = (dsn, message)
+            self.__records.extend(records)
+            if callback is not None:
+                self.__callbacks.append((callback, args))
+            self.__condition.notify()
+
+    def remove(self, message_id):
+        """Remove the message identified by `message_id` from the outbox.
+
+        Removals do not wake up the writer; they are committed with the
+        next batch of appended messages or when the outbox is closed. If
+        they are lost in a crash, the message is sent again and must be
+        deduplicated by the receiver.
+        """
+        record = self.__encode(self.OP_REMOVE, message_id)
+        with self.__condition:
+            if self.__messages.pop(message_id, None) is not None:
+                self.__removals.append(record)
+
+    def close(self):
+        """Commit all pending records and close the log file."""
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify()
+        self.__thread.join()
+        self.__file.close()
+
+    def __main__(self):
+        while True:
+            with self.__condition:
+                while not self.__records and not self.__closed:
+                    self.__condition.wait()
+                records = self.__records + self.__removals
+                if not records:
+                    break
+                self.__removed += len(self.__removals)
+                self.__records, self.__removals = [], []
+                callbacks, self.__callbacks = self.__callbacks, []
+
+                # The pending messages reflect all records taken above,
+                # so the compacted log supersedes them.
+                pending = None
+                if self.__removed >= self.compaction_threshold\
+                and self.__removed > len(self.__messages):
+                    pending = list(self.__messages.values())
+
+            started = time.monotonic()
+            try:
+                if pending is None or not self.__rotate(pending):
+                    self.__file.write(b''.join(records))
+                    self.__file.flush()
+                    os.fsync(self.__file.fileno())
+            except Exception:
+                # The messages are sent anyway; they are only at risk if
+                # the process crashes before they are accepted.
+                self.logger.exception("Caught fatal exception")
+
+            for callback, args in callbacks:
+                try:
+                    callback(*args)
+                except Exception:
+                    self.logger.exception("Caught fatal exception")
+
+            delay = self.interval - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+
+    def __rotate(self, pending):
+        try:
+            self.__compact(pending)
+        except Exception:
+            self.logger.exception("Could not compact {0}".format(self.path))
+            return False
+        self.__file.close()
+        self.__file = open(self.path, 'ab')
+        self.__removed = 0
+        return True
@@ -1,8 +1,46 @@
+import zlib
+
 from aorta.backends.base import BaseMessagingBackend
+from aorta.backends.qpid_proton.reactor import Reactor
 from aorta.backends.qpid_proton.sender import Sender
 from aorta.backends.qpid_proton.receiver import Receiver
 
 
 class MessagingBackend(BaseMessagingBackend):
+    """A messaging backend using Apache Qpid Proton.
+
+    All senders and receivers share a fixed pool of reactors (by default
+    a single one), so that the number of threads does not grow with the
+    number of channels.
+    """
     receiver_class = Receiver
     sender_class = Sender
+
+    def __init__(self, reactors=1, **kwargs):
+        """Initialize a new :class:`MessagingBackend` instance.
+
+        Args:
+            reactors: the number of reactor threads hosting the connections
+                and links of this backend.
+
+        Additional keyword arguments are passed to
+        :class:`~aorta.backends.base.BaseMessagingBackend`.
+        """
+        BaseMessagingBackend.__init__(self, **kwargs)
+        self.__reactors = [
+            Reactor(name='aorta-reactor-{0}'.format(i))
+            for i in range(reactors)
+        ]
+
+    def get_reactor(self, address, connection=0):
+        """Return the :class:`~aorta.backends.qpid_proton.reactor.Reactor`
+        hosting the connection to `address` with the given index; see
+        :meth:`~aorta.backends.qpid_proton.reactor.Reactor.connect`.
+        """
+        key = address if not connection else "{0}#{1}".format(address, connection)
+        return self.__reactors[zlib.crc32(key.encode()) % len(self.__reactors)]
+
+    def destroy(self):
+        BaseMessagingBackend.destroy(self)
+        for reactor in self.__reactors:
+            reactor.stop()
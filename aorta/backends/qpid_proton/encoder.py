@@ -0,0 +1,193 @@
+import threading
+import time
+
+from proton import Data
+from proton import Message
+
+from aorta.backends import codecs
+from aorta.backends import compression
+
+
+#: The content type of compressed bodies that were encoded using the
+#: native AMQP type system.
+AMQP_VALUE = 'application/x-amqp-value'
+
+
+class MessageEncoder:
+    """Encodes :class:`aorta.message.Message` objects to AMQP messages,
+    encoding the message bodies with a :class:`~aorta.backends.codecs.Codec`.
+
+    Encoding takes place on the calling thread, so that the reactor only
+    has to transfer the encoded bytes. The encoder reuses a proton
+    :class:`~proton.Message` per thread, and the attributes to set for a
+    given set of message keys are resolved once and cached; messages
+    of the same event type usually share the same keys.
+
+    If a :class:`~aorta.backends.compression.Compressor` is specified,
+    bodies of at least `threshold` bytes (after encoding with the codec)
+    are compressed, unless the compressed body is not smaller or the
+    message specifies a content encoding. Bodies that the codec passes
+    as-is are first serialized with the AMQP type system and marked with
+    the :data:`AMQP_VALUE` content type, unless the message specifies
+    a content type.
+    """
+    passthrough = frozenset(['body', 'properties', 'instructions', 'annotations'])
+
+    def __init__(self, codec=None, compressor=None, threshold=1024,
+        saved=None, elapsed=None):
+        """Initialize a new :class:`MessageEncoder` instance.
+
+        Args:
+            codec: the name of a :class:`~aorta.backends.codecs.Codec` or
+                a codec instance.
+            compressor: the name of a :class:`~aorta.backends.compression.Compressor`,
+                a compressor instance or ``None`` to disable compression.
+            threshold: the minimum size of a body to compress, in bytes.
+            saved: a :class:`~aorta.backends.metrics.Counter` counting
+                the bytes saved by compression.
+            elapsed: a :class:`~aorta.backends.metrics.Counter` counting
+                the seconds spent compressing.
+        """
+        self.codec = codecs.get(codec)
+        self.compressor = None
+        if compressor is not None:
+            self.compressor = compression.get(compressor)
+        self.threshold = threshold
+        self.saved = saved
+        self.elapsed = elapsed
+        self.__plans = {}
+        self.__local = threading.local()
+
+    def compile(self, keys):
+        """Return a list of ``(key, setter)`` tuples for the given message
+        `keys`. Raise :exc:`AttributeError` if a key is not a valid
+        message attribute.
+        """
+        plan = []
+        for key in keys:
+            attr = getattr(Message, key, None)
+            if isinstance(attr, property) and attr.fset is not None:
+                plan.append((key, attr.fset))
+            elif key in self.passthrough:
+                plan.append((key, None))
+            else:
+                raise AttributeError(
+                    "Invalid message attribute: {0}".format(key))
+        return plan
+
+    def encode(self, message):
+        """Return the AMQP encoding of `message` as a byte-sequence."""
+        msg = getattr(self.__local, 'message', None)
+        if msg is None:
+            msg = self.__local.message = Message()
+        else:
+            msg.clear()
+
+        keys = tuple(message)
+        plan = self.__plans.get(keys)
+        if plan is None:
+            plan = self.__plans[keys] = self.compile(keys)
+
+        for key, setter in plan:
+            if setter is None:
+                setattr(msg, key, message[key])
+            else:
+                setter(msg, message[key])
+
+        # The content type of the codec takes precedence over a content
+        # type specified by the message, because the receiver selects the
+        # codec to decode the body with by content type.
+        codec = self.codec
+        if codec.content_type is not None and msg.body is not None:
+            msg.body = codec.encode(msg.body)
+            msg.content_type = codec.content_type
+        if self.compressor is not None:
+            self.compress(msg)
+        return msg.encode()
+
+    def compress(self, msg):
+        """Compress the body of the proton message `msg` in-place if it
+        is at least :attr:`threshold` bytes long once serialized.
+        """
+        body = msg.body
+        if body is None or message_encoding(msg) is not None:
+            return
+        content_type = None
+        if not isinstance(body, bytes):
+            if message_content_type(msg) is not None:
+                return
+            body = encode_value(body)
+            content_type = AMQP_VALUE
+        if len(body) < self.threshold:
+            return
+        started = time.monotonic()
+        compressed = self.compressor.compress(body)
+        if self.elapsed is not None:
+            self.elapsed.inc(time.monotonic() - started)
+        if len(compressed) >= len(body):
+            return
+        msg.body = compressed
+        msg.content_encoding = self.compressor.name
+        if content_type is not None:
+            msg.content_type = content_type
+        if self.saved is not None:
+            self.saved.inc(len(body) - len(compressed))
+
+
+def message_encoding(message):
+    # Proton returns the symbol 'None' if the content encoding is unset.
+    encoding = message.content_encoding
+    return None if encoding in (None, 'None') else encoding
+
+
+def message_content_type(message):
+    content_type = message.content_type
+    return None if content_type in (None, 'None') else content_type
+
+
+def encode_value(value):
+    """Return the AMQP encoding of `value` as a byte-sequence."""
+    data = Data()
+    data.put_object(value)
+    return data.encode()
+
+
+def decode_value(encoded):
+    """Return the value of which `encoded` is the AMQP encoding."""
+    data = Data()
+    data.decode(bytes(encoded))
+    data.rewind()
+    data.next()
+    return data.get_object()
+
+
+def decode_body(message, elapsed=None):
+    """Return the body of `message` decompressed using the compressor
+    specified by its content encoding, and decoded using the codec
+    specified by its content type. If `elapsed` is a
+    :class:`~aorta.backends.metrics.Counter`, the seconds spent
+    decompressing are added to it.
+    """
+    body = message.body
+    compressor = compression.get_by_encoding(message_encoding(message))
+    if compressor is not None and body is not None:
+        started = time.monotonic()
+        body = compressor.decompress(bytes(body))
+        if elapsed is not None:
+            elapsed.inc(time.monotonic() - started)
+    if message.content_type == AMQP_VALUE and body is not None:
+        return decode_value(body)
+    codec = codecs.get_by_content_type(message.content_type)
+    if codec is None or body is None:
+        return body
+    return codec.decode(body)
+
+
+def decode(message, elapsed=None):
+    """Decode the body of `message` in-place; see :func:`decode_body`."""
+    message.body = decode_body(message, elapsed)
+    if compression.get_by_encoding(message_encoding(message)) is not None:
+        message.content_encoding = None
+    if message.content_type == AMQP_VALUE:
+        message.content_type = None
+    return message
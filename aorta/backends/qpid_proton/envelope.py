@@ -0,0 +1,48 @@
+from proton import Message
+
+
+#: The content type of envelope messages.
+CONTENT_TYPE = 'application/x-aorta-envelope'
+
+
+class Envelope:
+    """Holds a batch of outgoing messages that are transferred as a single
+    AMQP message, so that they share a transfer and a disposition. The
+    body of the envelope message is a list holding the encoded messages.
+
+    The `items` are the ``(message_id, data, future, started)`` tuples
+    of the messages, as queued by :class:`~aorta.backends.qpid_proton.sender.Sender`.
+    """
+    __slots__ = ['items']
+
+    def __init__(self, items):
+        self.items = items
+
+    def done(self):
+        """Return a boolean indicating if the futures of all messages in
+        the envelope are resolved.
+        """
+        return all(item[2].done() for item in self.items)
+
+    def encode(self):
+        """Return the AMQP encoding of the envelope message."""
+        msg = Message(body=[item[1] for item in self.items],
+            content_type=CONTENT_TYPE)
+        return msg.encode()
+
+
+def is_envelope(message):
+    """Return a boolean indicating if the proton message `message` is an
+    envelope.
+    """
+    return message.content_type == CONTENT_TYPE
+
+
+def unpack(message):
+    """Return a list holding the proton messages in the envelope `message`."""
+    messages = []
+    for data in message.body:
+        msg = Message()
+        msg.decode(bytes(data))
+        messages.append(msg)
+    return messages
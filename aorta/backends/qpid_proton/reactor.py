@@ -0,0 +1,179 @@
+import collections
+import logging
+import threading
+import weakref
+
+from proton.handlers import MessagingHandler
+from proton.reactor import ApplicationEvent
+from proton.reactor import Container
+from proton.reactor import EventInjector
+
+
+class ScheduledCall:
+    __slots__ = ['func', 'args']
+
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+
+    def on_timer_task(self, event):
+        self.func(*self.args)
+
+
+class Reactor(MessagingHandler, threading.Thread):
+    """Runs a single :class:`proton.reactor.Container` hosting the
+    connections and links of multiple senders and receivers.
+
+    Connections are pooled per address: the links of all senders and
+    receivers for the same host and port share a single connection.
+    The reactor tracks which connections are lost, so that senders can
+    fail over to other nodes without waiting for a reconnect; see
+    :meth:`is_available`.
+
+    Proton objects are not thread-safe, so all operations on them
+    must be scheduled using :meth:`call`, which executes them on
+    the reactor thread.
+    """
+    logger = logging.getLogger('aorta.reactor')
+
+    def __init__(self, name=None):
+        MessagingHandler.__init__(self)
+        threading.Thread.__init__(self, name=name, daemon=True)
+        self.container = Container(self)
+        self.__calls = collections.deque()
+        self.__pending = False
+        self.__injector = EventInjector()
+        self.__connections = {}
+        self.__unavailable = frozenset()
+        self.__tasks = weakref.WeakSet()
+        self.__started = False
+        self.__lock = threading.Lock()
+        self.container.selectable(self.__injector)
+
+    def start(self):
+        """Start the reactor thread if it was not started already."""
+        with self.__lock:
+            if not self.__started:
+                self.__started = True
+                threading.Thread.start(self)
+
+    def run(self):
+        self.container.run()
+
+    def call(self, func, *args):
+        """Schedule `func` to be invoked with the positional arguments
+        `args` on the reactor thread. If the caller already is the
+        reactor thread, `func` is invoked immediately.
+        """
+        if threading.current_thread() is self:
+            return func(*args)
+        self.__calls.append((func, args))
+
+        # Only wake up the reactor if there is no wakeup pending; the
+        # reactor drains all scheduled calls on each wakeup.
+        if not self.__pending:
+            self.__pending = True
+            self.__injector.trigger(ApplicationEvent('aorta_call'))
+        if not self.__started:
+            self.start()
+
+    def schedule(self, delay, func, *args):
+        """Schedule `func` to be invoked with the positional arguments
+        `args` after `delay` seconds. Return a :class:`proton.reactor.Task`
+        that may be cancelled; pending tasks are cancelled when the
+        reactor stops. Must be invoked on the reactor thread.
+        """
+        task = self.container.schedule(delay, ScheduledCall(func, args))
+        self.__tasks.add(task)
+        return task
+
+    def connect(self, address, index=0):
+        """Return the connection to `address`, opening a new connection
+        if there is none. Callers specifying a different `index` use
+        separate connections to the same address. Each call must be paired
+        with a call to :meth:`disconnect`. Must be invoked on the reactor
+        thread.
+        """
+        key = (address, index)
+        connection, references = self.__connections.get(key, (None, 0))
+        if connection is None:
+            self.logger.info("Connecting to {0}".format(address))
+            connection = self.container.connect(address)
+            self.__unavailable = self.__unavailable - {address}
+        self.__connections[key] = (connection, references + 1)
+        return connection
+
+    def is_available(self, address):
+        """Return a boolean indicating if the connection to `address` is
+        usable, i.e. it was not lost or could not be established. This
+        method may be invoked from any thread.
+        """
+        return address not in self.__unavailable
+
+    def __set_available(self, connection, available):
+        for (address, index), (pooled, references) in self.__connections.items():
+            if pooled == connection:
+                break
+        else:
+            return
+
+        # The set is replaced instead of updated, so that other threads
+        # can read it without acquiring a lock.
+        if available:
+            self.__unavailable = self.__unavailable - {address}
+        elif address not in self.__unavailable:
+            self.logger.warning("Connection to {0} lost".format(address))
+            self.__unavailable = self.__unavailable | {address}
+
+    def on_connection_opened(self, event):
+        self.__set_available(event.connection, True)
+
+    def on_disconnected(self, event):
+        self.__set_available(event.connection, False)
+
+    def disconnect(self, connection):
+        """Release `connection`, closing it if it is no longer used. Must
+        be invoked on the reactor thread.
+        """
+        for key, (pooled, references) in self.__connections.items():
+            if pooled is connection:
+                break
+        else:
+            connection.close()
+            return
+        if references > 1:
+            self.__connections[key] = (connection, references - 1)
+            return
+        del self.__connections[key]
+        connection.close()
+
+    def stop(self):
+        """Close all connections, stop the reactor and wait for the
+        reactor thread to exit.
+        """
+        if not self.__started:
+            return
+        self.call(self.__shutdown)
+        self.join()
+
+    def __shutdown(self):
+        for connection, references in self.__connections.values():
+            connection.close()
+        self.__connections = {}
+
+        # The container runs until all timers are removed; cancelled
+        # timers are only removed when the timer selectable expires, so
+        # schedule an immediate timer to have them removed.
+        for task in list(self.__tasks):
+            task.cancel()
+        self.container.schedule(0, ScheduledCall(lambda: None, []))
+        self.__injector.close()
+
+    def on_aorta_call(self, event):
+        self.__pending = False
+        while self.__calls:
+            func, args = self.__calls.popleft()
+            try:
+                func(*args)
+            except Exception:
+                self.logger.exception("Caught fatal exception")
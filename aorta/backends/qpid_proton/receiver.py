@@ -1,16 +1,46 @@
-import collections
+import functools
 import threading
 import uuid
 import queue
 
+from proton import Delivery
 from proton.handlers import MessagingHandler
-from proton.reactor import Container
 
 from aorta.backends.ireceiver import IReceiver
+from aorta.backends.qpid_proton import encoder
+from aorta.backends.qpid_proton import envelope
+from aorta.event import LazyEvent
+from aorta.exc import MalformedEvent
 
 
+class Receiver(MessagingHandler, IReceiver):
+    """A receiver link hosted by the :class:`~aorta.backends.qpid_proton.reactor.Reactor`
+    of its backend.
+    """
 
-class Receiver(MessagingHandler, threading.Thread, IReceiver):
+    #: The default number of seconds :meth:`wait` waits for the receiver
+    #: link to be attached, so that messages sent after the backend starts
+    #: listening are not missed.
+    attach_timeout = 5.0
+
+    #: The maximum number of messages that are either in flight (link
+    #: credit) or queued for dispatching.
+    high_watermark = 100
+
+    #: Link credit is replenished when the number of messages in flight
+    #: and queued for dispatching drops to this number.
+    low_watermark = 50
+
+    #: Determines when messages are accepted: on ``receive``, or after
+    #: they are dispatched to the listener (``dispatch``).
+    settlement = 'receive'
+
+    #: With ``dispatch`` settlement, the dispositions of dispatched
+    #: messages are sent in batches of up to this number of messages...
+    settle_batch_size = 64
+
+    #: ...or after this number of seconds.
+    settle_interval = 0.01
 
     @property
     def address(self):
@@ -22,41 +52,287 @@ class Receiver(MessagingHandler, threading.Thread, IReceiver):
 
     @classmethod
     def create(cls, backend, *args, **kwargs):
-        receiver = cls(backend, *args)
-        receiver.start()
-        return receiver
+        return cls(backend, *args, **kwargs)
 
     def __init__(self, backend, host, port, channel, options=None):
-        MessagingHandler.__init__(self)
+        """Initialize a new :class:`Receiver` instance.
+
+        Args:
+            backend: the backend owning the receiver.
+            host: the hostname of the AMQP server.
+            port: the port of the AMQP server.
+            channel: the channel to receive messages from.
+            options: a dictionary that may hold the ``high_watermark`` and
+                ``low_watermark`` keys to configure flow control, the
+                ``settlement``, ``settle_batch_size`` and ``settle_interval``
+                keys to configure settlement, and the ``link_options`` key
+                holding :class:`proton.reactor.LinkOption` objects. For
+                backwards compatibility, any other object is interpreted
+                as link options.
+
+        With ``dispatch`` settlement, a message is accepted after the
+        listener dispatched it, and released for redelivery if dispatching
+        failed, so that messages are not lost if the process crashes.
+        Messages that can not be decoded are rejected, so that the remote
+        peer may dead-letter them.
+        The dispositions are coalesced and sent by the reactor thread
+        every :attr:`settle_batch_size` messages or :attr:`settle_interval`
+        seconds.
+        """
+        if not isinstance(options, dict):
+            options = {'link_options': options}
+        self.settlement = options.get('settlement', self.settlement)
+        if self.settlement not in ('receive', 'dispatch'):
+            raise ValueError("Invalid settlement: {0}".format(self.settlement))
+        self.settle_batch_size = options.get('settle_batch_size',
+            self.settle_batch_size)
+        self.settle_interval = options.get('settle_interval', self.settle_interval)
+        MessagingHandler.__init__(self, prefetch=0,
+            auto_accept=self.settlement == 'receive')
+        self.high_watermark = options.get('high_watermark', self.high_watermark)
+        self.low_watermark = options.get('low_watermark',
+            min(self.low_watermark, self.high_watermark // 2))
+        if not 0 <= self.low_watermark < self.high_watermark:
+            raise ValueError("The low watermark must be lower than the high watermark.")
         self.backend = backend
         self.host = host
         self.port = port
         self.channel = channel
-        self.container = Container(self)
-        self.connection = self.container.connect(self.address)
-        self.receiver = self.container\
-            .create_receiver(self.connection, self.channel, options=options)
-        self.seen = collections.deque([], 2000)
+        self.reactor = backend.get_reactor(self.address)
+        self.connection = None
+        self.receiver = None
         self.receiver_id = uuid.uuid4().hex
-        threading.Thread.__init__(self, target=self.container.run, daemon=True)
+        self.attached = threading.Event()
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.stalled = False
+        self.deliveries = {}
+        self.failed = set()
+        self.rejected = set()
+        self.unsettled = []
+        self.settle_scheduled = False
+        self.stalls = backend.metrics.counter('aorta_credit_stalls_total',
+            "Number of times a receiver stopped granting link credit.",
+            dsn=self.dsn)
+        elapsed = backend.metrics.counter('aorta_decompression_seconds_total',
+            "Time spent decompressing message bodies.",
+            dsn=self.dsn)
+        self.decode_body = functools.partial(encoder.decode_body, elapsed=elapsed)
+        self.decode_message = functools.partial(encoder.decode, elapsed=elapsed)
+        self.reactor.call(self.open, options.get('link_options'))
+
+    def open(self, options=None):
+        """Opens the connection and the receiver link. Must be invoked
+        on the reactor thread.
+        """
+        log_msg = "Receiver (id: {0}) connecting to {1}"\
+            .format(self.receiver_id, self.dsn)
+        self.logger.info(log_msg)
+        self.connection = self.reactor.connect(self.address)
+        self.receiver = self.reactor.container.create_receiver(
+            self.connection, self.channel, options=options, handler=self)
+
+    def close(self):
+        """Closes the receiver link and the connection. Must be invoked
+        on the reactor thread.
+        """
+        self.flush_dispositions()
+        self.receiver.close()
+        self.reactor.disconnect(self.connection)
 
     def destroy(self):
         """Ceases the receiver activity and releases all resources."""
         self.logger.info("Tearing down connection {0}".format(self.dsn))
-        self.receiver.close()
-        self.connection.close()
-        self.join()
+        self.reactor.call(self.close)
 
-    def on_start(self, event):
-        log_msg = "Receiver (id: {0}) connecting to {1}"\
-            .format(self.receiver_id, self.dsn)
-        self.logger.info(log_msg)
+    def wait(self, timeout=None):
+        """Block until the receiver link is attached or `timeout`
+        seconds have passed. Return a boolean indicating if the link
+        is attached. If `timeout` is ``None``, wait for :attr:`attach_timeout`
+        seconds.
+        """
+        if timeout is None:
+            timeout = self.attach_timeout
+        return self.attached.wait(timeout)
 
-    def on_message(self, event):
+    def on_link_opened(self, event):
+        self.replenish()
+        self.attached.set()
+
+    def replenish(self):
+        """Grant link credit up to the high watermark if the number of
+        messages in flight and queued for dispatching dropped to the low
+        watermark. Must be invoked on the reactor thread.
+        """
+        credit = self.receiver.credit
+        with self.lock:
+            pending = self.pending
+            stalled, self.stalled = self.stalled, False
+            if credit + pending > self.low_watermark:
+                # If there are too many messages queued, credit is granted
+                # when they are dispatched; see notify_dispatched().
+                self.stalled = pending > self.low_watermark
+                if self.stalled and not stalled:
+                    self.stalls.inc()
+                return
+        self.receiver.flow(self.high_watermark - pending - credit)
+
+    def notify_failed(self, messages):
+        """Invoked by the backend when dispatching `messages` failed. With
+        ``dispatch`` settlement, the messages are released instead of
+        accepted, and forgotten by the deduplication window of the backend
+        so that they are dispatched again when they are redelivered.
+        """
+        if self.settlement == 'dispatch':
+            with self.lock:
+                self.failed.update(id(x) for x in messages)
+            for message in messages:
+                self.backend.forget_message(self.dsn, message.id)
+
+    def notify_dispatched(self, messages):
+        """Invoked by the backend when `messages` are dispatched to the
+        listener.
+        """
+        flush = schedule = False
+        with self.lock:
+            self.pending -= len(messages)
+            replenish = self.stalled and self.pending <= self.low_watermark
+            if replenish:
+                self.stalled = False
+            if self.settlement == 'dispatch':
+                failed = self.failed
+                rejected = self.rejected
+                for message in messages:
+                    key = id(message)
+                    disposition = self.deliveries.pop(key)
+                    disposition[1] -= 1
+
+                    # Releasing an envelope takes precedence over rejecting
+                    # it, since its failed messages may succeed when they
+                    # are redelivered.
+                    if key in failed:
+                        disposition[2] = Delivery.RELEASED
+                        failed.discard(key)
+                    elif key in rejected and disposition[2] == Delivery.ACCEPTED:
+                        disposition[2] = Delivery.REJECTED
+                    rejected.discard(key)
+                    if not disposition[1]:
+                        self.unsettled.append((disposition[0], disposition[2]))
+                flush = len(self.unsettled) >= self.settle_batch_size
+                schedule = not flush and not self.settle_scheduled
+                self.settle_scheduled |= schedule
+        if replenish:
+            self.reactor.call(self.replenish)
+        if flush:
+            self.reactor.call(self.flush_dispositions)
+        elif schedule:
+            self.reactor.call(self.reactor.schedule,
+                self.settle_interval, self.flush_scheduled_dispositions)
+
+    def flush_scheduled_dispositions(self):
+        with self.lock:
+            self.settle_scheduled = False
+        self.flush_dispositions()
+
+    def flush_dispositions(self):
+        """Sends the dispositions of the dispatched messages. Messages that
+        were dispatched successfully are accepted, messages that could not
+        be decoded are rejected, and others are released for redelivery.
+        Must be invoked on the reactor thread.
+        """
+        with self.lock:
+            unsettled, self.unsettled = self.unsettled, []
+        for delivery, state in unsettled:
+            if state == Delivery.ACCEPTED:
+                self.accept(delivery)
+            elif state == Delivery.REJECTED:
+                self.reject(delivery)
+            else:
+                self.release(delivery, delivered=True)
+
+    def decode(self, messages):
+        """Decodes the bodies of `messages` according to their content
+        encoding and content type. Messages carrying an event (i.e. specifying the ``event_type``
+        property) are wrapped in a :class:`~aorta.event.LazyEvent`, which
+        decodes the body when it is accessed. Messages that can not be
+        decoded or carry malformed events are dropped and, with ``dispatch``
+        settlement, rejected once they are dispatched.
+        """
+        decoded = []
+        for msg in messages:
+            try:
+                if 'event_type' in (msg.properties or {}):
+                    decoded.append(LazyEvent(msg, self.decode_body))
+                else:
+                    decoded.append(self.decode_message(msg))
+            except MalformedEvent as e:
+                log_msg = "Message (id: {0}, receiver: {1}) is malformed: {2}"\
+                    .format(msg.id, self.receiver_id, e)
+                self.logger.warning(log_msg)
+                self.notify_rejected(msg)
+            except Exception:
+                log_msg = "Message (id: {0}, receiver: {1}) could not be decoded"\
+                    .format(msg.id, self.receiver_id)
+                self.logger.exception(log_msg)
+                self.notify_rejected(msg)
+        return decoded
+
+    def notify_rejected(self, message):
+        """Invoked when `message` can not be decoded. With ``dispatch``
+        settlement, the message is rejected once it is dispatched, and
+        forgotten by the deduplication window of the backend so that it
+        is rejected again if its envelope is redelivered.
+        """
+        if self.settlement == 'dispatch':
+            with self.lock:
+                self.rejected.add(id(message))
+            self.backend.forget_message(self.dsn, message.id)
+
+    def unpack(self, event):
+        """Return a list holding the message of `event`, or the messages
+        in it if it is an envelope; see :mod:`~aorta.backends.qpid_proton.envelope`.
+        Duplicates are discarded.
+        """
         msg = event.message
-        if msg in self.seen:
+        messages = envelope.unpack(msg) if envelope.is_envelope(msg) else [msg]
+        received = []
+        for msg in messages:
+            if self.backend.is_duplicate(self.dsn, msg.id):
+                log_msg = "Message (id: {0}, receiver: {1}) is a duplicate"\
+                    .format(msg.id, self.receiver_id)
+                self.logger.debug(log_msg)
+                continue
+            log_msg = "Message (id: {0}, receiver: {1}) received from {2}"\
+                .format(msg.id, self.receiver_id, self.dsn)
+            self.logger.debug(log_msg)
+            received.append(msg)
+        return received
+
+    def on_message(self, event):
+        try:
+            messages = self.unpack(event)
+        except Exception:
+            log_msg = "Envelope (receiver: {0}) could not be unpacked"\
+                .format(self.receiver_id)
+            self.logger.exception(log_msg)
+            if self.settlement == 'dispatch':
+                self.reject(event.delivery)
+            self.replenish()
+            return
+        if not messages:
+            if self.settlement == 'dispatch':
+                self.accept(event.delivery)
+            self.replenish()
             return
-        log_msg = "Message (id: {0}, receiver: {1}) received from {2}"\
-            .format(msg.id, self.receiver_id, self.dsn)
-        self.logger.debug(log_msg)
-        self.backend.put(self, msg)
+
+        # With dispatch settlement, the messages of an envelope share a
+        # delivery, which is settled when all of them are dispatched.
+        with self.lock:
+            self.pending += len(messages)
+            if self.settlement == 'dispatch':
+                disposition = [event.delivery, len(messages), Delivery.ACCEPTED]
+                for msg in messages:
+                    self.deliveries[id(msg)] = disposition
+        for msg in messages:
+            self.backend.put(self, msg)
+        self.replenish()
@@ -1,16 +1,60 @@
+import collections
 import logging
-import queue
 import threading
 import time
 
-from proton import Message
 from proton.handlers import MessagingHandler
-from proton.reactor import Container
 
+from aorta.backends.future import SendFuture
 from aorta.backends.isender import ISender
+from aorta.backends.qpid_proton.encoder import MessageEncoder
+from aorta.backends.qpid_proton.envelope import Envelope
 
 
-class Sender(MessagingHandler, threading.Thread, ISender):
+class BatchTimeout:
+    """Resolves a batch of futures as timed out unless they are settled
+    within `timeout` seconds. The timer is cancelled once all futures
+    are resolved, so that it does not keep the reactor alive.
+    """
+    __slots__ = ['futures', 'pending', 'task']
+
+    def __init__(self, reactor, timeout, futures):
+        self.futures = futures
+        self.pending = len(futures)
+        self.task = reactor.schedule(timeout, self.expire)
+        for future in futures:
+            future.add_done_callback(self.notify_done)
+
+    def notify_done(self, future):
+        self.pending -= 1
+        if not self.pending:
+            self.task.cancel()
+
+    def expire(self):
+        for future in self.futures:
+            future.resolve(SendFuture.TIMEOUT)
+
+
+class Sender(MessagingHandler, ISender):
+    """A sender link hosted by the :class:`~aorta.backends.qpid_proton.reactor.Reactor`
+    of its backend.
+
+    Unsettled messages are retransmitted by the reactor when the connection
+    is re-established. If the backend has an outbox, messages released by
+    the remote peer are transferred again after :attr:`retry_interval`
+    seconds.
+
+    If `linger` is specified, messages are not transferred immediately:
+    the messages sent within `linger` seconds are packed into envelopes
+    of up to `linger_size` messages, which are transferred and settled
+    as a single AMQP message and unpacked by the receiver; see
+    :mod:`~aorta.backends.qpid_proton.envelope`. The futures of the
+    messages in an envelope are resolved with the outcome of the envelope.
+    """
+
+    #: The number of seconds after which released messages are transferred
+    #: again, if the backend has an outbox.
+    retry_interval = 1.0
 
     @property
     def address(self):
@@ -20,78 +64,305 @@ class Sender(MessagingHandler, threading.Thread, ISender):
     def dsn(self):
         return "{0}/{1}".format(self.address, self.channel)
 
+    @property
+    def available(self):
+        return self.reactor.is_available(self.address)
+
+    @property
+    def in_flight(self):
+        return len(self.events) + len(self.backlog) + len(self.lingering)
+
     @classmethod
-    def create(cls, backend, *args):
-        sender = cls(backend, *args)
-        sender.start()
-        return sender
+    def create(cls, backend, *args, **kwargs):
+        return cls(backend, *args, **kwargs)
 
     def destroy(self):
         """Ceases the senders' activity and releases all resources."""
         self.logger.info("Tearing down connection {0}".format(self.dsn))
-        self.connection.close()
-        self.join()
+        self.reactor.call(self.close)
+
+    def __init__(self, backend, host, port, channel, codec=None, connection=0,
+        compression=None, compression_threshold=1024, linger=None, linger_size=64):
+        """Initialize a new :class:`Sender` instance.
 
-    def __init__(self, backend, host, port, channel):
+        Args:
+            backend: the backend owning the sender.
+            host: the hostname of the AMQP server.
+            port: the port of the AMQP server.
+            channel: the channel to send messages to.
+            codec: the name of the :class:`~aorta.backends.codecs.Codec`
+                used to encode message bodies, or a codec instance. Defaults
+                to the native AMQP encoding.
+            connection: the index of the connection to the AMQP server
+                carrying the link. Senders with different indexes use
+                separate connections.
+            compression: the name of the :class:`~aorta.backends.compression.Compressor`
+                used to compress message bodies, or a compressor instance.
+                Defaults to no compression.
+            compression_threshold: the minimum size in bytes of an encoded
+                message body to compress.
+            linger: the number of seconds to wait for more messages before
+                transferring a message, or ``None`` to transfer messages
+                immediately.
+            linger_size: the maximum number of messages in an envelope.
+        """
+        if linger_size < 1:
+            raise ValueError("The linger size must be positive.")
         MessagingHandler.__init__(self)
         self.backend = backend
         self.host = host
         self.port = port
         self.channel = channel
-        self.container = Container(self)
-        self.connection = self.container.connect(self.address)
-        self.sender = self.container.create_sender(self.connection, self.channel)
+        self.encoder = MessageEncoder(codec, compression, compression_threshold,
+            saved=backend.metrics.counter('aorta_compression_saved_bytes_total',
+                "Number of bytes saved by compressing message bodies.",
+                dsn=self.dsn),
+            elapsed=backend.metrics.counter('aorta_compression_seconds_total',
+                "Time spent compressing message bodies.",
+                dsn=self.dsn))
+        self.connection_index = connection
+        self.reactor = backend.get_reactor(self.address, connection)
+        self.connection = None
+        self.sender = None
         self.events = {}
-        self.lock = threading.RLock()
-        threading.Thread.__init__(self, target=self.container.run, daemon=True)
-        self._event_started = threading.Event()
+        self.backlog = collections.deque()
+        self.linger = linger
+        self.linger_size = linger_size
+        self.lingering = []
+        self.linger_scheduled = False
+        self.condition = threading.Condition()
+        self.latency = backend.metrics.histogram('aorta_send_latency_seconds',
+            "Time from publishing a message until it is accepted.",
+            dsn=self.dsn)
+        self.reactor.call(self.open)
+
+    def open(self):
+        """Opens the connection and the sender link. Must be invoked
+        on the reactor thread.
+        """
+        self.connection = self.reactor.connect(self.address, self.connection_index)
+        self.sender = self.reactor.container\
+            .create_sender(self.connection, self.channel, handler=self)
+
+    def close(self):
+        """Closes the sender link and the connection. Must be invoked
+        on the reactor thread.
+        """
+        self.sender.close()
+        self.reactor.disconnect(self.connection)
+
+    def send(self, message, blocking=False, timeout=None, dsn=None):
+        """Sends a message to the AMQP server.
+
+        Args:
+            message: the :class:`~aorta.message.Message` to send.
+            blocking: a boolean indicating if the call must block until
+                the outcome of the send operation is known.
+            timeout: the number of milliseconds after which the returned
+                future is resolved as timed out if the remote peer did
+                not settle the message.
+            dsn: the DSN under which the message is recorded in the outbox
+                of the backend, i.e. the DSN specified by the caller.
+                Defaults to :attr:`dsn`.
 
-    def send(self, message, blocking=False, timeout=None):
-        """Sends a message to the AMQP server."""
+        Returns:
+            aorta.backends.future.SendFuture
+        """
         assert message.id is not None
-        if not self.sender.credit:
-            self.logger.warning(
-                "Message (id: {0}) scheduled (no link credit).".format(message.id))
+        future = SendFuture(message.id, self.condition)
+        timeout = ((timeout or 0) / 1000) or None
+        started = time.monotonic()
+        self.submit([message],
+            [(message.id, self.encoder.encode(message), future, started)],
+            timeout, dsn)
+
+        if blocking or timeout:
+            future.wait(timeout)
+        return future
+
+    def send_many(self, messages, blocking=False, timeout=None, recorded=False,
+        dsn=None):
+        """Sends multiple messages to the AMQP server. The messages are
+        handed to the reactor in a single call and transferred as link
+        credit permits.
+
+        Args:
+            messages: an iterable of :class:`~aorta.message.Message` objects.
+            blocking: a boolean indicating if the call must block until
+                the outcome of all send operations is known.
+            timeout: the number of milliseconds after which the pending
+                futures are resolved as timed out.
+            recorded: a boolean indicating if the messages are already
+                recorded in the outbox of the backend.
+            dsn: the DSN under which the messages are recorded in the
+                outbox of the backend. Defaults to :attr:`dsn`.
+
+        Returns:
+            A list of :class:`~aorta.backends.future.SendFuture` objects
+            in the order of `messages`.
+        """
+        futures = self.queue_many(messages, timeout=timeout, recorded=recorded,
+            dsn=dsn)
+        if blocking or timeout:
+            timeout = ((timeout or 0) / 1000) or None
+            deadline = time.monotonic() + timeout if timeout else None
+            for future in futures:
+                remaining = deadline - time.monotonic() if deadline else None
+                if not future.wait(remaining):
+                    break
+        return futures
+
+    def queue_many(self, messages, timeout=None, recorded=False, dsn=None):
+        """Like :meth:`send_many`, but return the futures without waiting
+        for the outcome of the send operations.
+        """
+        messages = list(messages)
+        batch = []
+        futures = []
+        encode = self.encoder.encode
+        started = time.monotonic()
+        for message in messages:
+            assert message.id is not None
+            future = SendFuture(message.id, self.condition)
+            batch.append((message.id, encode(message), future, started))
+            futures.append(future)
 
-        self._event_started.wait()
         timeout = ((timeout or 0) / 1000) or None
+        if recorded:
+            self.reactor.call(self._send, batch, timeout)
+        else:
+            self.submit(messages, batch, timeout, dsn)
+        return futures
 
-        message = Message(**message)
-        delivery = self.sender.send(message)
+    def submit(self, messages, batch, timeout, dsn=None):
+        """Schedules a batch of messages for transfer. If the backend
+        has an outbox, the messages are transferred once they are
+        recorded under `dsn`.
+        """
+        outbox = self.backend.outbox
+        if outbox is None:
+            self.reactor.call(self._send, batch, timeout)
+        else:
+            outbox.append(dsn or self.dsn, messages,
+                self.reactor.call, self._send, batch, timeout)
 
-        log_msg = "Message (id: {0}, delivery: {1}) dispatched to {2}."\
-            .format(message.id, delivery.tag, self.dsn)
-        self.logger.debug(log_msg)
+    def _send(self, batch, timeout):
+        if not self.sender.credit:
+            self.logger.warning(
+                "{0} message(s) scheduled (no link credit).".format(len(batch)))
+
+        if timeout is not None:
+            futures = [item[2] for item in batch]
+            BatchTimeout(self.reactor, timeout, futures)
+        if self.linger is None:
+            self.backlog.extend(batch)
+        else:
+            self.pack(batch)
+        self.flush()
+
+    def pack(self, batch):
+        """Adds a batch of messages to the lingering messages, moving
+        full envelopes to the backlog. The remaining messages are moved
+        to the backlog after :attr:`linger` seconds. Must be invoked on
+        the reactor thread.
+        """
+        lingering = self.lingering
+        lingering.extend(batch)
+        while len(lingering) >= self.linger_size:
+            self.backlog.append(self.seal(lingering[:self.linger_size]))
+            del lingering[:self.linger_size]
+        if lingering and not self.linger_scheduled:
+            self.linger_scheduled = True
+            self.reactor.schedule(self.linger, self.flush_lingering)
 
+    def flush_lingering(self):
+        """Moves the lingering messages to the backlog and transfers them.
+        Must be invoked on the reactor thread.
+        """
+        self.linger_scheduled = False
+        if self.lingering:
+            self.backlog.append(self.seal(self.lingering))
+            self.lingering = []
+        self.flush()
 
-        event = threading.Event()
-        with self.lock:
-            self.events[delivery.tag] = (message, event)
+    def seal(self, items):
+        # A single message is transferred as-is.
+        if len(items) == 1:
+            return items[0]
+        envelope = Envelope(items)
+        return (None, envelope.encode(), envelope, items[0][3])
 
-        if (blocking or timeout) and not event.wait(timeout):
-            pass
+    def flush(self):
+        """Transfers messages from the backlog while the link has
+        credit. Must be invoked on the reactor thread.
+        """
+        sender = self.sender
+        backlog = self.backlog
+        while backlog and sender.credit:
+            message_id, data, future, started = backlog.popleft()
+            if future.done():
+                continue
+            # The messages are encoded by the calling thread, so only the
+            # encoded bytes are transferred here.
+            delivery = sender.delivery(sender.delivery_tag())
+            sender.stream(data)
+            sender.advance()
+            self.events[delivery.tag] = (message_id, data, future, started)
 
-        # TODO: when send() returns succesfully this does not mean that the
-        # message has been succesfully accepted by the server. This is only
-        # known when on_accepted() receives an event for the corresponding
-        # delivery. There needs to be some kind of persistence mechanism
-        # that stores messages until there is a guaranted delivery to
-        # an acceptance by the server.
+            log_msg = "Message (id: {0}, delivery: {1}) dispatched to {2}."\
+                .format(message_id, delivery.tag, self.dsn)
+            self.logger.debug(log_msg)
 
-    def on_start(self, event):
-        self._event_started.set()
+    def on_sendable(self, event):
+        self.flush()
 
     def on_accepted(self, event):
         self.notify_accepted(event.delivery.tag)
 
+    def on_rejected(self, event):
+        self.notify_settled(event.delivery.tag, SendFuture.REJECTED)
+
+    def on_released(self, event):
+        self.notify_settled(event.delivery.tag, SendFuture.RELEASED)
+
+    def get_items(self, tag):
+        """Remove the delivery identified by `tag` from the transferred
+        messages and return a list holding the ``(message_id, data, future,
+        started)`` tuples of its messages.
+        """
+        item = self.events.pop(tag, None)
+        if item is None:
+            return []
+        if isinstance(item[2], Envelope):
+            return item[2].items
+        return [item]
+
     def notify_accepted(self, tag):
-        with self.lock:
-            msg, event = self.events.pop(tag, [None, threading.Event()])
-        if msg is None:
-            return
-
-        log_msg = "Message (id: {0}, delivery: {1}) accepted by {2}"\
-            .format(msg.id, tag, self.dsn)
-        self.logger.debug(log_msg)
-        self.backend.register_delivery()
-        event.set()
+        now = time.monotonic()
+        for message_id, data, future, started in self.get_items(tag):
+            log_msg = "Message (id: {0}, delivery: {1}) accepted by {2}"\
+                .format(message_id, tag, self.dsn)
+            self.logger.debug(log_msg)
+            self.latency.observe(now - started)
+            self.backend.register_delivery()
+            if self.backend.outbox is not None:
+                self.backend.outbox.remove(message_id)
+            future.resolve(SendFuture.ACCEPTED)
+
+    def notify_settled(self, tag, state):
+        retries = []
+        for message_id, data, future, started in self.get_items(tag):
+            log_msg = "Message (id: {0}, delivery: {1}) {2} by {3}"\
+                .format(message_id, tag, state, self.dsn)
+            self.logger.warning(log_msg)
+            if self.backend.outbox is not None:
+                if state == SendFuture.REJECTED:
+                    self.backend.outbox.remove(message_id)
+                else:
+                    # Released messages remain in the outbox until they are
+                    # accepted, so they are transferred again.
+                    retries.append((message_id, data,
+                        SendFuture(message_id, self.condition), started))
+            future.resolve(state)
+        if retries:
+            self.reactor.schedule(self.retry_interval, self._send, retries, None)
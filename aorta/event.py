@@ -0,0 +1,55 @@
+import uuid
+
+from aorta.exc import MalformedEvent
+
+
+class LazyEvent:
+    """Wraps an incoming message carrying an event. The event headers
+    (the fields of :class:`aorta.dto.EventAdapter`) are validated when
+    the :class:`LazyEvent` is created, while the body is decoded when it
+    is first accessed, so that events that are not handled do not pay
+    for decoding.
+
+    Attributes that are not defined by :class:`LazyEvent` are looked up
+    on the wrapped message.
+    """
+    __slots__ = ['message', 'sender_id', 'event_id', 'event_type', '_decode', '_body']
+
+    @property
+    def body(self):
+        if self._decode is not None:
+            decode, self._decode = self._decode, None
+            self._body = decode(self.message)
+        return self._body
+
+    def __init__(self, message, decode=None):
+        """Initialize a new :class:`LazyEvent` instance.
+
+        Args:
+            message: the incoming message.
+            decode: a callable accepting the message and returning its
+                decoded body, or ``None`` if the body of the message is
+                used as-is.
+
+        Raises:
+            aorta.exc.MalformedEvent: the event headers are missing or
+                invalid.
+        """
+        properties = getattr(message, 'properties', None) or {}
+        try:
+            self.sender_id = uuid.UUID(str(properties['sender_id']))
+            self.event_id = uuid.UUID(str(properties['event_id']))
+            self.event_type = properties['event_type']
+        except (KeyError, ValueError) as e:
+            raise MalformedEvent("Invalid event headers: {0}".format(e))
+        if not isinstance(self.event_type, str) or not self.event_type:
+            raise MalformedEvent("Invalid event type: {0}".format(self.event_type))
+        self.message = message
+        self._decode = decode
+        self._body = None if decode is not None else message.body
+
+    def __getattr__(self, attname):
+        return getattr(self.message, attname)
+
+    def __repr__(self):
+        return "<LazyEvent: {0} ({1})>".format(self.event_type, self.event_id)
@@ -2,3 +2,20 @@
 
 class MalformedEvent(Exception):
     pass
+
+
+class DeliveryFailed(Exception):
+    """Raised when a message was not accepted by the remote peer."""
+    pass
+
+
+class MessageRejected(DeliveryFailed):
+    pass
+
+
+class MessageReleased(DeliveryFailed):
+    pass
+
+
+class SendTimeout(DeliveryFailed):
+    pass
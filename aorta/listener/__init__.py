@@ -1 +1,26 @@
+import importlib
+
 from aorta.listener.base import Listener
+from aorta.listener.registry import HandlerRegistry
+
+
+#: Maps the names of the members that are imported when they are first
+#: accessed to their modules, so that importing the package does not
+#: import :mod:`asyncio` and :mod:`multiprocessing`.
+LAZY = {
+    'AsyncListener': 'aorta.listener.aio',
+    'Supervisor': 'aorta.listener.supervisor',
+}
+
+
+def __getattr__(name):
+    if name not in LAZY:
+        raise AttributeError(
+            "module {0} has no attribute {1}".format(__name__, name))
+    value = getattr(importlib.import_module(LAZY[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(LAZY))
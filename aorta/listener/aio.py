@@ -0,0 +1,97 @@
+import asyncio
+import collections
+import threading
+
+from aorta.listener.base import Listener
+
+
+class AsyncListener(Listener):
+    """A :class:`~aorta.listener.base.Listener` that is consumed from an
+    :mod:`asyncio` event loop::
+
+        listener = AsyncListener(dsn, backend=backend)
+        listener.start()
+        async for message in listener:
+            ...
+
+    Incoming messages are buffered up to `maxsize` messages. When the
+    buffer is full, the dispatching thread of the backend blocks until
+    the event loop has consumed a message or the listener is closed.
+    A consumer that stops iterating must invoke :meth:`close` to release
+    the dispatching thread; the backend closes its listeners when it is
+    destroyed.
+    """
+
+    def __init__(self, dsn, backend='aorta.backends.mock', maxsize=1000):
+        """Initialize a new :class:`AsyncListener` instance.
+
+        Args:
+            dsn: a string holding a Data Source Name (DSN) identifying
+                the AMQP 1.0 server and channel.
+            backend: indicates the backend to use. May be a string pointing
+                to the module holding the backend, or an actual instance.
+            maxsize: the maximum number of buffered messages.
+        """
+        Listener.__init__(self, dsn, backend=backend)
+        self.__buffer = collections.deque()
+        self.__maxsize = maxsize
+        self.__condition = threading.Condition(threading.Lock())
+        self.__closed = False
+        self.__loop = None
+        self.__waiter = None
+        self.__pending = False
+
+    def dispatch(self, message):
+        """Buffers an incoming message until it is consumed by the
+        event loop. Messages dispatched after the listener is closed
+        are discarded.
+        """
+        with self.__condition:
+            while len(self.__buffer) >= self.__maxsize and not self.__closed:
+                self.__condition.wait()
+            if self.__closed:
+                self.logger.debug("Discarding message (listener closed)")
+                return
+            self.__buffer.append(message)
+        self.__notify()
+        Listener.dispatch(self, message)
+
+    def close(self):
+        """Stop buffering messages and release the dispatching thread.
+        Iteration stops once the buffered messages are consumed.
+        """
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+        self.__notify()
+
+    def __notify(self):
+        loop = self.__loop
+        if loop is not None and not self.__pending:
+            self.__pending = True
+            loop.call_soon_threadsafe(self.__wakeup)
+
+    def __wakeup(self):
+        self.__pending = False
+        waiter = self.__waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.__loop is None:
+            self.__loop = asyncio.get_running_loop()
+        while not self.__buffer:
+            if self.__closed:
+                raise StopAsyncIteration
+            self.__waiter = self.__loop.create_future()
+            try:
+                await self.__waiter
+            finally:
+                self.__waiter = None
+        message = self.__buffer.popleft()
+        with self.__condition:
+            self.__condition.notify()
+        return message
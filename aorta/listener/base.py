@@ -1,19 +1,39 @@
+import logging
 import queue
 import threading
 
 from aorta.backends import load
 from aorta.backends.base import BaseMessagingBackend
+from aorta.listener.registry import HandlerRegistry
 
 
 class Listener:
     """The :class:`Listener` object subscribes to a channel and starts
     receiving all messages published to that channel.
+
+    Incoming messages are routed to the handlers registered with
+    :meth:`register` by their ``event_type`` property. If handlers are
+    registered, messages that no handler subscribes to are discarded
+    before they are decoded.
+
+    If the backend has priority lanes, messages are dispatched with
+    :attr:`priority`, unless a different priority is set for their event
+    type with :meth:`prioritize`.
     """
+    logger = logging.getLogger('aorta.listener')
+
+    #: The priority of the messages received by the listener; see the
+    #: `priorities` argument of :class:`~aorta.backends.base.BaseMessagingBackend`.
+    priority = 0
 
     @property
     def receiver_id(self):
         return self.__receiver.receiver_id
 
+    @property
+    def backend(self):
+        return self.__backend
+
     def __init__(self, dsn, backend='aorta.backends.mock'):
         """Initialize a new :class:`Listener` instance.
 
@@ -26,7 +46,8 @@ class Listener:
         self.__dsn = dsn
         self.__backend = load(backend)
         self.__receiver = None
-        #self.__handlers = MessageHandlersProvider()
+        self.__handlers = HandlerRegistry()
+        self.__priorities = HandlerRegistry()
         self.__lock = threading.RLock()
         self.__event = threading.Event()
 
@@ -40,17 +61,102 @@ class Listener:
             self.__backend.start()
         self.__backend.add_listener(self)
 
+    def register(self, event_type, handler):
+        """Register `handler` for events of the given `event_type`, which
+        is either an exact event type or a pattern such as ``orders.*``;
+        see :class:`~aorta.listener.registry.HandlerRegistry`.
+
+        Args:
+            event_type: the event type or pattern.
+            handler: an object with a ``handle()`` method or a callable,
+                invoked with the message as its sole argument.
+        """
+        self.__handlers.register(event_type, getattr(handler, 'handle', handler))
+
+    def prioritize(self, event_type, priority):
+        """Dispatch events of the given `event_type`, which is either an
+        exact event type or a pattern such as ``orders.*``, with `priority`
+        instead of :attr:`priority`. If multiple priorities match an event
+        type, the first priority set for the most specific match is used.
+        """
+        self.__priorities.register(event_type, priority)
+
+    def get_priority(self, message):
+        """Return the priority with which `message` is dispatched. Invoked
+        by the receiving thread of the backend, before `message` is decoded.
+        """
+        if not len(self.__priorities):
+            return self.priority
+        priorities = self.__priorities.resolve(self.get_event_type(message))
+        return priorities[0] if priorities else self.priority
+
+    def get_event_type(self, message):
+        """Return the event type of `message`, or ``None`` if it does
+        not specify one.
+        """
+        properties = getattr(message, 'properties', None) or {}
+        return properties.get('event_type')
+
+    def is_subscribed(self, message):
+        """Return a boolean indicating if a handler subscribes to
+        `message`. If no handlers are registered, the listener subscribes
+        to all messages.
+        """
+        if not len(self.__handlers):
+            return True
+        return bool(self.__handlers.resolve(self.get_event_type(message)))
+
     def setup(self, create_receiver):
         self.__receiver = create_receiver(self.__dsn, options=self.get_options())
 
     def get_options(self):
+        """Return a dictionary holding the options for the receiver
+        of this listener, or ``None`` to use the defaults of the backend.
+
+        The ``high_watermark`` option specifies the maximum number of
+        messages that are in flight or queued for dispatching to this
+        listener; when this number is reached, the broker stops sending
+        messages until the queued messages are dispatched and the number
+        drops to ``low_watermark``.
+        """
         return None
 
     def dispatch(self, message):
         """Dispatches an incoming message to the appropriate message
-        handlers.
+        handlers. All handlers are invoked even if one of them fails.
+        Return a boolean indicating if all handlers succeeded.
         """
+        handlers = self.__handlers.resolve(self.get_event_type(message))
+        failed = False
+        for handler in handlers:
+            try:
+                handler(message)
+            except Exception:
+                self.logger.exception("Caught fatal exception")
+                failed = True
         self.__event.set()
+        return not failed
+
+    def dispatch_batch(self, messages):
+        """Dispatches a batch of incoming messages, in order, and return
+        a list holding the messages that could not be dispatched. Subclasses
+        may override this method to process multiple messages at once.
+        """
+        failed = []
+        for message in messages:
+            try:
+                if self.dispatch(message) is False:
+                    failed.append(message)
+            except Exception:
+                self.logger.exception("Caught fatal exception")
+                failed.append(message)
+        return failed
+
+    def close(self):
+        """Invoked by the backend when it is destroyed. Subclasses that
+        block the dispatching thread must release it.
+        """
+        pass
 
     def wait(self):
         """Block until the :class:`Listener` has received a message."""
@@ -0,0 +1,91 @@
+import threading
+
+
+class TrieNode:
+    __slots__ = ['children', 'handlers']
+
+    def __init__(self):
+        self.children = {}
+        self.handlers = []
+
+
+class HandlerRegistry:
+    """Maps event types to the handlers subscribed to them.
+
+    Handlers are registered for an exact event type such as
+    ``orders.OrderCreated``, or for a pattern ending with a wildcard
+    segment, such as ``orders.*``, which matches all event types
+    starting with ``orders.``. The pattern ``*`` matches all events,
+    including events without an event type.
+
+    Exact event types are looked up in a dictionary and patterns are
+    stored in a trie of dot-separated segments. The handlers resolved
+    for an event type are cached, so that routing a message is a single
+    dictionary lookup regardless of the number of registered handlers.
+    Lookups do not acquire a lock.
+    """
+    WILDCARD = '*'
+
+    def __init__(self):
+        self.__exact = {}
+        self.__root = TrieNode()
+        self.__cache = {}
+        self.__count = 0
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return self.__count
+
+    def register(self, event_type, handler):
+        """Subscribe `handler` to `event_type`, which is an exact event
+        type or a pattern ending with a wildcard segment. Raise
+        :exc:`ValueError` if `event_type` is not a valid pattern.
+        """
+        segments = event_type.split('.')
+        wildcard = segments[-1] == self.WILDCARD
+        if wildcard:
+            segments.pop()
+        if self.WILDCARD in event_type and (not wildcard
+        or any(self.WILDCARD in x for x in segments)):
+            raise ValueError("Invalid event type pattern: {0}".format(event_type))
+
+        with self.__lock:
+            if wildcard:
+                node = self.__root
+                for segment in segments:
+                    node = node.children.setdefault(segment, TrieNode())
+                node.handlers.append(handler)
+            else:
+                self.__exact.setdefault(event_type, []).append(handler)
+            self.__count += 1
+
+            # Readers that resolved an event type with the old handlers
+            # store the result in the discarded cache.
+            self.__cache = {}
+
+    def resolve(self, event_type):
+        """Return a tuple holding the handlers subscribed to `event_type`,
+        in the order of registration for exact matches, followed by the
+        handlers of the matching patterns from the most to the least
+        specific.
+        """
+        cache = self.__cache
+        try:
+            return cache[event_type]
+        except KeyError:
+            pass
+
+        handlers = list(self.__exact.get(event_type, []))
+        node = self.__root
+        matches = [node.handlers]
+        if event_type is not None:
+            for segment in event_type.split('.')[:-1]:
+                node = node.children.get(segment)
+                if node is None:
+                    break
+                matches.append(node.handlers)
+        for x in reversed(matches):
+            handlers.extend(x)
+
+        result = cache[event_type] = tuple(handlers)
+        return result
@@ -0,0 +1,320 @@
+import collections
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import threading
+import time
+
+
+Worker = collections.namedtuple('Worker', ['process', 'stop', 'connection'])
+
+
+def run_worker(factory, stop, connection, interval):
+    """The main function of a worker process. Creates a listener with
+    `factory`, starts it and sends the metrics of its backend to the
+    supervisor over `connection` every `interval` seconds until `stop`
+    is set.
+    """
+    listener = factory()
+    listener.start()
+    backend = listener.backend
+    try:
+        while True:
+            connection.send(backend.metrics.snapshot())
+            if stop.wait(interval):
+                break
+    finally:
+        backend.destroy()
+        connection.close()
+
+
+def merge(snapshots):
+    """Merge the metric snapshots returned by
+    :meth:`~aorta.backends.metrics.Metrics.snapshot` into a single
+    snapshot. The values of samples with the same name and labels are
+    summed; the buckets, sums and counts of histograms are summed
+    separately.
+    """
+    merged = collections.OrderedDict()
+    for snapshot in snapshots:
+        for name, entry in snapshot.items():
+            target = merged.setdefault(name, {
+                'type': entry['type'],
+                'help': entry['help'],
+                'samples': collections.OrderedDict()
+            })
+            for labels, value in entry['samples']:
+                key = tuple(sorted(labels.items()))
+                current = target['samples'].get(key)
+                if current is None:
+                    target['samples'][key] = value
+                elif entry['type'] != 'histogram':
+                    target['samples'][key] = current + value
+                else:
+                    target['samples'][key] = {
+                        'buckets': [
+                            (bound, count + other)
+                            for (bound, count), (_, other)
+                            in zip(current['buckets'], value['buckets'])
+                        ],
+                        'sum': current['sum'] + value['sum'],
+                        'count': current['count'] + value['count']
+                    }
+    for entry in merged.values():
+        entry['samples'] = [
+            (dict(key), value) for key, value in entry['samples'].items()
+        ]
+    return merged
+
+
+class Supervisor:
+    """Runs a consumer group of worker processes, so that CPU-bound
+    handlers can use all cores of a machine.
+
+    Each worker process creates its own backend and :class:`~aorta.listener.base.Listener`
+    by invoking a factory, and competes with the other workers for the
+    messages of the channel. Workers that exit are restarted after
+    :attr:`restart_delay` seconds, and :meth:`restart` replaces the
+    workers one at a time. Each worker reports the metrics of its backend
+    to the supervisor, see :meth:`stats` and :meth:`metrics`.
+
+    Channels must be queues, i.e. the broker must distribute the messages
+    across the receivers of the workers instead of sending every message
+    to all of them.
+    """
+    logger = logging.getLogger('aorta.supervisor')
+
+    #: The number of seconds to wait before a worker that exited is
+    #: restarted.
+    restart_delay = 1.0
+
+    #: The number of seconds between the metric reports of a worker.
+    interval = 1.0
+
+    #: The number of seconds to wait for a worker to exit after it was
+    #: asked to stop, before it is terminated.
+    shutdown_timeout = 10.0
+
+    @property
+    def processes(self):
+        return self.__processes
+
+    @property
+    def restarts(self):
+        return self.__restarts
+
+    def __init__(self, factory, processes=None, restart_delay=None,
+        interval=None, shutdown_timeout=None, context=None):
+        """Initialize a new :class:`Supervisor` instance.
+
+        Args:
+            factory: a callable returning a :class:`~aorta.listener.base.Listener`
+                with its handlers registered. It is invoked in the worker
+                processes, and must be picklable if `context` does not
+                fork.
+            processes: the number of worker processes. Defaults to the
+                number of CPUs.
+            restart_delay: overrides :attr:`restart_delay`.
+            interval: overrides :attr:`interval`.
+            shutdown_timeout: overrides :attr:`shutdown_timeout`.
+            context: the :mod:`multiprocessing` context used to start
+                the worker processes. Defaults to the default context.
+        """
+        self.__factory = factory
+        self.__processes = processes or os.cpu_count() or 1
+        if self.__processes < 1:
+            raise ValueError("The number of processes must be positive.")
+        if restart_delay is not None:
+            self.restart_delay = restart_delay
+        if interval is not None:
+            self.interval = interval
+        if shutdown_timeout is not None:
+            self.shutdown_timeout = shutdown_timeout
+        self.__context = context or multiprocessing.get_context()
+        self.__workers = [None] * self.__processes
+        self.__retired = []
+        self.__exited = {}
+        self.__stats = {}
+        self.__restarts = 0
+        self.__running = False
+        self.__stopped = threading.Event()
+        self.__monitor = None
+        self.__lock = threading.RLock()
+        self.__condition = threading.Condition(self.__lock)
+
+    def start(self):
+        """Start the worker processes and the thread monitoring them."""
+        with self.__lock:
+            if self.__running:
+                return
+            self.__running = True
+            self.__stopped.clear()
+            for index in range(self.__processes):
+                self.spawn(index)
+        self.__monitor = threading.Thread(target=self.__main__, daemon=True,
+            name='aorta-supervisor')
+        self.__monitor.start()
+
+    def spawn(self, index):
+        """Start the worker process at `index`."""
+        # Each worker has its own pipe, so that a worker that is killed
+        # while sending its metrics does not block the other workers.
+        stop = self.__context.Event()
+        connection, writer = self.__context.Pipe(duplex=False)
+        process = self.__context.Process(target=run_worker,
+            args=(self.__factory, stop, writer, self.interval),
+            name='aorta-worker-{0}'.format(index), daemon=True)
+        process.start()
+        writer.close()
+        self.logger.info(
+            "Started worker {0} (pid: {1})".format(index, process.pid))
+        with self.__lock:
+            self.__workers[index] = Worker(process, stop, connection)
+            self.__exited.pop(index, None)
+
+    def pids(self):
+        """Return a list holding the process identifiers of the workers."""
+        with self.__lock:
+            return [x.process.pid if x else None for x in self.__workers]
+
+    def stats(self):
+        """Return a dictionary mapping the indexes of the workers to the
+        last metric snapshot they reported.
+        """
+        with self.__lock:
+            return {index: snapshot for index, (pid, snapshot)
+                in self.__stats.items()}
+
+    def metrics(self):
+        """Return the metrics of all workers merged into a single
+        snapshot; see :func:`merge`.
+        """
+        return merge(self.stats().values())
+
+    def wait_ready(self, index, timeout=None):
+        """Block until the current process of the worker at `index` has
+        reported its metrics, or `timeout` seconds have passed. Return a
+        boolean indicating if the worker is ready.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self.__condition:
+            while True:
+                worker = self.__workers[index]
+                if worker is None:
+                    return False
+                if self.__stats.get(index, (None, None))[0] == worker.process.pid:
+                    return True
+                remaining = deadline - time.monotonic() if deadline else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.__condition.wait(remaining)
+
+    def restart(self, timeout=None):
+        """Restart the workers one at a time. The next worker is stopped
+        when the new process of the previous worker is ready, or after
+        `timeout` seconds, so that the others keep consuming messages.
+        """
+        for index in range(self.__processes):
+            self.__stop_worker(index)
+            self.spawn(index)
+            if not self.wait_ready(index, timeout):
+                self.logger.warning(
+                    "Worker {0} is not ready after restart".format(index))
+
+    def stop(self):
+        """Stop all workers, terminating workers that do not exit within
+        :attr:`shutdown_timeout` seconds, and the monitoring thread.
+        """
+        with self.__lock:
+            if not self.__running:
+                return
+            self.__running = False
+            for worker in self.__workers:
+                if worker is not None:
+                    worker.stop.set()
+
+        # The monitoring thread keeps receiving metrics until the workers
+        # exited, so that they do not block sending them.
+        for index in range(self.__processes):
+            self.__stop_worker(index)
+        self.__stopped.set()
+        self.__monitor.join()
+
+    def __stop_worker(self, index):
+        # The worker is retired first, so that it is not restarted when
+        # it exits. Its connection is closed by the monitoring thread.
+        with self.__lock:
+            worker, self.__workers[index] = self.__workers[index], None
+            if worker is not None and worker.connection is not None:
+                self.__retired.append(worker.connection)
+        if worker is None:
+            return
+        process, stop = worker.process, worker.stop
+        stop.set()
+        process.join(self.shutdown_timeout)
+        if process.is_alive():
+            self.logger.warning(
+                "Terminating worker {0} (pid: {1})".format(index, process.pid))
+            process.terminate()
+            process.join()
+
+    def __receive(self, timeout):
+        # Metrics received from retired workers are discarded.
+        with self.__lock:
+            connections = {
+                worker.connection: index
+                for index, worker in enumerate(self.__workers)
+                if worker is not None and worker.connection is not None
+            }
+            retired = list(self.__retired)
+        ready = multiprocessing.connection.wait(list(connections) + retired,
+            timeout)
+        for connection in ready:
+            try:
+                snapshot = connection.recv()
+            except (EOFError, OSError):
+                self.__close(connection)
+                continue
+            index = connections.get(connection)
+            if index is None:
+                continue
+            with self.__condition:
+                worker = self.__workers[index]
+                if worker is not None and worker.connection is connection:
+                    self.__stats[index] = (worker.process.pid, snapshot)
+                    self.__condition.notify_all()
+
+    def __close(self, connection):
+        connection.close()
+        with self.__lock:
+            if connection in self.__retired:
+                self.__retired.remove(connection)
+            for index, worker in enumerate(self.__workers):
+                if worker is not None and worker.connection is connection:
+                    self.__workers[index] = worker._replace(connection=None)
+
+    def __supervise(self):
+        now = time.monotonic()
+        with self.__lock:
+            if not self.__running:
+                return
+            for index, worker in enumerate(self.__workers):
+                if worker is None or worker.process.is_alive():
+                    continue
+                process = worker.process
+                if index not in self.__exited:
+                    self.logger.warning(
+                        "Worker {0} (pid: {1}) exited with code {2}"
+                        .format(index, process.pid, process.exitcode))
+                    self.__exited[index] = now + self.restart_delay
+                elif now >= self.__exited[index]:
+                    self.__restarts += 1
+                    self.spawn(index)
+
+    def __main__(self):
+        while not self.__stopped.is_set():
+            self.__receive(min(self.interval, self.restart_delay) or 0.01)
+            self.__supervise()
+        for connection in list(self.__retired):
+            self.__close(connection)
@@ -0,0 +1,4 @@
+"""Throughput and latency benchmarks for the :mod:`aorta` client library.
+
+Run ``python -m benchmarks --help`` for usage.
+"""
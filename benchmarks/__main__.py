@@ -0,0 +1,80 @@
+import argparse
+import json
+import platform
+import sys
+import time
+
+from benchmarks.broker import Broker
+from benchmarks.suite import Benchmark
+from benchmarks.suite import compare
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+        description="Run the aorta benchmarks against an in-process broker.")
+    parser.add_argument('--messages', type=int, default=2000,
+        help="the number of messages per scenario (default: %(default)s)")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[64, 1024, 16384],
+        help="the message body sizes in bytes")
+    parser.add_argument('--channels', type=int, nargs='+', default=[1, 4],
+        help="the channel counts of the throughput scenario")
+    parser.add_argument('--backend', choices=Benchmark.backends, default='qpid_proton',
+        help="the backend to benchmark; the mock backend measures the "
+             "overhead of aorta without AMQP (default: %(default)s)")
+    parser.add_argument('--broker', default=None,
+        help="the host:port of an external broker to use instead")
+    parser.add_argument('--output', '-o', default=None,
+        help="write the results as JSON to this file")
+    parser.add_argument('--baseline', '-b', default=None,
+        help="compare the results to the JSON results of an earlier run")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+        help="the relative change considered a regression (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    broker = None
+    address = args.broker
+    if args.backend == 'mock':
+        address = address or 'localhost:5672'
+    elif address is None:
+        broker = Broker().start()
+        address = broker.address
+    try:
+        results = Benchmark(address, messages=args.messages, backend=args.backend)\
+            .run(sizes=args.sizes, channels=args.channels)
+    finally:
+        if broker is not None:
+            broker.stop()
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.time(),
+            'messages': args.messages,
+            'backend': args.backend
+        },
+        'results': results
+    }
+    for result in results:
+        print("{scenario:<12} size={size:<6} channels={channels:<3}".format(**result),
+            ' '.join('{0}={1:.3f}'.format(k, v) for k, v in result['metrics'].items()))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline is None:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = 0
+    print("\nComparison to {0} (tolerance {1:.0%}):".format(args.baseline, args.tolerance))
+    for key, metric, base, value, change, regressed in \
+    compare(results, baseline['results'], args.tolerance):
+        regressions += regressed
+        print("{0:<12} size={1:<6} channels={2:<3} {3:<28} {4:>12.3f} -> {5:>12.3f} ({6:+.1%}){7}"
+            .format(*key, metric, base, value, change, ' REGRESSION' if regressed else ''))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import collections
+import socket
+import threading
+
+from proton.handlers import MessagingHandler
+from proton.reactor import ApplicationEvent
+from proton.reactor import Container
+from proton.reactor import EventInjector
+
+
+class Broker(MessagingHandler):
+    """A minimal in-process AMQP 1.0 stand-in. Messages are accepted and
+    forwarded to all consumers of their address (fanout). Messages sent
+    to an address starting with :attr:`hold_prefix` are neither accepted
+    nor forwarded, so that they remain in flight at the sender.
+    """
+    hold_prefix = 'hold.'
+
+    @property
+    def address(self):
+        return "{0}:{1}".format(self.host, self.port)
+
+    def __init__(self, host='localhost', port=None):
+        MessagingHandler.__init__(self, auto_accept=False)
+        self.host = host
+        self.port = port or get_free_port(host)
+        self.consumers = collections.defaultdict(list)
+        self.container = Container(self)
+        self.injector = EventInjector()
+        self.container.selectable(self.injector)
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self.container.run, daemon=True)
+
+    def start(self):
+        """Start the broker on a background thread and wait until it
+        accepts connections.
+        """
+        self.thread.start()
+        self.ready.wait()
+        return self
+
+    def stop(self):
+        self.injector.trigger(ApplicationEvent('broker_stop'))
+        self.thread.join()
+
+    def on_start(self, event):
+        self.acceptor = event.container.listen(self.address)
+        self.ready.set()
+
+    def on_broker_stop(self, event):
+        self.acceptor.close()
+        self.injector.close()
+        self.container.stop()
+
+    def on_link_opening(self, event):
+        if event.link.is_sender:
+            address = event.link.remote_source.address
+            event.link.source.address = address
+            self.consumers[address].append(event.link)
+        else:
+            event.link.target.address = event.link.remote_target.address
+
+    def on_link_closing(self, event):
+        for links in self.consumers.values():
+            if event.link in links:
+                links.remove(event.link)
+
+    def on_disconnected(self, event):
+        for address, links in self.consumers.items():
+            self.consumers[address] = [
+                x for x in links if x.connection != event.connection]
+
+    def on_message(self, event):
+        address = event.link.target.address
+        if address.startswith(self.hold_prefix):
+            return
+        for link in self.consumers.get(address, []):
+            link.send(event.message)
+        self.accept(event.delivery)
+
+
+def get_free_port(host):
+    sock = socket.socket()
+    try:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+    finally:
+        sock.close()
@@ -0,0 +1,228 @@
+import collections
+import gc
+import threading
+import time
+import tracemalloc
+
+from aorta.backends import mock
+from aorta.backends import qpid_proton
+from aorta.listener import Listener
+from aorta.message import Message
+
+
+def percentiles(values, points=(50, 95, 99)):
+    """Return a dictionary mapping ``pN`` to the N-th percentile of
+    `values`, in milliseconds.
+    """
+    values = sorted(values)
+    result = {}
+    for point in points:
+        index = min(len(values) - 1, int(round(point / 100 * (len(values) - 1))))
+        result['p{0}'.format(point)] = values[index] * 1000
+    return result
+
+
+class Benchmark:
+    """Runs the benchmark scenarios against a broker at `address` and
+    collects their results as a list of dictionaries holding the
+    ``scenario``, ``size`` and ``channels`` parameters and the measured
+    ``metrics``.
+
+    If `backend` is ``mock``, messages are routed by the in-process broker
+    of :mod:`aorta.backends.mock` instead, which measures the overhead of
+    aorta itself.
+    """
+    backends = ['qpid_proton', 'mock']
+
+    def __init__(self, address, messages=2000, backend='qpid_proton'):
+        if backend not in self.backends:
+            raise ValueError("Invalid backend: {0}".format(backend))
+        self.address = address
+        self.messages = messages
+        self.backend = backend
+        self.results = []
+        self.__channel = 0
+
+    def get_dsns(self, channels, prefix='bench.'):
+        # Each scenario uses fresh channels, so that messages of earlier
+        # scenarios do not interfere.
+        self.__channel += 1
+        return [
+            "{0}/{1}{2}.{3}".format(self.address, prefix, self.__channel, i)
+            for i in range(channels)
+        ]
+
+    def create_backend(self, hold=False):
+        # Messages sent by a held backend remain in flight.
+        if self.backend == 'mock':
+            return mock.MessagingBackend(latency=3600 if hold else 0.0)
+        return qpid_proton.MessagingBackend()
+
+    def record(self, scenario, size, channels, **metrics):
+        self.results.append({
+            'scenario': scenario,
+            'size': size,
+            'channels': channels,
+            'metrics': metrics
+        })
+
+    def run(self, sizes=(64, 1024, 16384), channels=(1, 4)):
+        for size in sizes:
+            for n in channels:
+                self.throughput(size, n)
+            self.latency(size)
+            self.end_to_end(size)
+            self.memory(size)
+        return self.results
+
+    def throughput(self, size, channels):
+        """Measure the number of messages per second published with
+        :meth:`send_message` and accepted by the broker, and the
+        publish-to-accept latency under load.
+        """
+        backend = self.create_backend()
+        dsns = self.get_dsns(channels)
+        for dsn in dsns:
+            backend.send_message(dsn, Message(body=b''), block=True)
+
+        accepted = []
+        body = b'x' * size
+        futures = []
+        started = time.perf_counter()
+        for i in range(self.messages):
+            sent = time.perf_counter()
+            future = backend.send_message(dsns[i % channels], Message(body=body))
+            future.add_done_callback(
+                lambda f, sent=sent: accepted.append(time.perf_counter() - sent))
+            futures.append(future)
+        for future in futures:
+            future.result(60)
+        elapsed = time.perf_counter() - started
+        backend.destroy()
+
+        self.record('throughput', size, channels,
+            messages_per_second=self.messages / elapsed,
+            **{'latency_' + k + '_ms': v for k, v in percentiles(accepted).items()})
+
+    def latency(self, size):
+        """Measure the publish-to-accept latency of blocking sends, one
+        message at a time.
+        """
+        backend = self.create_backend()
+        dsn, = self.get_dsns(1)
+        body = b'x' * size
+        backend.send_message(dsn, Message(body=body), block=True)
+
+        samples = []
+        for i in range(min(self.messages, 500)):
+            started = time.perf_counter()
+            backend.send_message(dsn, Message(body=body), block=True)
+            samples.append(time.perf_counter() - started)
+        backend.destroy()
+
+        self.record('latency', size, 1,
+            **{k + '_ms': v for k, v in percentiles(samples).items()})
+
+    def end_to_end(self, size):
+        """Measure the latency from publishing a message until it is
+        dispatched to a :class:`~aorta.listener.Listener`.
+        """
+        backend = self.create_backend()
+        dsn, = self.get_dsns(1)
+        listener = RecordingListener(dsn, backend, self.messages)
+        listener.start()
+
+        body = b'x' * size
+        started = time.perf_counter()
+        for i in range(self.messages):
+            message = Message(body=body, properties={'sent': time.perf_counter()})
+            backend.send_message(dsn, message)
+        received = listener.done.wait(60)
+        elapsed = time.perf_counter() - started
+        backend.destroy()
+        if not received:
+            raise RuntimeError("Listener received {0} of {1} messages"
+                .format(len(listener.samples), self.messages))
+
+        self.record('end_to_end', size, 1,
+            messages_per_second=self.messages / elapsed,
+            **{'latency_' + k + '_ms': v
+                for k, v in percentiles(listener.samples).items()})
+
+    def memory(self, size):
+        """Measure the memory allocated per message in flight, i.e.
+        transferred to a broker that does not settle it.
+        """
+        backend = self.create_backend(hold=True)
+        dsn, = self.get_dsns(1, prefix='hold.')
+        sender = backend.get_sender(dsn)
+
+        # Wait until the link is established before measuring.
+        backend.send_message(dsn, Message(body=b''))
+        wait_for(lambda: sender.in_flight == 1)
+
+        messages = [Message(body=b'x' * size) for i in range(self.messages)]
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        backend.send_many(dsn, messages)
+        wait_for(lambda: sender.in_flight == self.messages + 1)
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        backend.destroy()
+
+        self.record('memory', size, 1,
+            bytes_per_message=(after - before) / self.messages)
+
+
+def wait_for(condition, timeout=60):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise RuntimeError("Timed out waiting for the broker.")
+        time.sleep(0.01)
+
+
+class RecordingListener(Listener):
+
+    def __init__(self, dsn, backend, expected):
+        Listener.__init__(self, dsn, backend=backend)
+        self.expected = expected
+        self.samples = []
+        self.done = threading.Event()
+
+    def dispatch(self, message):
+        self.samples.append(time.perf_counter() - message.properties['sent'])
+        if len(self.samples) >= self.expected:
+            self.done.set()
+
+
+#: Indicates if a larger value of a metric is better.
+HIGHER_IS_BETTER = ('messages_per_second',)
+
+
+def compare(results, baseline, tolerance=0.1):
+    """Compare `results` to the results of a `baseline` run. Return a list
+    of ``(key, metric, baseline, current, change, regressed)`` tuples,
+    where `change` is the relative change and `regressed` indicates if
+    the metric is worse than the baseline by more than `tolerance`.
+    """
+    def index(results):
+        return collections.OrderedDict(
+            ((x['scenario'], x['size'], x['channels']), x['metrics'])
+            for x in results
+        )
+
+    reference = index(baseline)
+    rows = []
+    for key, metrics in index(results).items():
+        for metric, value in metrics.items():
+            base = reference.get(key, {}).get(metric)
+            if not base:
+                continue
+            change = (value - base) / base
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            rows.append((key, metric, base, value, change, worse > tolerance))
+    return rows
+
@@ -13,7 +13,7 @@ MODULE_DESC = "A Python client for the Aorta server."
 SETUP_DIR = abspath(dirname(__file__))
 README_FILE = join(SETUP_DIR, 'README.rst')
 REQUIREMENTS = abspath(join(dirname(__file__), 'requirements.txt'))
-EXCLUDE_FROM_PACKAGES = []
+EXCLUDE_FROM_PACKAGES = ['benchmarks', 'benchmarks.*']
 MODULE_LONG = None
 if os.path.exists(README_FILE):
     MODULE_LONG = open(README_FILE).read()
@@ -42,6 +42,11 @@ setup(
     include_package_data=True,
     zip_safe=False,
     install_requires=install_requires,
+    extras_require={
+        'msgpack': ['msgpack'],
+        'lz4': ['lz4'],
+        'zstd': ['zstandard'],
+    },
     classifiers=[
         'Development Status :: 2 - Pre-Alpha',
         'Environment :: Web Environment',
@@ -41,12 +41,93 @@ class AortaTestCase(unittest.TestCase):
         self.backend.send_message(self.url, Message(body="Hello world!"), block=True)
         self.assertEqual(self.backend.deliveries, 4)
 
+    def test_send_many(self):
+        messages = [Message(body="Hello world!") for i in range(10)]
+        futures = self.backend.send_many(self.url, messages, block=True)
+        self.assertTrue(all(future.accepted for future in futures))
+        self.assertEqual(self.backend.deliveries, 10)
+        latency = self.backend.metrics.snapshot()['aorta_send_latency_seconds']
+        labels, value = latency['samples'][0]
+        self.assertEqual(value['count'], 10)
+
+    def test_channels_share_connection(self):
+        a = self.backend.get_sender(self.url)
+        b = self.backend.get_sender(self.url + '.shared')
+        self.backend.send_message(self.url, Message(body="Hello world!"), block=True)
+        self.backend.send_message(self.url + '.shared', Message(body="Hello world!"), block=True)
+        self.assertIs(a.connection, b.connection)
+        self.backend.destroy()
+
+    def test_sharded_links(self):
+        self.backend.configure(self.url, links=2)
+        messages = [Message(body="Hello world!") for i in range(10)]
+        futures = self.backend.send_many(self.url, messages, block=True)
+        self.assertTrue(all(future.accepted for future in futures))
+        a, b = self.backend.get_sender(self.url).senders
+        self.assertIsNot(a.connection, b.connection)
+        self.backend.destroy()
+
+    def test_failover_to_available_node(self):
+        # Nothing listens on the port below the AMQP port, so the first
+        # node is unavailable once the connection attempt is refused.
+        dsn = "amqp://{0}:{1},{0}:{2}/{3}".format(HOST, PORT - 1, PORT, CHANNEL)
+        sender = self.backend.get_sender(dsn)
+        deadline = time.monotonic() + 5
+        while sender.senders[0].available and time.monotonic() < deadline:
+            time.sleep(0.01)
+        messages = [Message(body="Hello world!") for i in range(10)]
+        futures = self.backend.send_many(dsn, messages, block=True, timeout=5000)
+        self.assertTrue(all(future.accepted for future in futures))
+        self.backend.destroy()
+
     def test_recv(self):
         self.backend.listen(self.url)
         self.backend.send_message(self.url, Message(body="Hello world!"))
         receiver_id, msg = self.backend.get()
         self.assertEqual(msg.body, "Hello world!")
 
+    def test_recv_compressed(self):
+        self.backend.configure(self.url, codec='json', compression='deflate',
+            compression_threshold=100)
+        receiver = self.backend.listen(self.url)
+        self.backend.send_message(self.url, Message(body={'foo': 'bar' * 1000}))
+        receiver, msg = self.backend.get()
+        self.assertEqual(msg.content_encoding, 'deflate')
+        msg, = receiver.decode([msg])
+        self.assertEqual(msg.body, {'foo': 'bar' * 1000})
+        saved = self.backend.metrics.snapshot()['aorta_compression_saved_bytes_total']
+        self.assertGreater(saved['samples'][0][1], 0)
+
+    def test_recv_compressed_amqp(self):
+        self.backend.configure(self.url, compression='deflate',
+            compression_threshold=100)
+        receiver = self.backend.listen(self.url)
+        self.backend.send_message(self.url, Message(body={'foo': 'bar' * 1000}))
+        receiver, msg = self.backend.get()
+        self.assertEqual(msg.content_encoding, 'deflate')
+        msg, = receiver.decode([msg])
+        self.assertEqual(msg.body, {'foo': 'bar' * 1000})
+
+    def test_recv_json(self):
+        self.backend.configure(self.url, codec='json')
+        receiver = self.backend.listen(self.url)
+        self.backend.send_message(self.url, Message(body={'foo': 'bar'}))
+        receiver, msg = self.backend.get()
+        msg, = receiver.decode([msg])
+        self.assertEqual(msg.content_type, 'application/json')
+        self.assertEqual(msg.body, {'foo': 'bar'})
+
+    def test_recv_lingering(self):
+        self.backend.configure(self.url, linger=0.005, linger_size=4)
+        self.backend.listen(self.url)
+        messages = [Message(body=i) for i in range(10)]
+        futures = self.backend.send_many(self.url, messages, block=True)
+        self.assertTrue(all(future.accepted for future in futures))
+        self.assertEqual(self.backend.deliveries, 10)
+        received = [self.backend.get()[1] for i in range(10)]
+        self.assertEqual([x.body for x in received], list(range(10)))
+        self.backend.destroy()
+
     def test_orphaned_received(self):
         self.backend.listen(self.url)
         self.backend.start()
@@ -58,6 +139,21 @@ class AortaTestCase(unittest.TestCase):
         self.backend.send_message(self.url, Message(body="Hello world!"), block=True)
         listener.wait()
 
+    def test_listener_accepts_after_dispatch(self):
+        self.backend.listen(self.url, options={'settlement': 'dispatch'})
+        listener = Listener(self.url, backend=self.backend)
+        listener.start()
+        self.backend.send_message(self.url, Message(body="Hello world!"), block=True)
+        listener.wait()
+        receiver = self.backend.receivers[self.url]
+        deadline = time.monotonic() + 5
+        while (receiver.deliveries or receiver.unsettled)\
+        and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(receiver.deliveries, {})
+        self.assertEqual(receiver.unsettled, [])
+        self.backend.destroy()
+
     def test_backend_dispatch_catches_fatal_exception(self):
         listener = ExceptionOnDispatchRaisingListener(
             self.url, backend=self.backend)
@@ -0,0 +1,142 @@
+import asyncio
+import threading
+import unittest
+import uuid
+
+from aorta.backends.aio import AsyncMessagingBackend
+from aorta.backends.aio import LoopBridge
+from aorta.backends.future import SendFuture
+from aorta.backends.mock import MockMessagingBackend
+from aorta.exc import MessageRejected
+from aorta.exc import MessageReleased
+from aorta.message import Message
+from aorta.listener import AsyncListener
+
+
+class LoopBridgeTestCase(unittest.TestCase):
+
+    def test_accepted_future_resolves_with_message_id(self):
+        async def main():
+            bridge = LoopBridge(asyncio.get_running_loop())
+            send_future = SendFuture('1', threading.Condition())
+            future = bridge.wrap(send_future)
+            threading.Thread(target=send_future.resolve,
+                args=[SendFuture.ACCEPTED]).start()
+            return await asyncio.wait_for(future, 5)
+
+        self.assertEqual(asyncio.run(main()), '1')
+
+    def test_rejected_future_raises(self):
+        async def main():
+            bridge = LoopBridge(asyncio.get_running_loop())
+            send_future = SendFuture('1', threading.Condition())
+            send_future.resolve(SendFuture.REJECTED)
+            return await asyncio.wait_for(bridge.wrap(send_future), 5)
+
+        self.assertRaises(MessageRejected, asyncio.run, main())
+
+    def test_cancelled_future_is_skipped(self):
+        async def main():
+            bridge = LoopBridge(asyncio.get_running_loop())
+            send_future = SendFuture('1', threading.Condition())
+            future = bridge.wrap(send_future)
+            future.cancel()
+            send_future.resolve(SendFuture.ACCEPTED)
+            await asyncio.sleep(0)
+            return future.cancelled()
+
+        self.assertTrue(asyncio.run(main()))
+
+
+class AsyncMessagingBackendTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.address = 'mock-{0}:5672'.format(uuid.uuid4().hex)
+        self.dsn = self.address + '/aorta.test'
+        self.backend = AsyncMessagingBackend(MockMessagingBackend(latency=0.01))
+        self.receiver = self.backend.listen(self.dsn)
+
+    def tearDown(self):
+        self.backend.destroy()
+
+    def test_send_message(self):
+        message = Message(body=1)
+        message_id = asyncio.run(self.backend.send_message(self.dsn, message))
+        self.assertEqual(message_id, message.id)
+        self.assertEqual(self.receiver.pending, 1)
+
+    def test_send_many(self):
+        messages = [Message(body=i) for i in range(3)]
+        results = asyncio.run(self.backend.send_many(self.dsn, messages))
+        self.assertEqual(results, [x.id for x in messages])
+
+    def test_send_many_returns_exceptions(self):
+        self.backend.get_broker(self.address).available = False
+        results = asyncio.run(
+            self.backend.send_many(self.dsn, [Message(body=i) for i in range(2)]))
+        self.assertEqual([type(x) for x in results], [MessageReleased] * 2)
+
+    def test_send_message_raises(self):
+        self.backend.get_broker(self.address).available = False
+        with self.assertRaises(MessageReleased):
+            asyncio.run(self.backend.send_message(self.dsn, Message(body=1)))
+
+    def test_bridge_per_event_loop(self):
+        async def main():
+            bridge = self.backend.get_bridge()
+            self.assertIs(self.backend.get_bridge(), bridge)
+            return bridge
+
+        self.assertIsNot(asyncio.run(main()), asyncio.run(main()))
+
+    def test_backend_attributes_are_delegated(self):
+        self.assertIs(self.backend.metrics, self.backend.backend.metrics)
+
+
+class AsyncListenerTestCase(unittest.TestCase):
+
+    def test_iterate_dispatched_messages(self):
+        listener = AsyncListener('localhost:5672/foo', maxsize=2)
+
+        def produce():
+            for i in range(10):
+                listener.dispatch(i)
+
+        async def main():
+            thread = threading.Thread(target=produce)
+            thread.start()
+            messages = []
+            async for message in listener:
+                messages.append(message)
+                if len(messages) == 10:
+                    break
+            thread.join()
+            return messages
+
+        self.assertEqual(asyncio.run(main()), list(range(10)))
+
+    def test_close_releases_dispatching_thread(self):
+        listener = AsyncListener('localhost:5672/foo', maxsize=1)
+        listener.dispatch(0)
+        thread = threading.Thread(target=listener.dispatch, args=[1])
+        thread.start()
+        thread.join(0.1)
+        self.assertTrue(thread.is_alive())
+        listener.close()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+    def test_iteration_stops_when_closed(self):
+        listener = AsyncListener('localhost:5672/foo')
+        listener.dispatch(0)
+
+        async def main():
+            loop = asyncio.get_running_loop()
+            loop.call_later(0.01, listener.close)
+            return [message async for message in listener]
+
+        self.assertEqual(asyncio.run(main()), [0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,208 @@
+import unittest
+import uuid
+
+from aorta.backends.balancer import BalancedSender
+from aorta.backends.future import SendFuture
+from aorta.backends.mock import MessagingBackend
+from aorta.message import Message
+
+
+class UnresponsiveOutbox:
+
+    def append(self, dsn, messages, callback=None, *args):
+        pass
+
+    def pending(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class BalancedSenderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.hosts = ['mock-{0}'.format(uuid.uuid4().hex) for i in range(3)]
+        self.dsn = 'amqp://{0}/aorta.test'.format(
+            ','.join(x + ':5672' for x in self.hosts))
+        self.backend = MessagingBackend()
+        self.receivers = [
+            self.backend.listen('{0}:5672/aorta.test'.format(x))
+            for x in self.hosts
+        ]
+
+    def tearDown(self):
+        self.backend.destroy()
+
+    def get_counts(self):
+        return [x.pending for x in self.receivers]
+
+    def send(self, messages, **options):
+        self.backend.configure(self.dsn, **options)
+        return self.backend.send_many(self.dsn, messages)
+
+    def test_sender_is_balanced(self):
+        sender = self.backend.get_sender(self.dsn)
+        self.assertIsInstance(sender, BalancedSender)
+        self.assertEqual(len(sender.senders), 3)
+        self.assertTrue(sender.available)
+
+    def test_round_robin(self):
+        futures = self.send([Message(body=i) for i in range(6)])
+        self.assertTrue(all(x.accepted for x in futures))
+        self.assertEqual(self.get_counts(), [2, 2, 2])
+
+    def test_round_robin_send_message(self):
+        for i in range(3):
+            self.backend.send_message(self.dsn, Message(body=i))
+        self.assertEqual(self.get_counts(), [1, 1, 1])
+
+    def test_futures_are_in_message_order(self):
+        messages = [Message(body=i) for i in range(5)]
+        futures = self.send(messages)
+        self.assertEqual([x.message_id for x in futures], [x.id for x in messages])
+
+    def test_unavailable_nodes_are_skipped(self):
+        self.backend.get_broker(self.hosts[1] + ':5672').available = False
+        futures = self.send([Message(body=i) for i in range(4)])
+        self.assertTrue(all(x.accepted for x in futures))
+        self.assertEqual(self.get_counts(), [2, 0, 2])
+
+    def test_no_available_nodes(self):
+        for host in self.hosts:
+            self.backend.get_broker(host + ':5672').available = False
+        futures = self.send([Message(body=i) for i in range(3)])
+        self.assertFalse(self.backend.get_sender(self.dsn).available)
+        self.assertEqual([x.state for x in futures], [SendFuture.RELEASED] * 3)
+
+    def test_least_in_flight(self):
+        backend = MessagingBackend(latency=60)
+        self.addCleanup(backend.destroy)
+        backend.configure(self.dsn, strategy='least_in_flight')
+        sender = backend.get_sender(self.dsn)
+        sender.senders[0].send_many([Message(id=str(i)) for i in range(2)])
+        sender.senders[1].send_many([Message(id='2')])
+        self.assertIs(sender.select(Message()), sender.senders[2])
+
+    def test_sticky(self):
+        messages = [
+            Message(body=i, properties={'sender_id': str(i % 4)})
+            for i in range(40)
+        ]
+        self.send(messages, strategy='sticky', key='sender_id')
+        sender = self.backend.get_sender(self.dsn)
+        for message in messages:
+            self.assertIs(sender.select(message), sender.select(
+                Message(properties={'sender_id': message['properties']['sender_id']})))
+
+    def test_sticky_keys_of_unavailable_node_move(self):
+        self.backend.configure(self.dsn, strategy='sticky',
+            key=lambda message: message['body'])
+        sender = self.backend.get_sender(self.dsn)
+        messages = [Message(body=i) for i in range(50)]
+        before = [sender.select(x) for x in messages]
+        down = before[0]
+        self.backend.get_broker(down.address).available = False
+        after = [sender.select(x) for x in messages]
+        for x, y in zip(before, after):
+            if x is not down:
+                self.assertIs(x, y)
+            else:
+                self.assertIsNot(y, down)
+
+    def test_sticky_without_key_is_round_robin(self):
+        self.send([Message(body=i) for i in range(3)],
+            strategy='sticky', key='sender_id')
+        self.assertEqual(self.get_counts(), [1, 1, 1])
+
+    def test_invalid_strategy_raises(self):
+        with self.assertRaises(ValueError):
+            BalancedSender(self.dsn, [], strategy='random')
+
+    def test_sticky_requires_key(self):
+        with self.assertRaises(ValueError):
+            BalancedSender(self.dsn, [], strategy='sticky')
+
+    def test_blocking_send(self):
+        backend = MessagingBackend(latency=0.01)
+        self.addCleanup(backend.destroy)
+        futures = backend.send_many(self.dsn,
+            [Message(body=i) for i in range(3)], block=True)
+        self.assertTrue(all(x.accepted for x in futures))
+        self.assertEqual(backend.get_sender(self.dsn).in_flight, 0)
+
+    def test_timeout(self):
+        backend = MessagingBackend(latency=60)
+        self.addCleanup(backend.destroy)
+        futures = backend.send_many(self.dsn,
+            [Message(body=i) for i in range(3)], timeout=10)
+
+        # send_many() returns at the deadline, which may be before the
+        # timer thread of the broker resolved the futures.
+        for future in futures:
+            future.wait(5)
+        self.assertEqual([x.state for x in futures], [SendFuture.TIMEOUT] * 3)
+
+    def test_timeout_stops_waiting_at_deadline(self):
+        backend = MessagingBackend(outbox=UnresponsiveOutbox())
+        self.addCleanup(backend.destroy)
+        futures = backend.send_many(self.dsn,
+            [Message(body=i) for i in range(3)], timeout=10)
+        self.assertEqual([x.state for x in futures], [SendFuture.PENDING] * 3)
+
+    def test_listen_on_multiple_nodes_raises(self):
+        with self.assertRaises(ValueError):
+            self.backend.listen(self.dsn)
+
+
+class ShardedSenderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dsn = 'mock-{0}:5672/aorta.test'.format(uuid.uuid4().hex)
+        self.backend = MessagingBackend(latency=60)
+
+    def tearDown(self):
+        self.backend.destroy()
+
+    def test_links(self):
+        self.backend.configure(self.dsn, links=3)
+        sender = self.backend.get_sender(self.dsn)
+        self.assertIsInstance(sender, BalancedSender)
+        self.assertEqual(len(sender.senders), 3)
+        self.backend.send_many(self.dsn, [Message(body=i) for i in range(6)])
+        self.assertEqual([x.in_flight for x in sender.senders], [2, 2, 2])
+        self.assertEqual(sender.in_flight, 6)
+
+    def test_links_with_key_affinity(self):
+        self.backend.configure(self.dsn, links=4, strategy='sticky', key='sender_id')
+        messages = [
+            Message(body=i, properties={'sender_id': 'a'})
+            for i in range(5)
+        ]
+        self.backend.send_many(self.dsn, messages)
+        sender = self.backend.get_sender(self.dsn)
+        self.assertEqual(sorted(x.in_flight for x in sender.senders), [0, 0, 0, 5])
+
+    def test_keys_are_spread_across_links(self):
+        self.backend.configure(self.dsn, links=4, strategy='sticky', key='sender_id')
+        messages = [
+            Message(body=i, properties={'sender_id': str(i)})
+            for i in range(200)
+        ]
+        self.backend.send_many(self.dsn, messages)
+        sender = self.backend.get_sender(self.dsn)
+        self.assertTrue(all(x.in_flight for x in sender.senders))
+
+    def test_links_per_node(self):
+        dsn = 'amqp://{0}:5672,{1}:5672/aorta.test'.format(
+            uuid.uuid4().hex, uuid.uuid4().hex)
+        self.backend.configure(dsn, links=2)
+        self.assertEqual(len(self.backend.get_sender(dsn).senders), 4)
+
+    def test_invalid_links_raises(self):
+        with self.assertRaises(ValueError):
+            self.backend.configure(self.dsn, links=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
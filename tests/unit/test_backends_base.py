@@ -0,0 +1,75 @@
+import threading
+import unittest
+
+from aorta.backends.ireceiver import IReceiver
+from aorta.backends.mock import MockMessagingBackend
+from aorta.message import Message
+
+
+class UnattachedReceiver(IReceiver):
+    backend = None
+    listened = None
+
+    @classmethod
+    def create(cls, backend, host, port, channel, options=None):
+        return cls(backend, channel)
+
+    def __init__(self, backend, channel):
+        self.backend = backend
+        self.channel = channel
+        self.receiver_id = channel
+
+    def wait(self, timeout=None):
+        if self.channel != 'first':
+            return True
+        # Another thread must be able to create a receiver while this
+        # receiver is waiting.
+        thread = threading.Thread(target=self.backend.listen,
+            args=['localhost:5672/second'])
+        thread.start()
+        thread.join(5)
+        UnattachedReceiver.listened = not thread.is_alive()
+        return False
+
+
+class RecordingSender:
+
+    @classmethod
+    def create(cls, backend, host, port, channel):
+        return cls()
+
+    def send_many(self, messages, blocking=False, timeout=None, dsn=None):
+        self.messages = list(messages)
+        return self.messages
+
+
+class ListenTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = MockMessagingBackend()
+        self.backend.receiver_class = UnattachedReceiver
+
+    def test_wait_does_not_hold_lock(self):
+        with self.assertLogs('aorta', level='WARNING'):
+            self.backend.listen('localhost:5672/first')
+        self.assertTrue(UnattachedReceiver.listened)
+        self.assertIn('localhost:5672/second', self.backend.receivers)
+
+
+class SendManyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = MockMessagingBackend()
+        self.backend.sender_class = RecordingSender
+        self.dsn = 'localhost:5672/foo'
+
+    def test_send_many_accepts_generator(self):
+        messages = (Message(body=i) for i in range(3))
+        self.backend.send_many(self.dsn, messages)
+        sent = self.backend.get_sender(self.dsn).messages
+        self.assertEqual([x['body'] for x in sent], [0, 1, 2])
+        self.assertTrue(all(x.id is not None for x in sent))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+
+from proton import Message as ProtonMessage
+
+from aorta.backends import codecs
+from aorta.backends.mock import MockMessagingBackend
+from aorta.backends.qpid_proton import encoder
+from aorta.message import Message
+
+
+class CodecsTestCase(unittest.TestCase):
+
+    def test_default_codec_is_amqp(self):
+        self.assertIsInstance(codecs.get(), codecs.AMQPCodec)
+
+    def test_get_by_name(self):
+        self.assertIsInstance(codecs.get('json'), codecs.JSONCodec)
+
+    def test_get_instance(self):
+        codec = codecs.JSONCodec()
+        self.assertIs(codecs.get(codec), codec)
+
+    def test_get_unknown_codec_raises(self):
+        with self.assertRaises(LookupError):
+            codecs.get('unknown')
+
+    def test_get_by_content_type(self):
+        self.assertIsInstance(codecs.get_by_content_type('application/json'),
+            codecs.JSONCodec)
+        self.assertIsNone(codecs.get_by_content_type('text/plain'))
+
+    def test_json_roundtrip(self):
+        codec = codecs.get('json')
+        body = {'foo': [1, 2, 'bar']}
+        self.assertEqual(codec.decode(codec.encode(body)), body)
+
+
+class MessageEncoderTestCase(unittest.TestCase):
+
+    def decode(self, data):
+        msg = ProtonMessage()
+        msg.decode(data)
+        return msg
+
+    def test_encode_amqp(self):
+        message = Message(id='1', body={'foo': 'bar'},
+            properties={'event_type': 'foo'})
+        msg = self.decode(encoder.MessageEncoder().encode(message))
+        self.assertEqual(msg.id, '1')
+        self.assertEqual(msg.body, {'foo': 'bar'})
+        self.assertEqual(msg.properties, {'event_type': 'foo'})
+
+    def test_encode_json(self):
+        message = Message(id='1', body={'foo': 'bar'})
+        msg = self.decode(encoder.MessageEncoder('json').encode(message))
+        self.assertEqual(msg.content_type, 'application/json')
+        self.assertEqual(encoder.decode(msg).body, {'foo': 'bar'})
+
+    def test_codec_content_type_takes_precedence(self):
+        message = Message(id='1', body={'foo': 'bar'}, content_type='text/plain')
+        msg = self.decode(encoder.MessageEncoder('json').encode(message))
+        self.assertEqual(msg.content_type, 'application/json')
+        self.assertEqual(encoder.decode(msg).body, {'foo': 'bar'})
+
+    def test_encode_resets_reused_message(self):
+        enc = encoder.MessageEncoder()
+        enc.encode(Message(id='1', subject='foo', body='bar'))
+        msg = self.decode(enc.encode(Message(id='2', body='baz')))
+        self.assertEqual(msg.id, '2')
+        self.assertIsNone(msg.subject)
+
+    def test_encode_invalid_attribute_raises(self):
+        with self.assertRaises(AttributeError):
+            encoder.MessageEncoder().encode(Message(foo='bar'))
+
+    def test_decode_without_content_type(self):
+        msg = ProtonMessage(body=b'foo')
+        self.assertEqual(encoder.decode(msg).body, b'foo')
+
+
+class StubSender:
+
+    @classmethod
+    def create(cls, backend, host, port, channel, **options):
+        return cls(options)
+
+    def __init__(self, options):
+        self.options = options
+
+
+class ConfigureTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = MockMessagingBackend()
+        self.backend.sender_class = StubSender
+        self.dsn = 'localhost:5672/foo'
+
+    def test_options_are_passed_to_sender(self):
+        self.backend.configure(self.dsn, codec='json')
+        sender = self.backend.get_sender(self.dsn)
+        self.assertEqual(sender.options, {'codec': 'json'})
+
+    def test_configure_after_sender_is_created_raises(self):
+        self.backend.get_sender(self.dsn)
+        with self.assertRaises(RuntimeError):
+            self.backend.configure(self.dsn, codec='json')
+
+
+if __name__ == '__main__':
+    unittest.main()
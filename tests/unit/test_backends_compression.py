@@ -0,0 +1,137 @@
+import unittest
+import zlib
+
+from proton import Message as ProtonMessage
+
+from aorta.backends import compression
+from aorta.backends.metrics import Counter
+from aorta.backends.qpid_proton import encoder
+from aorta.message import Message
+
+
+class CompressionTestCase(unittest.TestCase):
+
+    def test_get_by_name(self):
+        self.assertIsInstance(compression.get('deflate'),
+            compression.ZlibCompressor)
+
+    def test_get_instance(self):
+        compressor = compression.ZlibCompressor(level=1)
+        self.assertIs(compression.get(compressor), compressor)
+
+    def test_get_unknown_compressor_raises(self):
+        with self.assertRaises(LookupError):
+            compression.get('unknown')
+
+    def test_get_by_encoding(self):
+        self.assertIsInstance(compression.get_by_encoding('deflate'),
+            compression.ZlibCompressor)
+        self.assertIsNone(compression.get_by_encoding('identity'))
+
+    def test_zlib_roundtrip(self):
+        compressor = compression.get('deflate')
+        data = b'foo' * 100
+        self.assertEqual(compressor.decompress(compressor.compress(data)), data)
+
+    def test_base_compressor_raises(self):
+        with self.assertRaises(NotImplementedError):
+            compression.Compressor().compress(b'')
+        with self.assertRaises(NotImplementedError):
+            compression.Compressor().decompress(b'')
+
+    @unittest.skipIf(compression.lz4 is None, "lz4 is not installed")
+    def test_lz4_roundtrip(self):
+        compressor = compression.get('lz4')
+        self.assertEqual(compressor.decompress(compressor.compress(b'foo' * 100)),
+            b'foo' * 100)
+
+    @unittest.skipIf(compression.zstandard is None, "zstandard is not installed")
+    def test_zstd_roundtrip(self):
+        compressor = compression.get('zstd')
+        self.assertEqual(compressor.decompress(compressor.compress(b'foo' * 100)),
+            b'foo' * 100)
+
+
+class CompressingEncoderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = Counter()
+        self.elapsed = Counter()
+        self.encoder = encoder.MessageEncoder('json', 'deflate', threshold=100,
+            saved=self.saved, elapsed=self.elapsed)
+
+    def encode(self, message):
+        msg = ProtonMessage()
+        msg.decode(self.encoder.encode(message))
+        return msg
+
+    def test_large_bodies_are_compressed(self):
+        body = {'foo': 'bar' * 1000}
+        msg = self.encode(Message(id='1', body=body))
+        self.assertEqual(msg.content_encoding, 'deflate')
+        self.assertEqual(msg.content_type, 'application/json')
+        self.assertEqual(zlib.decompress(msg.body), b'{"foo":"' + b'bar' * 1000 + b'"}')
+        self.assertGreater(self.saved.value, 2500)
+        self.assertGreater(self.elapsed.value, 0)
+
+        elapsed = Counter()
+        self.assertEqual(encoder.decode(msg, elapsed).body, body)
+        self.assertIsNone(encoder.message_encoding(msg))
+        self.assertGreater(elapsed.value, 0)
+
+    def test_small_bodies_are_not_compressed(self):
+        msg = self.encode(Message(id='1', body={'foo': 'bar'}))
+        self.assertEqual(msg.content_encoding, 'None')
+        self.assertEqual(self.saved.value, 0)
+
+    def test_incompressible_bodies_are_not_compressed(self):
+        enc = encoder.MessageEncoder(compressor='deflate', threshold=10)
+        data = bytes(range(256))
+        msg = ProtonMessage()
+        msg.decode(enc.encode(Message(id='1', body=data)))
+        self.assertEqual(msg.content_encoding, 'None')
+        self.assertEqual(msg.body, data)
+
+    def test_binary_amqp_bodies_are_compressed(self):
+        enc = encoder.MessageEncoder(compressor='deflate', threshold=10)
+        msg = ProtonMessage()
+        msg.decode(enc.encode(Message(id='1', body=b'foo' * 100)))
+        self.assertEqual(msg.content_encoding, 'deflate')
+        self.assertEqual(encoder.decode(msg).body, b'foo' * 100)
+
+    def test_amqp_bodies_are_compressed(self):
+        enc = encoder.MessageEncoder(None, 'deflate', 16)
+        body = {'foo': 'bar' * 2000, 'baz': [1, 2.5, None]}
+        msg = ProtonMessage()
+        msg.decode(enc.encode(Message(id='1', body=body)))
+        self.assertEqual(msg.content_encoding, 'deflate')
+        self.assertEqual(msg.content_type, encoder.AMQP_VALUE)
+        self.assertLess(len(msg.body), 1000)
+        encoder.decode(msg)
+        self.assertEqual(msg.body, body)
+        self.assertEqual(encoder.message_content_type(msg), None)
+
+    def test_small_amqp_bodies_are_sent_as_is(self):
+        enc = encoder.MessageEncoder(compressor='deflate', threshold=1000)
+        msg = ProtonMessage()
+        msg.decode(enc.encode(Message(id='1', body={'foo': 'bar'})))
+        self.assertEqual(msg.content_encoding, 'None')
+        self.assertEqual(msg.body, {'foo': 'bar'})
+
+    def test_amqp_bodies_with_content_type_are_not_compressed(self):
+        enc = encoder.MessageEncoder(compressor='deflate', threshold=10)
+        msg = ProtonMessage()
+        msg.decode(enc.encode(Message(id='1', body='foo' * 100,
+            content_type='text/plain')))
+        self.assertEqual(msg.content_encoding, 'None')
+        self.assertEqual(msg.body, 'foo' * 100)
+
+    def test_message_content_encoding_is_preserved(self):
+        msg = self.encode(Message(id='1', body={'foo': 'bar' * 100},
+            content_encoding='identity'))
+        self.assertEqual(msg.content_encoding, 'identity')
+        self.assertEqual(encoder.decode(msg).body, {'foo': 'bar' * 100})
+
+
+if __name__ == '__main__':
+    unittest.main()
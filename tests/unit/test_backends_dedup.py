@@ -0,0 +1,195 @@
+import time
+import unittest
+import uuid
+
+from aorta.backends.dedup import DeduplicationWindow
+from aorta.backends.dedup import get_message_timestamp
+from aorta.backends.ids import SortableIdGenerator
+from aorta.backends.mock import MockMessagingBackend
+
+
+class DeduplicationWindowTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.window = DeduplicationWindow(capacity=3, ttl=10,
+            clock=lambda: self.now)
+
+    def test_first_key_is_not_seen(self):
+        self.assertFalse(self.window.seen('a'))
+        self.assertEqual(self.window.misses, 1)
+
+    def test_duplicate_key_is_seen(self):
+        self.window.seen('a')
+        self.assertTrue(self.window.seen('a'))
+        self.assertEqual(self.window.hits, 1)
+
+    def test_capacity_evicts_least_recently_seen(self):
+        for key in ('a', 'b', 'c'):
+            self.window.seen(key)
+        self.window.seen('a')
+        self.window.seen('d')
+        self.assertEqual(len(self.window), 3)
+        self.assertNotIn('b', self.window)
+        self.assertIn('a', self.window)
+
+    def test_ttl_expires_keys(self):
+        self.window.seen('a')
+        self.now = 5
+        self.window.seen('b')
+        self.now = 11
+        self.assertNotIn('a', self.window)
+        self.assertIn('b', self.window)
+        self.assertFalse(self.window.seen('a'))
+
+    def test_invalid_capacity(self):
+        self.assertRaises(ValueError, DeduplicationWindow, capacity=0)
+
+    def test_unbounded_window_raises(self):
+        self.assertRaises(ValueError, DeduplicationWindow, capacity=None)
+
+    def test_clear(self):
+        self.window.seen('a')
+        self.window.clear()
+        self.assertEqual(len(self.window), 0)
+
+    def test_forget(self):
+        self.window.seen('a')
+        self.window.forget('a')
+        self.window.forget('b')
+        self.assertFalse(self.window.seen('a'))
+
+
+class OrderedDeduplicationWindowTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 100
+        self.window = DeduplicationWindow(capacity=None, ttl=10,
+            clock=lambda: self.now, timestamp=lambda key: key)
+
+    def test_clock_defaults_to_wall_time(self):
+        window = DeduplicationWindow(timestamp=get_message_timestamp)
+        self.assertIs(window.clock, time.time)
+        self.assertIs(DeduplicationWindow().clock, time.monotonic)
+
+    def test_duplicate_key_is_seen(self):
+        self.assertFalse(self.window.seen(95))
+        self.assertTrue(self.window.seen(95))
+        self.assertEqual((self.window.hits, self.window.misses), (1, 1))
+
+    def test_keys_expire_by_timestamp(self):
+        # Keys are received out of order, but expire in order of their
+        # timestamps.
+        self.window.seen(98)
+        self.window.seen(92)
+        self.now = 103
+        self.assertNotIn(92, self.window)
+        self.assertIn(98, self.window)
+        self.now = 108
+        self.assertNotIn(98, self.window)
+
+    def test_keys_before_window_are_not_remembered(self):
+        self.assertFalse(self.window.seen(90))
+        self.assertFalse(self.window.seen(90))
+        self.assertEqual(len(self.window), 0)
+
+    def test_capacity_evicts_oldest_key(self):
+        window = DeduplicationWindow(capacity=2, ttl=None,
+            clock=lambda: self.now, timestamp=lambda key: key)
+        for key in (99, 95, 97):
+            window.seen(key)
+        self.assertNotIn(95, window)
+        self.assertIn(97, window)
+        self.assertIn(99, window)
+
+    def test_forgotten_keys_are_not_expired_again(self):
+        self.window.seen(95)
+        self.window.forget(95)
+        self.assertFalse(self.window.seen(96))
+        self.now = 105.5
+        self.assertNotIn(95, self.window)
+        self.assertIn(96, self.window)
+
+    def test_forgotten_keys_are_not_evicted(self):
+        window = DeduplicationWindow(capacity=2, ttl=None,
+            clock=lambda: self.now, timestamp=lambda key: key)
+        for key in (95, 97):
+            window.seen(key)
+        window.forget(95)
+        window.seen(99)
+        window.seen(98)
+        self.assertNotIn(97, window)
+        self.assertIn(98, window)
+        self.assertIn(99, window)
+
+    def test_invalid_timestamps_use_clock(self):
+        window = DeduplicationWindow(ttl=10, clock=lambda: self.now,
+            timestamp=get_message_timestamp)
+        window.seen(('localhost:5672/foo', 'foo'))
+        self.now = 109
+        self.assertIn(('localhost:5672/foo', 'foo'), window)
+        self.now = 110
+        self.assertNotIn(('localhost:5672/foo', 'foo'), window)
+
+    def test_future_timestamps_use_clock(self):
+        self.assertFalse(self.window.seen(200))
+        self.now = 109
+        self.assertIn(200, self.window)
+        self.now = 110
+        self.assertNotIn(200, self.window)
+
+    def test_random_ids_do_not_grow_window(self):
+        self.now = 1700000000.0
+        window = DeduplicationWindow(capacity=None, ttl=60,
+            clock=lambda: self.now, timestamp=get_message_timestamp)
+        sortable = SortableIdGenerator(clock=lambda: self.now)
+        for i in range(1000):
+            window.seen(('foo', uuid.uuid4().hex))
+            window.seen(('foo', sortable()))
+        self.now += 3600
+        window.seen(('foo', sortable()))
+        self.assertEqual(len(window), 1)
+
+    def test_random_ids_do_not_evict_sortable_ids(self):
+        self.now = 1700000000.0
+        window = DeduplicationWindow(capacity=100, clock=lambda: self.now,
+            timestamp=get_message_timestamp)
+        for i in range(100):
+            window.seen(('foo', uuid.uuid4().hex))
+        message_id = SortableIdGenerator(clock=lambda: self.now)()
+        self.assertFalse(window.seen(('foo', message_id)))
+        self.assertTrue(window.seen(('foo', message_id)))
+
+    def test_get_message_timestamp(self):
+        message_id = SortableIdGenerator(clock=lambda: 1700000000.0)()
+        self.assertEqual(get_message_timestamp(('foo', message_id)), 1700000000.0)
+
+
+class BackendDeduplicationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = MockMessagingBackend()
+
+    def test_message_without_id_is_not_duplicate(self):
+        self.assertFalse(self.backend.is_duplicate('localhost:5672/foo', None))
+        self.assertFalse(self.backend.is_duplicate('localhost:5672/foo', None))
+
+    def test_duplicate_is_detected_per_dsn(self):
+        self.assertFalse(self.backend.is_duplicate('localhost:5672/foo', 'a'))
+        self.assertFalse(self.backend.is_duplicate('localhost:5672/bar', 'a'))
+        self.assertTrue(self.backend.is_duplicate('localhost:5672/foo', 'a'))
+
+    def test_forget_message(self):
+        self.backend.is_duplicate('localhost:5672/foo', 'a')
+        self.backend.forget_message('localhost:5672/foo', 'a')
+        self.backend.forget_message('localhost:5672/foo', None)
+        self.assertFalse(self.backend.is_duplicate('localhost:5672/foo', 'a'))
+
+    def test_empty_window_is_used(self):
+        window = DeduplicationWindow(capacity=10)
+        backend = MockMessagingBackend(deduplication=window)
+        self.assertIs(backend.deduplication, window)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,239 @@
+import collections
+import threading
+import unittest
+
+from aorta.backends.dispatch import DispatchQueue
+from aorta.backends.dispatch import Partitioner
+from aorta.backends.dispatch import PriorityDispatchQueue
+from aorta.backends.ireceiver import IReceiver
+from aorta.backends.mock import MockMessagingBackend
+
+
+class Receiver(IReceiver):
+
+    def __init__(self, receiver_id):
+        self.receiver_id = receiver_id
+        self.dispatched = 0
+
+    def notify_dispatched(self, messages):
+        self.dispatched += len(messages)
+
+Message = collections.namedtuple('Message', ['properties', 'body'])
+
+
+class PartitionerTestCase(unittest.TestCase):
+
+    def test_single_partition(self):
+        partitioner = Partitioner(1, 'event_type')
+        self.assertEqual(partitioner(Receiver('a'), Message({}, None)), 0)
+
+    def test_same_key_same_partition(self):
+        partitioner = Partitioner(8, 'event_type')
+        message = Message({'event_type': 'foo.Bar'}, None)
+        self.assertEqual(
+            partitioner(Receiver('a'), message),
+            partitioner(Receiver('b'), message))
+
+    def test_callable_key(self):
+        partitioner = Partitioner(4, lambda receiver, message: message.body)
+        self.assertEqual(partitioner(Receiver('a'), Message({}, 6)), 2)
+
+    def test_invalid_key(self):
+        self.assertRaises(ValueError, Partitioner, 2, 'foo')
+
+    def test_invalid_partitions(self):
+        self.assertRaises(ValueError, Partitioner, 0)
+
+
+class DispatchQueueTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = DispatchQueue()
+
+    def test_get_batch_drains_up_to_maxsize(self):
+        for i in range(5):
+            self.queue.put(i)
+        self.assertEqual(self.queue.get_batch(3), [0, 1, 2])
+        self.assertEqual(self.queue.get_batch(3), [3, 4])
+
+    def test_get_batch_returns_empty_when_closed(self):
+        self.queue.put(1)
+        self.queue.close()
+        self.assertEqual(self.queue.get_batch(3), [1])
+        self.assertEqual(self.queue.get_batch(3), [])
+
+    def test_close_wakes_consumer(self):
+        batches = []
+        thread = threading.Thread(
+            target=lambda: batches.append(self.queue.get_batch(3)))
+        thread.start()
+        self.queue.close()
+        thread.join(5)
+        self.assertEqual(batches, [[]])
+
+
+class PriorityDispatchQueueTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = PriorityDispatchQueue({0: 1, 5: 4})
+
+    def test_invalid_lanes(self):
+        self.assertRaises(ValueError, PriorityDispatchQueue, {})
+        self.assertRaises(ValueError, PriorityDispatchQueue, {0: 0})
+        self.assertRaises(ValueError, PriorityDispatchQueue, {0: 1.5})
+
+    def test_fifo_within_lane(self):
+        for i in range(5):
+            self.queue.put(i)
+        self.assertEqual(len(self.queue), 5)
+        self.assertEqual(self.queue.get_batch(10), [0, 1, 2, 3, 4])
+
+    def test_high_priority_is_not_blocked_by_backlog(self):
+        for i in range(100):
+            self.queue.put(('bulk', i))
+        self.queue.put(('control', 0), 5)
+        self.assertEqual(self.queue.get_batch(2), [('control', 0), ('bulk', 0)])
+
+    def test_lanes_are_served_by_weight(self):
+        for i in range(20):
+            self.queue.put(('bulk', i), 0)
+            self.queue.put(('urgent', i), 5)
+        batch = self.queue.get_batch(10)
+        self.assertEqual([x[0] for x in batch],
+            ['urgent'] * 4 + ['bulk'] + ['urgent'] * 4 + ['bulk'])
+
+    def test_low_priority_is_not_starved(self):
+        for i in range(1000):
+            self.queue.put(('urgent', i), 5)
+        self.queue.put(('bulk', 0), 0)
+        batch = [self.queue.get() for i in range(5)]
+        self.assertIn(('bulk', 0), batch)
+
+    def test_lane_keeps_turn_across_batches(self):
+        for i in range(10):
+            self.queue.put(('bulk', i), 0)
+            self.queue.put(('urgent', i), 5)
+        self.assertEqual(self.queue.get_batch(3),
+            [('urgent', 0), ('urgent', 1), ('urgent', 2)])
+        self.assertEqual(self.queue.get_batch(2), [('urgent', 3), ('bulk', 0)])
+
+    def test_unknown_priorities(self):
+        self.queue.put('a', 3)
+        self.queue.put('b', 9)
+        self.queue.put('c', -1)
+        self.assertEqual(self.queue.depth(0), 2)
+        self.assertEqual(self.queue.depth(5), 1)
+        self.assertEqual(self.queue.depth(3), 2)
+
+    def test_get_batch_returns_empty_when_closed(self):
+        self.queue.put(1, 5)
+        self.queue.close()
+        self.assertTrue(self.queue.closed)
+        self.assertEqual(self.queue.get_batch(3), [1])
+        self.assertEqual(self.queue.get_batch(3), [])
+
+    def test_close_wakes_consumer(self):
+        batches = []
+        thread = threading.Thread(
+            target=lambda: batches.append(self.queue.get_batch(3)))
+        thread.start()
+        self.queue.close()
+        thread.join(5)
+        self.assertEqual(batches, [[]])
+
+    def test_get_blocks_until_put(self):
+        items = []
+        thread = threading.Thread(target=lambda: items.append(self.queue.get()))
+        thread.start()
+        self.queue.put(1)
+        thread.join(5)
+        self.assertEqual(items, [1])
+
+
+class RecordingListener:
+
+    def __init__(self, receiver_id):
+        self.receiver_id = receiver_id
+        self.dispatched = collections.defaultdict(list)
+        self.threads = set()
+        self.closed = False
+
+    def setup(self, listen):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def is_subscribed(self, message):
+        return True
+
+    def get_priority(self, message):
+        return message.properties.get('priority', 0)
+
+    def dispatch_batch(self, messages):
+        self.threads.add(threading.current_thread())
+        for message in messages:
+            key, value = message.body
+            self.dispatched[key].append(value)
+
+
+class ParallelDispatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = MockMessagingBackend(dispatchers=4,
+            partition_key=lambda receiver, message: message.body[0])
+        self.receiver = Receiver('a')
+        self.listener = RecordingListener('a')
+        self.backend.add_listener(self.listener)
+
+    def test_order_is_preserved_per_key(self):
+        self.backend.start()
+        for i in range(100):
+            for key in range(4):
+                self.backend.put(self.receiver, Message({}, (key, i)))
+        self.backend.destroy()
+        self.assertEqual(len(self.listener.threads), 4)
+        for key in range(4):
+            self.assertEqual(self.listener.dispatched[key], list(range(100)))
+        self.assertEqual(self.receiver.dispatched, 400)
+        self.assertTrue(self.listener.closed)
+
+    def test_orphaned_receiver_is_skipped(self):
+        self.backend.start()
+        self.backend.put(Receiver('b'), Message({}, (0, 0)))
+        self.backend.put(self.receiver, Message({}, (0, 1)))
+        self.backend.destroy()
+        self.assertEqual(self.listener.dispatched[0], [1])
+
+
+
+class PriorityDispatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = MockMessagingBackend(priorities={0: 1, 1: 8})
+        self.receiver = Receiver('a')
+        self.listener = RecordingListener('a')
+        self.backend.add_listener(self.listener)
+
+    def test_messages_are_dispatched_by_priority(self):
+        for i in range(10):
+            self.backend.put(self.receiver, Message({}, (0, i)))
+        self.backend.put(self.receiver, Message({'priority': 1}, (1, 0)))
+        self.assertEqual(self.backend.get(),
+            (self.receiver, Message({'priority': 1}, (1, 0))))
+        metrics = self.backend.metrics.snapshot()
+        self.assertEqual(metrics['aorta_incoming_lane_depth']['samples'],
+            [({'priority': '0'}, 10), ({'priority': '1'}, 0)])
+
+    def test_all_messages_are_dispatched(self):
+        self.backend.start()
+        for i in range(100):
+            self.backend.put(self.receiver, Message({'priority': i % 2}, (i % 2, i)))
+        self.backend.destroy()
+        self.assertEqual(self.listener.dispatched[0], list(range(0, 100, 2)))
+        self.assertEqual(self.listener.dispatched[1], list(range(1, 100, 2)))
+        self.assertEqual(self.receiver.dispatched, 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
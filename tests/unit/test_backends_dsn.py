@@ -0,0 +1,57 @@
+import unittest
+
+from aorta.backends.dsn import DSN
+from aorta.backends.dsn import parse_dsn
+from aorta.backends.dsn import parse_nodes
+
+
+class ParseDSNTestCase(unittest.TestCase):
+
+    def test_parse(self):
+        dsn = parse_dsn('localhost:5672/aorta.test')
+        self.assertEqual(dsn, DSN('localhost', 5672, 'aorta.test'))
+        self.assertEqual(dsn.address, 'localhost:5672')
+        self.assertEqual(str(dsn), 'localhost:5672/aorta.test')
+
+    def test_parse_is_cached(self):
+        self.assertIs(parse_dsn('localhost:5672/foo'), parse_dsn('localhost:5672/foo'))
+
+    def test_parse_dsn_instance(self):
+        dsn = DSN('localhost', 5672, 'foo')
+        self.assertIs(parse_dsn(dsn), dsn)
+
+    def test_parse_invalid_dsn_raises(self):
+        with self.assertRaises(ValueError):
+            parse_dsn('localhost/foo')
+
+    def test_parse_scheme(self):
+        self.assertEqual(parse_dsn('amqp://localhost:5672/foo'),
+            DSN('localhost', 5672, 'foo'))
+
+    def test_parse_multiple_nodes_raises(self):
+        with self.assertRaises(ValueError):
+            parse_dsn('amqp://h1:5672,h2:5672/foo')
+
+
+class ParseNodesTestCase(unittest.TestCase):
+
+    def test_parse_nodes(self):
+        self.assertEqual(parse_nodes('amqp://h1:5672,h2:5673/foo'),
+            (DSN('h1', 5672, 'foo'), DSN('h2', 5673, 'foo')))
+
+    def test_parse_single_node(self):
+        self.assertEqual(parse_nodes('localhost:5672/foo'),
+            (DSN('localhost', 5672, 'foo'),))
+
+    def test_parse_dsn_instance(self):
+        dsn = DSN('localhost', 5672, 'foo')
+        self.assertEqual(parse_nodes(dsn), (dsn,))
+
+    def test_parse_invalid_node_raises(self):
+        for dsn in ['h1:5672,/foo', 'h1:5672,h2/foo', 'amqp://h1:5672', 'h1:port/foo']:
+            with self.assertRaises(ValueError):
+                parse_nodes(dsn)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import threading
+import unittest
+
+from aorta.backends.future import SendFuture
+from aorta.exc import MessageRejected
+from aorta.exc import SendTimeout
+
+
+class SendFutureTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.future = SendFuture('1', threading.Condition())
+
+    def test_resolve_accepted(self):
+        self.assertTrue(self.future.resolve(SendFuture.ACCEPTED))
+        self.assertTrue(self.future.done())
+        self.assertTrue(self.future.accepted)
+        self.assertEqual(self.future.result(), '1')
+
+    def test_resolve_only_once(self):
+        self.future.resolve(SendFuture.ACCEPTED)
+        self.assertFalse(self.future.resolve(SendFuture.REJECTED))
+        self.assertEqual(self.future.state, SendFuture.ACCEPTED)
+
+    def test_result_raises_on_rejected(self):
+        self.future.resolve(SendFuture.REJECTED)
+        self.assertRaises(MessageRejected, self.future.result)
+
+    def test_result_raises_on_timeout(self):
+        self.assertRaises(SendTimeout, self.future.result, 0.01)
+        self.future.resolve(SendFuture.TIMEOUT)
+        self.assertRaises(SendTimeout, self.future.result)
+
+    def test_callback_invoked_on_resolve(self):
+        futures = []
+        self.future.add_done_callback(futures.append)
+        self.assertEqual(futures, [])
+        self.future.resolve(SendFuture.ACCEPTED)
+        self.assertEqual(futures, [self.future])
+
+    def test_callback_invoked_if_resolved(self):
+        futures = []
+        self.future.resolve(SendFuture.ACCEPTED)
+        self.future.add_done_callback(futures.append)
+        self.assertEqual(futures, [self.future])
+
+    def test_failing_callback_does_not_stop_others(self):
+        futures = []
+        def fail(future):
+            raise Exception
+        self.future.add_done_callback(fail)
+        self.future.add_done_callback(futures.append)
+        with self.assertLogs('aorta', level='ERROR'):
+            self.future.resolve(SendFuture.ACCEPTED)
+        self.assertEqual(futures, [self.future])
+
+    def test_wait_from_other_thread(self):
+        timer = threading.Timer(0.01, self.future.resolve, [SendFuture.ACCEPTED])
+        timer.start()
+        self.assertTrue(self.future.wait(5))
+
+
+if __name__ == '__main__':
+    unittest.main()
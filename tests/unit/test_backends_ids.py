@@ -0,0 +1,103 @@
+import os
+import unittest
+import uuid
+
+from aorta.backends import ids
+from aorta.backends.ids import IdGenerator
+from aorta.backends.ids import SortableIdGenerator
+from aorta.backends.mock import MockMessagingBackend
+from aorta.message import Message
+
+
+class SortableIdGeneratorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1700000000.0
+        self.generator = SortableIdGenerator(clock=lambda: self.now)
+
+    def test_ids_are_hexadecimal_uuids(self):
+        message_id = self.generator()
+        self.assertEqual(uuid.UUID(message_id).hex, message_id)
+
+    def test_ids_are_monotonic(self):
+        generated = [self.generator() for i in range(1000)]
+        self.assertEqual(generated, sorted(generated))
+        self.assertEqual(len(set(generated)), 1000)
+
+    def test_ids_are_ordered_by_time(self):
+        a = self.generator()
+        b = SortableIdGenerator(clock=lambda: self.now + 0.001)()
+        self.assertLess(a, b)
+
+    def test_ids_are_monotonic_if_clock_is_set_back(self):
+        a = self.generator()
+        self.now -= 10
+        b = self.generator()
+        self.assertLess(a, b)
+        self.assertEqual(self.generator.timestamp(b), self.now + 10)
+
+    def test_timestamp(self):
+        self.assertEqual(self.generator.timestamp(self.generator()), self.now)
+
+    def test_timestamp_rejects_other_formats(self):
+        self.assertRaises(ValueError, self.generator.timestamp, str(uuid.uuid4()))
+        self.assertRaises(ValueError, self.generator.timestamp, 'foo')
+
+    def test_reseed_changes_randomness(self):
+        a = self.generator()
+        self.generator.reseed()
+        b = self.generator()
+        self.assertNotEqual(a[12:20], b[12:20])
+
+    @unittest.skipIf(not hasattr(os, 'fork'), "Requires os.fork().")
+    def test_forked_process_is_reseeded(self):
+        reader, writer = os.pipe()
+        pid = os.fork()
+        if pid == 0: # pragma: no cover
+            os.write(writer, self.generator().encode())
+            os._exit(0)
+        os.waitpid(pid, 0)
+        child = os.read(reader, 32).decode()
+        os.close(reader)
+        os.close(writer)
+        self.assertNotEqual(child[12:20], self.generator()[12:20])
+
+
+class IdGeneratorRegistryTestCase(unittest.TestCase):
+
+    def test_get_by_name(self):
+        self.assertIsInstance(ids.get('sortable'), SortableIdGenerator)
+        self.assertEqual(len(ids.get('uuid4')()), 32)
+
+    def test_get_instance(self):
+        generator = SortableIdGenerator()
+        self.assertIs(ids.get(generator), generator)
+
+    def test_get_unknown_raises(self):
+        self.assertRaises(LookupError, ids.get, 'foo')
+
+    def test_base_class(self):
+        generator = IdGenerator()
+        self.assertRaises(NotImplementedError, generator)
+        self.assertIsNone(generator.timestamp('foo'))
+
+
+class BackendMessageIdTestCase(unittest.TestCase):
+
+    def test_sortable_ids_by_default(self):
+        backend = MockMessagingBackend()
+        a, b = backend.generate_message_id(), backend.generate_message_id()
+        self.assertLess(a, b)
+
+    def test_message_ids_option(self):
+        backend = MockMessagingBackend(message_ids='uuid4')
+        self.assertEqual(uuid.UUID(backend.generate_message_id()).version, 4)
+
+    def test_ids_are_compatible_with_messages(self):
+        message = Message(body=None)
+        message.id = MockMessagingBackend().generate_message_id()
+        self.assertEqual(len(message.id), 32)
+
+
+if __name__ == '__main__':
+    unittest.main()
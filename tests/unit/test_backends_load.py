@@ -1,7 +1,13 @@
+import subprocess
+import sys
 import types
 import unittest
+from unittest import mock
 
+import aorta.backends
 from aorta.backends import load
+from aorta.backends import register
+from aorta.backends import resolve
 from aorta.backends import BaseMessagingBackend
 from aorta.backends.mock import MockMessagingBackend
 
@@ -47,6 +53,132 @@ class BackendLoadingTestCase(unittest.TestCase):
     def test_load_raises_on_existing_attribute_but_invalid_type(self):
         self.assertRaises(TypeError, load, 'aorta.backends.ISender')
 
+    def test_load_passes_arguments(self):
+        backend = load('aorta.backends.mock', latency=0.5)
+        self.assertEqual(backend.latency, 0.5)
+
+    def test_load_module_passes_arguments(self):
+        backend = load(aorta.backends.mock, latency=0.5)
+        self.assertEqual(backend.latency, 0.5)
+
+
+class EntryPoint:
+
+    def __init__(self, name, target):
+        self.name = name
+        self.target = target
+
+    def load(self):
+        return self.target
+
+
+class BackendRegistryTestCase(unittest.TestCase):
+
+    def tearDown(self):
+        aorta.backends.BACKENDS.pop('test', None)
+        aorta.backends.RESOLVED.pop('test', None)
+
+    def test_load_by_name(self):
+        self.assertIsInstance(load('mock'), MockMessagingBackend)
+
+    def test_resolve_is_cached(self):
+        with mock.patch('importlib.import_module') as import_module:
+            resolve('aorta.backends.mock')
+            resolve('aorta.backends.mock')
+        self.assertIs(resolve('aorta.backends.mock'), MockMessagingBackend)
+        self.assertFalse(import_module.called)
+
+    def test_register_class(self):
+        register('test', MockMessagingBackend)
+        self.assertIs(resolve('test'), MockMessagingBackend)
+
+    def test_register_replaces_resolved_backend(self):
+        register('test', 'aorta.backends.qpid_proton')
+        resolve('test')
+        register('test', 'aorta.backends.mock.MockMessagingBackend')
+        self.assertIs(resolve('test'), MockMessagingBackend)
+
+    def test_register_module(self):
+        register('test', aorta.backends.mock)
+        self.assertIs(resolve('test'), MockMessagingBackend)
+
+    def test_register_invalid_class_raises(self):
+        register('test', int)
+        self.assertRaises(TypeError, resolve, 'test')
+
+    def test_resolve_entry_point(self):
+        entry_points = {'test': EntryPoint('test', MockMessagingBackend)}
+        with mock.patch.object(aorta.backends, 'ENTRY_POINTS', entry_points):
+            self.assertIs(resolve('test'), MockMessagingBackend)
+
+    def test_get_entry_points(self):
+        with mock.patch.object(aorta.backends, 'ENTRY_POINTS', None):
+            self.assertIsInstance(aorta.backends.get_entry_points(), dict)
+
+    def test_get_entry_points_without_group_selection(self):
+        # Python < 3.10 returns a dictionary of all groups.
+        found = {'aorta.backends': [EntryPoint('test', MockMessagingBackend)]}
+        with mock.patch.object(aorta.backends, 'ENTRY_POINTS', None),\
+        mock.patch('importlib.metadata.entry_points',
+        side_effect=[TypeError, found]):
+            self.assertEqual(list(aorta.backends.get_entry_points()), ['test'])
+
+    def test_get_entry_points_without_importlib_metadata(self):
+        # Python < 3.8 provides entry points through pkg_resources.
+        pkg_resources = types.ModuleType('pkg_resources')
+        pkg_resources.iter_entry_points = lambda group:\
+            [EntryPoint('test', MockMessagingBackend)]
+        with mock.patch.object(aorta.backends, 'ENTRY_POINTS', None),\
+        mock.patch.dict(sys.modules,
+        {'importlib.metadata': None, 'pkg_resources': pkg_resources}):
+            self.assertEqual(list(aorta.backends.get_entry_points()), ['test'])
+
+    def test_backend_modules_are_attributes(self):
+        self.assertIs(aorta.backends.mock, sys.modules['aorta.backends.mock'])
+        self.assertFalse(hasattr(aorta.backends, 'unknown'))
+
+    def test_unimportable_backend_module_is_missing_attribute(self):
+        with mock.patch('importlib.import_module', side_effect=ImportError):
+            with mock.patch.dict(aorta.backends.BACKENDS,
+            {'test': 'aorta.backends.test'}):
+                self.assertFalse(hasattr(aorta.backends, 'test'))
+
+
+class ImportTimeTestCase(unittest.TestCase):
+
+    #: The maximum number of seconds importing aorta may take.
+    budget = 0.1
+
+    #: The modules that importing aorta must not import.
+    deferred = ['proton', 'asyncio', 'multiprocessing']
+
+    def test_import_defers_heavy_modules(self):
+        code = (
+            "import sys, time\n"
+            "started = time.perf_counter()\n"
+            "import aorta, aorta.backends, aorta.listener\n"
+            "print(time.perf_counter() - started)\n"
+            "print(' '.join(x for x in {0!r} if x in sys.modules))\n"
+        ).format(self.deferred)
+        output = subprocess.check_output([sys.executable, '-c', code],
+            universal_newlines=True)
+        elapsed, _, imported = output.partition('\n')
+        self.assertEqual(imported.strip(), '')
+        self.assertLess(float(elapsed), self.budget)
+
+
+class LazyListenerImportTestCase(unittest.TestCase):
+
+    def test_members_are_imported_on_access(self):
+        import aorta.listener
+        from aorta.listener.supervisor import Supervisor
+        self.assertIs(aorta.listener.Supervisor, Supervisor)
+        self.assertIn('AsyncListener', dir(aorta.listener))
+
+    def test_unknown_member_raises(self):
+        import aorta.listener
+        with self.assertRaises(AttributeError):
+            aorta.listener.Unknown
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,89 @@
+import threading
+import unittest
+
+from aorta.backends.metrics import Counter
+from aorta.backends.metrics import Histogram
+from aorta.backends.metrics import Metrics
+from aorta.backends.mock import MockMessagingBackend
+
+
+class CounterTestCase(unittest.TestCase):
+
+    def test_increments_are_summed_across_threads(self):
+        counter = Counter()
+
+        def increment():
+            for i in range(1000):
+                counter.inc()
+
+        threads = [threading.Thread(target=increment) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counter.inc(5)
+        self.assertEqual(counter.value, 4005)
+
+
+class HistogramTestCase(unittest.TestCase):
+
+    def test_buckets_are_cumulative(self):
+        histogram = Histogram(buckets=(1, 5))
+        for value in (0.5, 1, 3, 10):
+            histogram.observe(value)
+        value = histogram.collect()
+        self.assertEqual(value['buckets'], [(1, 2), (5, 3), (float('inf'), 4)])
+        self.assertEqual(value['count'], 4)
+        self.assertEqual(value['sum'], 14.5)
+
+
+class MetricsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics()
+
+    def test_metrics_are_identified_by_name_and_labels(self):
+        a = self.metrics.counter('foo', dsn='a')
+        self.assertIs(self.metrics.counter('foo', dsn='a'), a)
+        self.assertIsNot(self.metrics.counter('foo', dsn='b'), a)
+
+    def test_snapshot(self):
+        self.metrics.counter('foo', "Foo.", dsn='a').inc(2)
+        self.metrics.gauge('bar', lambda: 3)
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot['foo'],
+            {'type': 'counter', 'help': "Foo.", 'samples': [({'dsn': 'a'}, 2)]})
+        self.assertEqual(snapshot['bar']['samples'], [({}, 3)])
+
+    def test_render(self):
+        self.metrics.counter('foo_total', "Foo.", dsn='a"b').inc()
+        self.metrics.histogram('bar_seconds', buckets=(1,)).observe(0.5)
+        self.assertEqual(self.metrics.render(), '\n'.join([
+            '# HELP foo_total Foo.',
+            '# TYPE foo_total counter',
+            'foo_total{dsn="a\\"b"} 1',
+            '# TYPE bar_seconds histogram',
+            'bar_seconds_bucket{le="1.0"} 1',
+            'bar_seconds_bucket{le="+Inf"} 1',
+            'bar_seconds_sum 0.5',
+            'bar_seconds_count 1',
+        ]) + '\n')
+
+
+class BackendMetricsTestCase(unittest.TestCase):
+
+    def test_backend_metrics(self):
+        backend = MockMessagingBackend()
+        backend.register_delivery()
+        backend.is_duplicate('localhost:5672/foo', '1')
+        backend.is_duplicate('localhost:5672/foo', '1')
+        snapshot = backend.metrics.snapshot()
+        self.assertEqual(backend.deliveries, 1)
+        self.assertEqual(snapshot['aorta_deliveries_total']['samples'], [({}, 1)])
+        self.assertEqual(snapshot['aorta_duplicate_messages']['samples'], [({}, 1)])
+        self.assertEqual(snapshot['aorta_incoming_queue_depth']['samples'], [({}, 0)])
+        self.assertEqual(snapshot['aorta_in_flight_messages']['samples'], [({}, 0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,264 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+import uuid
+
+from aorta.backends.future import SendFuture
+from aorta.backends.mock import MessagingBackend
+from aorta.backends.mock.broker import Broker
+from aorta.backends.mock.broker import Channel
+from aorta.backends.mock.broker import IncomingMessage
+from aorta.backends.mock.broker import get_broker
+from aorta.backends.outbox import Outbox
+from aorta.listener import Listener
+from aorta.message import Message
+
+
+class RecordingListener(Listener):
+
+    def __init__(self, dsn, backend, expected=1):
+        Listener.__init__(self, dsn, backend=backend)
+        self.messages = []
+        self.expected = expected
+        self.done = threading.Event()
+
+    def dispatch(self, message):
+        self.messages.append(message)
+        if len(self.messages) >= self.expected:
+            self.done.set()
+
+
+class UnresponsiveOutbox:
+
+    def append(self, dsn, messages, callback=None, *args):
+        pass
+
+    def pending(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class MockBackendTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.address = 'mock-{0}:5672'.format(uuid.uuid4().hex)
+        self.dsn = self.address + '/aorta.test'
+        self.backends = []
+
+    def tearDown(self):
+        for backend in self.backends:
+            backend.destroy()
+
+    def get_backend(self, **kwargs):
+        backend = MessagingBackend(**kwargs)
+        self.backends.append(backend)
+        return backend
+
+    def listen(self, backend=None, expected=1):
+        listener = RecordingListener(self.dsn, backend or self.get_backend(),
+            expected=expected)
+        listener.start()
+        return listener
+
+    def test_fanout_to_listeners_of_other_backends(self):
+        listeners = [self.listen(), self.listen()]
+        sender = self.get_backend()
+        future = sender.send_message(self.dsn,
+            Message(body={'foo': 1}, properties={'bar': 2}))
+        self.assertTrue(future.accepted)
+        for listener in listeners:
+            self.assertTrue(listener.done.wait(5))
+            message, = listener.messages
+            self.assertEqual(message.body, {'foo': 1})
+            self.assertEqual(message.properties, {'bar': 2})
+            self.assertEqual(message.id, future.message_id)
+        self.assertEqual(sender.deliveries, 1)
+
+    def test_messages_without_receivers_are_accepted(self):
+        backend = self.get_backend()
+        self.assertTrue(backend.send_message(self.dsn, Message(body=1)).accepted)
+
+    def test_queue_delivers_round_robin(self):
+        backend = self.get_backend()
+        backend.declare(self.dsn, Channel.QUEUE)
+        listeners = [self.listen(expected=2), self.listen(expected=2)]
+        backend.send_many(self.dsn, [Message(body=i) for i in range(4)])
+        for listener in listeners:
+            self.assertTrue(listener.done.wait(5))
+        bodies = [[m.body for m in x.messages] for x in listeners]
+        self.assertEqual(bodies, [[0, 2], [1, 3]])
+
+    def test_queue_holds_messages_until_receiver_attaches(self):
+        backend = self.get_backend()
+        backend.declare(self.dsn, Channel.QUEUE)
+        backend.send_many(self.dsn, [Message(body=i) for i in range(3)])
+        listener = self.listen(expected=3)
+        self.assertTrue(listener.done.wait(5))
+        self.assertEqual([m.body for m in listener.messages], [0, 1, 2])
+
+    def test_declare_channel_in_use_raises(self):
+        self.listen()
+        with self.assertRaises(RuntimeError):
+            self.get_backend().declare(self.dsn, Channel.QUEUE)
+
+    def test_invalid_mode_raises(self):
+        with self.assertRaises(ValueError):
+            self.get_backend().declare(self.dsn, 'topic')
+
+    def test_credit_holds_messages_until_dispatched(self):
+        backend = self.get_backend(credit=2)
+        receiver = backend.listen(self.dsn)
+        backend.send_many(self.dsn, [Message(body=i) for i in range(5)])
+        self.assertEqual(receiver.pending, 2)
+        self.assertEqual(len(receiver.backlog), 3)
+        self.assertEqual(receiver.stalls.value, 1)
+
+        receiver.notify_dispatched([backend.get(), backend.get()])
+        self.assertEqual(receiver.pending, 2)
+        self.assertEqual(len(receiver.backlog), 1)
+        self.assertEqual([backend.get()[1].body, backend.get()[1].body], [2, 3])
+
+    def test_queue_credit_skips_receivers_without_credit(self):
+        first, second = self.get_backend(credit=1), self.get_backend(credit=2)
+        first.declare(self.dsn, Channel.QUEUE)
+        receiver = first.listen(self.dsn)
+        second.listen(self.dsn)
+        first.send_many(self.dsn, [Message(body=i) for i in range(4)])
+        self.assertEqual([m.body for r, m in [first.get()]], [0])
+        self.assertEqual([second.get()[1].body, second.get()[1].body], [1, 2])
+
+        receiver.notify_dispatched([0])
+        self.assertEqual(first.get()[1].body, 3)
+
+    def test_high_watermark_option(self):
+        backend = self.get_backend(credit=5)
+        receiver = backend.listen(self.dsn, options={'high_watermark': 1})
+        self.assertEqual(receiver.credit, 1)
+
+    def test_invalid_high_watermark_raises(self):
+        with self.assertRaises(ValueError):
+            self.get_backend().listen(self.dsn, options={'high_watermark': 0})
+
+    def test_duplicates_are_discarded(self):
+        backend = self.get_backend()
+        receiver = backend.listen(self.dsn)
+        backend.send_message(self.dsn, Message(id='1', body=1))
+        backend.send_message(self.dsn, Message(id='1', body=1))
+        self.assertEqual(receiver.pending, 1)
+        self.assertEqual(backend.deduplication.hits, 1)
+
+    def test_destroy_detaches_receiver(self):
+        backend = self.get_backend(credit=1)
+        receiver = backend.listen(self.dsn)
+        backend.send_many(self.dsn, [Message(body=i) for i in range(2)])
+        receiver.destroy()
+        self.assertEqual(len(receiver.backlog), 0)
+        backend.send_message(self.dsn, Message(body=3))
+        self.assertEqual(receiver.pending, 1)
+
+    def test_latency(self):
+        backend = self.get_backend(latency=0.05)
+        listener = self.listen()
+        future = backend.send_message(self.dsn, Message(body=1))
+        self.assertFalse(future.done())
+        self.assertEqual(backend.get_sender(self.dsn).in_flight, 1)
+        self.assertEqual(future.result(5), future.message_id)
+        self.assertTrue(listener.done.wait(5))
+        self.assertEqual(backend.get_sender(self.dsn).in_flight, 0)
+
+    def test_sender_latency_option(self):
+        backend = self.get_backend(latency=0.05)
+        backend.configure(self.dsn, latency=0)
+        self.assertTrue(backend.send_message(self.dsn, Message(body=1)).accepted)
+
+    def test_timeout_before_acceptance(self):
+        backend = self.get_backend(latency=1.0)
+        listener = self.listen()
+        future = backend.send_message(self.dsn, Message(body=1), timeout=10)
+
+        # send_message() returns at the deadline, which may be before the
+        # timer thread of the broker resolved the future.
+        future.wait(5)
+        self.assertEqual(future.state, SendFuture.TIMEOUT)
+        self.assertFalse(listener.done.wait(1.5))
+
+    def test_blocking_send_many_times_out(self):
+        # The outbox never records the messages, so they are not sent.
+        backend = self.get_backend(outbox=UnresponsiveOutbox())
+        futures = backend.send_many(self.dsn,
+            [Message(body=i) for i in range(3)], timeout=10)
+        self.assertEqual([x.state for x in futures], [SendFuture.PENDING] * 3)
+
+    def test_blocking_send_many(self):
+        backend = self.get_backend(latency=0.01)
+        futures = backend.send_many(self.dsn,
+            [Message(body=i) for i in range(3)], block=True)
+        self.assertTrue(all(x.accepted for x in futures))
+
+    def test_events_are_wrapped(self):
+        listener = self.listen()
+        properties = {
+            'event_type': 'orders.OrderCreated',
+            'event_id': str(uuid.uuid4()),
+            'sender_id': str(uuid.uuid4())
+        }
+        self.get_backend().send_message(self.dsn,
+            Message(body={'id': 1}, properties=properties))
+        self.assertTrue(listener.done.wait(5))
+        event, = listener.messages
+        self.assertEqual(event.event_type, 'orders.OrderCreated')
+        self.assertEqual(event.body, {'id': 1})
+
+    def test_malformed_events_are_dropped(self):
+        backend = self.get_backend()
+        receiver = backend.listen(self.dsn)
+        message = IncomingMessage({'id': '1', 'properties': {'event_type': 'foo'}})
+        with self.assertLogs('aorta.incoming', level='WARNING'):
+            self.assertEqual(receiver.decode([message]), [])
+
+    def test_outbox(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.unlink, path)
+        backend = self.get_backend(outbox=Outbox(path))
+        future = backend.send_message(self.dsn, Message(body=1), block=True)
+        self.assertTrue(future.accepted)
+        self.assertEqual(len(backend.outbox), 0)
+
+
+class BrokerTestCase(unittest.TestCase):
+
+    def test_get_broker_is_shared(self):
+        self.assertIs(get_broker('foo:5672'), get_broker('foo:5672'))
+
+    def test_timer_exceptions_are_logged(self):
+        broker = Broker('foo:5672')
+        called = threading.Event()
+        with self.assertLogs('aorta.mock', level='ERROR'):
+            broker.schedule(0, lambda: 1 / 0)
+            broker.schedule(0.01, called.set)
+            self.assertTrue(called.wait(5))
+
+    def test_timers_run_in_order(self):
+        broker = Broker('foo:5672')
+        calls = []
+        done = threading.Event()
+        broker.schedule(0.02, calls.append, 2)
+        broker.schedule(0.01, calls.append, 1)
+        broker.schedule(0.03, done.set)
+        self.assertTrue(done.wait(5))
+        self.assertEqual(calls, [1, 2])
+
+    def test_incoming_message(self):
+        message = IncomingMessage(Message(id='1', body=b'foo'))
+        self.assertEqual(message.body, b'foo')
+        self.assertIsNone(message.properties)
+        self.assertEqual(repr(message), '<IncomingMessage: 1>')
+
+
+if __name__ == '__main__':
+    unittest.main()
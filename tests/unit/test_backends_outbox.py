@@ -0,0 +1,249 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from aorta.backends.balancer import BalancedSender
+from aorta.backends.mock import MockMessagingBackend
+from aorta.backends.outbox import Outbox
+from aorta.message import Message
+
+
+class RecordingSender:
+
+    @classmethod
+    def create(cls, backend, host, port, channel):
+        return cls()
+
+    def __init__(self):
+        self.replayed = []
+
+    def send_many(self, messages, blocking=False, timeout=None, recorded=False,
+        dsn=None):
+        if recorded:
+            self.replayed.extend(messages)
+
+    def destroy(self):
+        pass
+
+
+class OutboxTestCase(unittest.TestCase):
+    dsn = 'localhost:5672/foo'
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.path = os.path.join(self.dirname, 'outbox')
+        self.outbox = Outbox(self.path)
+
+    def tearDown(self):
+        self.outbox.close()
+        shutil.rmtree(self.dirname)
+
+    def reopen(self):
+        self.outbox.close()
+        self.outbox = Outbox(self.path)
+
+    def test_callback_invoked_when_durable(self):
+        event = threading.Event()
+        self.outbox.append(self.dsn, [Message(id='1', body=1)], event.set)
+        self.assertTrue(event.wait(5))
+
+    def test_pending_messages_survive_reopen(self):
+        self.outbox.append(self.dsn, [Message(id='1', body=1), Message(id='2', body=2)])
+        self.reopen()
+        pending = self.outbox.pending()
+        self.assertEqual([m.id for dsn, m in pending], ['1', '2'])
+        self.assertEqual(pending[0], (self.dsn, {'id': '1', 'body': 1}))
+
+    def test_removed_messages_are_not_pending(self):
+        self.outbox.append(self.dsn, [Message(id='1', body=1), Message(id='2', body=2)])
+        self.outbox.remove('1')
+        self.reopen()
+        self.assertEqual([m.id for dsn, m in self.outbox.pending()], ['2'])
+
+    def test_removals_are_committed_with_next_batch(self):
+        event = threading.Event()
+        self.outbox.append(self.dsn, [Message(id='1', body=1)], event.set)
+        self.assertTrue(event.wait(5))
+        size = os.path.getsize(self.path)
+        self.outbox.remove('1')
+        time.sleep(0.05)
+        self.assertEqual(os.path.getsize(self.path), size)
+
+        event.clear()
+        self.outbox.append(self.dsn, [Message(id='2', body=2)], event.set)
+        self.assertTrue(event.wait(5))
+        self.reopen()
+        self.assertEqual([m.id for dsn, m in self.outbox.pending()], ['2'])
+
+    def test_truncated_record_is_ignored(self):
+        self.outbox.append(self.dsn, [Message(id='1', body=1)])
+        self.outbox.close()
+        with open(self.path, 'ab') as f:
+            f.write(Outbox.header.pack(Outbox.OP_APPEND, 100) + b'abc')
+        self.outbox = Outbox(self.path)
+        self.assertEqual(len(self.outbox), 1)
+
+    def test_reopen_compacts_log(self):
+        self.outbox.append(self.dsn, [Message(id=str(i), body=i) for i in range(100)])
+        for i in range(100):
+            self.outbox.remove(str(i))
+        self.reopen()
+        self.assertEqual(os.path.getsize(self.path), 0)
+
+    def test_writer_compacts_log(self):
+        self.outbox.compaction_threshold = 10
+        self.outbox.append(self.dsn, [Message(id=str(i), body=i) for i in range(100)])
+        for i in range(100):
+            self.outbox.remove(str(i))
+        event = threading.Event()
+        self.outbox.append(self.dsn, [Message(id='x', body=1)], event.set)
+        self.assertTrue(event.wait(5))
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read().count(Outbox.OP_REMOVE), 0)
+
+        # Records appended after the compaction go to the new log.
+        event.clear()
+        self.outbox.append(self.dsn, [Message(id='y', body=2)], event.set)
+        self.assertTrue(event.wait(5))
+        self.reopen()
+        self.assertEqual([m.id for dsn, m in self.outbox.pending()], ['x', 'y'])
+
+    def test_log_is_not_compacted_below_threshold(self):
+        self.outbox.append(self.dsn, [Message(id=str(i), body=i) for i in range(10)])
+        for i in range(10):
+            self.outbox.remove(str(i))
+        event = threading.Event()
+        self.outbox.append(self.dsn, [Message(id='x', body=1)], event.set)
+        self.assertTrue(event.wait(5))
+        self.reopen()
+        self.assertEqual([m.id for dsn, m in self.outbox.pending()], ['x'])
+
+    def test_failed_compaction_appends_records(self):
+        self.outbox.compaction_threshold = 1
+        os.mkdir(self.path + '.tmp')
+        event = threading.Event()
+        with self.assertLogs('aorta.outbox', level='ERROR'):
+            self.outbox.append(self.dsn,
+                [Message(id='1', body=1), Message(id='2', body=2)])
+            self.outbox.remove('1')
+            self.outbox.remove('2')
+            self.outbox.append(self.dsn, [Message(id='3', body=3)], event.set)
+            self.assertTrue(event.wait(5))
+        os.rmdir(self.path + '.tmp')
+        self.reopen()
+        self.assertEqual([m.id for dsn, m in self.outbox.pending()], ['3'])
+
+    def test_write_errors_are_logged(self):
+        self.outbox._Outbox__file.close()
+        event = threading.Event()
+        with self.assertLogs('aorta.outbox', level='ERROR'):
+            self.outbox.append(self.dsn, [Message(id='1', body=1)], event.set)
+            self.assertTrue(event.wait(5))
+
+    def test_failing_callback_is_logged(self):
+        event = threading.Event()
+        def fail():
+            raise Exception
+        with self.assertLogs('aorta.outbox', level='ERROR'):
+            self.outbox.append(self.dsn, [Message(id='1', body=1)], fail)
+            self.outbox.append(self.dsn, [Message(id='2', body=2)], event.set)
+            self.assertTrue(event.wait(5))
+
+    def test_commit_interval(self):
+        self.outbox.close()
+        self.outbox = Outbox(self.path, interval=0.01)
+        event = threading.Event()
+        self.outbox.append(self.dsn, [Message(id='1', body=1)])
+        self.outbox.append(self.dsn, [Message(id='2', body=2)], event.set)
+        self.assertTrue(event.wait(5))
+        self.reopen()
+        self.assertEqual(len(self.outbox), 2)
+
+    def test_append_after_close_raises(self):
+        self.outbox.close()
+        self.assertRaises(RuntimeError, self.outbox.append,
+            self.dsn, [Message(id='1', body=1)])
+
+
+class ReplayTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.outbox = Outbox(os.path.join(self.dirname, 'outbox'))
+        self.outbox.append('localhost:5672/foo', [Message(id='1', body=1)])
+        self.outbox.append('localhost:5672/bar', [Message(id='2', body=2)])
+        self.backend = MockMessagingBackend(outbox=self.outbox)
+        self.backend.sender_class = RecordingSender
+
+    def tearDown(self):
+        self.backend.destroy()
+        shutil.rmtree(self.dirname)
+
+    def test_new_sender_replays_pending_messages(self):
+        sender = self.backend.get_sender('localhost:5672/foo')
+        self.assertEqual([m.id for m in sender.replayed], ['1'])
+        self.assertIs(self.backend.get_sender('localhost:5672/foo'), sender)
+        self.assertEqual(len(sender.replayed), 1)
+
+    def test_start_replays_all_dsns(self):
+        self.backend.start()
+        replayed = {
+            dsn: [m.id for m in sender.replayed]
+            for dsn, sender in self.backend.senders.items()
+        }
+        self.assertEqual(replayed,
+            {'localhost:5672/foo': ['1'], 'localhost:5672/bar': ['2']})
+
+    def test_replay_sends_pending_messages_again(self):
+        foo = self.backend.get_sender('localhost:5672/foo')
+        self.assertEqual(self.backend.replay(), 2)
+        self.assertEqual([m.id for m in foo.replayed], ['1', '1'])
+        bar = self.backend.get_sender('localhost:5672/bar')
+        self.assertEqual([m.id for m in bar.replayed], ['2', '2'])
+
+    def test_replay_without_outbox(self):
+        backend = MockMessagingBackend()
+        self.assertEqual(backend.replay(), 0)
+
+
+
+class OutboxDsnTestCase(unittest.TestCase):
+    dsn = 'amqp://mock-outbox-1:5672,mock-outbox-2:5672/foo'
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.path = os.path.join(self.dirname, 'outbox')
+        self.backend = self.get_backend()
+        for host in ('mock-outbox-1', 'mock-outbox-2'):
+            self.backend.get_broker(host + ':5672').available = False
+
+    def tearDown(self):
+        self.backend.destroy()
+        shutil.rmtree(self.dirname)
+
+    def get_backend(self):
+        backend = MockMessagingBackend(outbox=Outbox(self.path))
+        backend.configure(self.dsn, strategy='least_in_flight')
+        return backend
+
+    def test_messages_are_recorded_under_caller_dsn(self):
+        self.backend.send_message(self.dsn, Message(body=1))
+        self.backend.send_many(self.dsn, [Message(body=2)])
+        self.backend.send_message('amqp://mock-outbox-1:5672/bar', Message(body=3))
+        self.assertEqual([dsn for dsn, m in self.backend.outbox.pending()],
+            [self.dsn, self.dsn, 'amqp://mock-outbox-1:5672/bar'])
+
+    def test_replay_uses_balanced_sender(self):
+        self.backend.send_many(self.dsn, [Message(body=i) for i in range(4)])
+        self.backend.destroy()
+        self.backend = self.get_backend()
+        self.backend.start()
+        self.assertEqual(list(self.backend.senders), [self.dsn])
+        self.assertIsInstance(self.backend.senders[self.dsn], BalancedSender)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+
+from benchmarks.suite import compare
+from benchmarks.suite import percentiles
+
+
+def result(scenario, **metrics):
+    return {'scenario': scenario, 'size': 64, 'channels': 1, 'metrics': metrics}
+
+
+class PercentilesTestCase(unittest.TestCase):
+
+    def test_percentiles_in_milliseconds(self):
+        values = [i / 1000 for i in range(1, 101)]
+        p = percentiles(values)
+        self.assertAlmostEqual(p['p50'], 51)
+        self.assertAlmostEqual(p['p99'], 99)
+
+    def test_percentiles_of_single_value(self):
+        self.assertEqual(percentiles([0.002], points=(99,)), {'p99': 2.0})
+
+
+class CompareTestCase(unittest.TestCase):
+
+    def test_lower_throughput_is_regression(self):
+        rows = compare([result('throughput', messages_per_second=80)],
+            [result('throughput', messages_per_second=100)])
+        (key, metric, base, value, change, regressed), = rows
+        self.assertEqual(key, ('throughput', 64, 1))
+        self.assertAlmostEqual(change, -0.2)
+        self.assertTrue(regressed)
+
+    def test_higher_latency_is_regression(self):
+        rows = compare([result('latency', p50_ms=1.2)],
+            [result('latency', p50_ms=1.0)])
+        self.assertTrue(rows[0][-1])
+
+    def test_change_within_tolerance(self):
+        rows = compare([result('latency', p50_ms=1.05)],
+            [result('latency', p50_ms=1.0)], tolerance=0.1)
+        self.assertFalse(rows[0][-1])
+
+    def test_improvement_is_not_regression(self):
+        rows = compare([result('throughput', messages_per_second=200)],
+            [result('throughput', messages_per_second=100)])
+        self.assertFalse(rows[0][-1])
+
+    def test_metrics_missing_from_baseline_are_skipped(self):
+        self.assertEqual(compare([result('memory', bytes_per_message=10)], []), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import collections
+import unittest
+import uuid
+
+from aorta.event import LazyEvent
+from aorta.exc import MalformedEvent
+
+
+Message = collections.namedtuple('Message', ['id', 'properties', 'body'])
+
+
+class LazyEventTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.properties = {
+            'sender_id': uuid.uuid4().hex,
+            'event_id': uuid.uuid4().hex,
+            'event_type': 'orders.OrderCreated'
+        }
+        self.decoded = []
+
+    def decode(self, message):
+        self.decoded.append(message)
+        return {'decoded': message.body}
+
+    def test_headers_are_validated(self):
+        event = LazyEvent(Message('1', self.properties, b'{}'))
+        self.assertEqual(event.event_type, 'orders.OrderCreated')
+        self.assertEqual(event.sender_id.hex, self.properties['sender_id'])
+        self.assertEqual(event.event_id.hex, self.properties['event_id'])
+
+    def test_missing_header_raises(self):
+        del self.properties['event_id']
+        with self.assertRaises(MalformedEvent):
+            LazyEvent(Message('1', self.properties, None))
+
+    def test_invalid_uuid_raises(self):
+        self.properties['sender_id'] = 'foo'
+        with self.assertRaises(MalformedEvent):
+            LazyEvent(Message('1', self.properties, None))
+
+    def test_invalid_event_type_raises(self):
+        self.properties['event_type'] = ''
+        with self.assertRaises(MalformedEvent):
+            LazyEvent(Message('1', self.properties, None))
+
+    def test_body_is_decoded_on_access(self):
+        event = LazyEvent(Message('1', self.properties, b'{}'), self.decode)
+        self.assertEqual(self.decoded, [])
+        self.assertEqual(event.body, {'decoded': b'{}'})
+        self.assertEqual(event.body, {'decoded': b'{}'})
+        self.assertEqual(len(self.decoded), 1)
+
+    def test_body_without_decoder(self):
+        event = LazyEvent(Message('1', self.properties, b'{}'))
+        self.assertEqual(event.body, b'{}')
+
+    def test_message_attributes(self):
+        event = LazyEvent(Message('1', self.properties, None))
+        self.assertEqual(event.id, '1')
+        self.assertIs(event.properties, self.properties)
+
+
+if __name__ == '__main__':
+    unittest.main()
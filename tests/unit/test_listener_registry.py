@@ -0,0 +1,214 @@
+import collections
+import unittest
+import uuid
+
+from aorta.backends.ireceiver import IReceiver
+from aorta.backends.mock import MockMessagingBackend
+from aorta.event import LazyEvent
+from aorta.listener import HandlerRegistry
+from aorta.listener import Listener
+
+
+Message = collections.namedtuple('Message', ['properties', 'body'])
+
+
+class HandlerRegistryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = HandlerRegistry()
+
+    def test_exact_match(self):
+        self.registry.register('orders.OrderCreated', 1)
+        self.assertEqual(self.registry.resolve('orders.OrderCreated'), (1,))
+        self.assertEqual(self.registry.resolve('orders.OrderDeleted'), ())
+
+    def test_prefix_match(self):
+        self.registry.register('orders.*', 1)
+        self.assertEqual(self.registry.resolve('orders.OrderCreated'), (1,))
+        self.assertEqual(self.registry.resolve('orders.eu.OrderCreated'), (1,))
+        self.assertEqual(self.registry.resolve('orders'), ())
+        self.assertEqual(self.registry.resolve('invoices.InvoiceSent'), ())
+
+    def test_wildcard_matches_all(self):
+        self.registry.register('*', 1)
+        self.assertEqual(self.registry.resolve('orders.OrderCreated'), (1,))
+        self.assertEqual(self.registry.resolve(None), (1,))
+
+    def test_resolution_order(self):
+        self.registry.register('*', 1)
+        self.registry.register('orders.*', 2)
+        self.registry.register('orders.eu.*', 3)
+        self.registry.register('orders.eu.OrderCreated', 4)
+        self.registry.register('orders.eu.OrderCreated', 5)
+        self.assertEqual(self.registry.resolve('orders.eu.OrderCreated'),
+            (4, 5, 3, 2, 1))
+
+    def test_register_invalidates_cache(self):
+        self.assertEqual(self.registry.resolve('orders.OrderCreated'), ())
+        self.registry.register('orders.*', 1)
+        self.assertEqual(self.registry.resolve('orders.OrderCreated'), (1,))
+
+    def test_invalid_patterns(self):
+        for pattern in ('orders*', 'orders.*.OrderCreated', '*.*'):
+            self.assertRaises(ValueError, self.registry.register, pattern, 1)
+
+
+class RecordingReceiver(IReceiver):
+
+    @classmethod
+    def create(cls, backend, host, port, channel, options=None):
+        return cls(channel)
+
+    def __init__(self, receiver_id):
+        self.receiver_id = receiver_id
+        self.decoded = []
+        self.failed = []
+        self.dispatched = []
+
+    def decode(self, messages):
+        self.decoded.extend(messages)
+        return messages
+
+    def notify_failed(self, messages):
+        self.failed.extend(messages)
+
+    def notify_dispatched(self, messages):
+        self.dispatched.extend(messages)
+
+
+class EventReceiver(RecordingReceiver):
+
+    def decode(self, messages):
+        return [LazyEvent(x) for x in messages]
+
+
+class ListenerRoutingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = MockMessagingBackend()
+        self.backend.receiver_class = RecordingReceiver
+        self.listener = Listener('localhost:5672/foo', backend=self.backend)
+        self.handled = []
+
+    def event(self, event_type):
+        return Message({'event_type': event_type}, None)
+
+    def test_dispatch_invokes_handlers(self):
+        self.listener.register('orders.*', self.handled.append)
+        message = self.event('orders.OrderCreated')
+        self.listener.dispatch(message)
+        self.assertEqual(self.handled, [message])
+
+    def test_handler_objects(self):
+        handled = self.handled
+
+        class Handler:
+            def handle(self, event):
+                handled.append(event)
+
+        self.listener.register('orders.OrderCreated', Handler())
+        self.listener.dispatch(self.event('orders.OrderCreated'))
+        self.assertEqual(len(self.handled), 1)
+
+    def test_failing_handler_does_not_stop_dispatch(self):
+        def fail(message):
+            raise Exception
+        self.listener.register('orders.OrderCreated', fail)
+        self.listener.register('orders.*', self.handled.append)
+        self.listener.dispatch(self.event('orders.OrderCreated'))
+        self.assertEqual(len(self.handled), 1)
+
+    def test_dispatch_batch_returns_failed_messages(self):
+        def fail(message):
+            raise Exception
+        self.listener.register('orders.OrderCreated', fail)
+        self.listener.register('orders.*', self.handled.append)
+        messages = [self.event('orders.OrderCreated'), self.event('orders.Sent')]
+        self.assertEqual(self.listener.dispatch_batch(messages), messages[:1])
+        self.assertEqual(self.handled, messages)
+
+    def test_failed_messages_are_reported_to_receiver(self):
+        def fail(message):
+            raise Exception
+        self.listener.register('orders.OrderCreated', fail)
+        self.backend.add_listener(self.listener)
+        receiver = self.backend.receivers['localhost:5672/foo']
+        messages = [self.event('orders.OrderCreated'), self.event('orders.Sent')]
+        self.backend.dispatch_batch([(receiver, x) for x in messages])
+        self.assertEqual(receiver.failed, messages[:1])
+
+    def test_failed_events_are_reported_unwrapped(self):
+        def fail(message):
+            raise Exception
+        self.backend.receiver_class = EventReceiver
+        self.listener.register('orders.OrderCreated', fail)
+        self.backend.add_listener(self.listener)
+        receiver = self.backend.receivers['localhost:5672/foo']
+        message = Message({
+            'event_type': 'orders.OrderCreated',
+            'event_id': str(uuid.uuid4()),
+            'sender_id': str(uuid.uuid4())
+        }, None)
+        self.backend.dispatch_batch([(receiver, message)])
+        self.assertEqual(receiver.failed, [message])
+
+    def test_backend_dispatch_notifies_receiver(self):
+        def fail(message):
+            raise Exception
+        self.listener.register('orders.OrderCreated', fail)
+        self.backend.add_listener(self.listener)
+        receiver = self.backend.receivers['localhost:5672/foo']
+        message = self.event('orders.OrderCreated')
+        self.backend.dispatch(receiver, message)
+        self.assertEqual(receiver.failed, [message])
+        self.assertEqual(receiver.dispatched, [message])
+
+    def test_listener_exceptions_fail_batch(self):
+        def fail(messages):
+            raise Exception
+        self.listener.dispatch_batch = fail
+        self.backend.add_listener(self.listener)
+        receiver = self.backend.receivers['localhost:5672/foo']
+        messages = [self.event('foo'), self.event('bar')]
+        with self.assertLogs('aorta', level='ERROR'):
+            self.backend.dispatch_batch([(receiver, x) for x in messages])
+        self.assertEqual(receiver.failed, messages)
+
+    def test_subscribed_to_all_without_handlers(self):
+        self.assertTrue(self.listener.is_subscribed(self.event('foo')))
+
+    def test_unsubscribed_messages_are_not_decoded(self):
+        self.listener.register('orders.*', self.handled.append)
+        self.backend.add_listener(self.listener)
+        receiver = self.backend.receivers['localhost:5672/foo']
+        messages = [self.event('orders.OrderCreated'), self.event('invoices.Sent')]
+        self.backend.dispatch_batch([(receiver, x) for x in messages])
+        self.assertEqual(receiver.decoded, messages[:1])
+        self.assertEqual(self.handled, messages[:1])
+
+    def test_default_priority(self):
+        self.assertEqual(self.listener.get_priority(self.event('foo')), 0)
+        self.listener.priority = 2
+        self.assertEqual(self.listener.get_priority(self.event('foo')), 2)
+
+    def test_prioritize_event_types(self):
+        self.listener.prioritize('orders.*', 1)
+        self.listener.prioritize('orders.OrderCancelled', 5)
+        self.assertEqual(
+            self.listener.get_priority(self.event('orders.OrderCancelled')), 5)
+        self.assertEqual(
+            self.listener.get_priority(self.event('orders.OrderCreated')), 1)
+        self.assertEqual(
+            self.listener.get_priority(self.event('invoices.Sent')), 0)
+
+    def test_backend_resolves_priority_by_listener(self):
+        self.listener.priority = 3
+        self.backend.add_listener(self.listener)
+        receiver = self.backend.receivers['localhost:5672/foo']
+        self.assertEqual(self.backend.get_priority(receiver, self.event('foo')), 3)
+        self.assertEqual(
+            self.backend.get_priority(RecordingReceiver('bar'), self.event('foo')), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
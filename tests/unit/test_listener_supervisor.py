@@ -0,0 +1,189 @@
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import unittest
+
+from aorta.backends.mock import MockMessagingBackend
+from aorta.listener import Listener
+from aorta.listener import Supervisor
+from aorta.listener.supervisor import merge
+from aorta.listener.supervisor import run_worker
+
+
+DSN = 'mock-supervisor:5672/aorta.test'
+
+
+def create_listener():
+    return Listener(DSN, backend=MockMessagingBackend())
+
+
+class HangingListener(Listener):
+
+    def start(self):
+        time.sleep(60)
+
+
+def create_hanging_listener():
+    return HangingListener(DSN, backend=MockMessagingBackend())
+
+
+class SupervisorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.supervisors = []
+
+    def tearDown(self):
+        for supervisor in self.supervisors:
+            supervisor.stop()
+
+    def get_supervisor(self, factory=create_listener, processes=2, **kwargs):
+        kwargs.setdefault('interval', 0.05)
+        kwargs.setdefault('restart_delay', 0)
+        supervisor = Supervisor(factory, processes=processes, **kwargs)
+        self.supervisors.append(supervisor)
+        supervisor.start()
+        return supervisor
+
+    def wait_ready(self, supervisor):
+        for index in range(supervisor.processes):
+            self.assertTrue(supervisor.wait_ready(index, 10))
+
+    def test_invalid_processes_raises(self):
+        self.assertRaises(ValueError, Supervisor, create_listener, processes=-1)
+
+    def test_processes_default_to_cpu_count(self):
+        supervisor = Supervisor(create_listener)
+        self.assertEqual(supervisor.processes, os.cpu_count() or 1)
+
+    def test_workers_report_stats(self):
+        supervisor = self.get_supervisor()
+        self.wait_ready(supervisor)
+        self.assertEqual(set(supervisor.stats()), {0, 1})
+        depth, = supervisor.metrics()['aorta_incoming_queue_depth']['samples']
+        self.assertEqual(depth, ({}, 0))
+
+    def test_start_is_idempotent(self):
+        supervisor = self.get_supervisor()
+        pids = supervisor.pids()
+        supervisor.start()
+        self.assertEqual(supervisor.pids(), pids)
+
+    def test_stop(self):
+        supervisor = self.get_supervisor()
+        self.wait_ready(supervisor)
+        supervisor.stop()
+        supervisor.stop()
+        self.assertEqual(supervisor.pids(), [None, None])
+        self.assertFalse(supervisor.wait_ready(0, 0))
+
+        # Stopped supervisors do not restart workers.
+        supervisor._Supervisor__supervise()
+        self.assertEqual(supervisor.pids(), [None, None])
+
+    def test_dead_workers_are_restarted(self):
+        supervisor = self.get_supervisor(processes=1)
+        self.wait_ready(supervisor)
+        pid, = supervisor.pids()
+        with self.assertLogs('aorta.supervisor', level='WARNING'):
+            os.kill(pid, signal.SIGKILL)
+            deadline = time.monotonic() + 10
+            while supervisor.pids() == [pid] and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertNotEqual(supervisor.pids(), [pid])
+        self.assertEqual(supervisor.restarts, 1)
+        self.wait_ready(supervisor)
+
+    def test_rolling_restart(self):
+        supervisor = self.get_supervisor()
+        self.wait_ready(supervisor)
+        pids = supervisor.pids()
+        supervisor.restart(timeout=10)
+        self.assertTrue(set(pids).isdisjoint(supervisor.pids()))
+        self.assertEqual(supervisor.restarts, 0)
+
+    def test_hanging_workers_are_terminated(self):
+        supervisor = self.get_supervisor(create_hanging_listener,
+            processes=1, shutdown_timeout=0.1)
+        self.assertFalse(supervisor.wait_ready(0, 0.1))
+        with self.assertLogs('aorta.supervisor', level='WARNING'):
+            supervisor.restart(timeout=0.1)
+        with self.assertLogs('aorta.supervisor', level='WARNING'):
+            supervisor.stop()
+
+    def test_retired_connections(self):
+        supervisor = Supervisor(create_listener, processes=1)
+        reader, writer = multiprocessing.Pipe(duplex=False)
+        supervisor._Supervisor__retired.append(reader)
+
+        # Metrics reported by retired workers are discarded.
+        writer.send({})
+        supervisor._Supervisor__receive(5)
+        self.assertEqual(supervisor.stats(), {})
+
+        # Retired connections are closed when the monitoring thread exits.
+        supervisor._Supervisor__stopped.set()
+        supervisor.__main__()
+        self.assertTrue(reader.closed)
+        self.assertEqual(supervisor._Supervisor__retired, [])
+        writer.close()
+
+
+class RunWorkerTestCase(unittest.TestCase):
+
+    def test_reports_metrics_until_stopped(self):
+        stop = threading.Event()
+        stop.set()
+        reader, writer = multiprocessing.Pipe(duplex=False)
+        run_worker(create_listener, stop, writer, 0)
+        self.assertIn('aorta_incoming_queue_depth', reader.recv())
+        self.assertRaises(EOFError, reader.recv)
+
+
+class MergeTestCase(unittest.TestCase):
+
+    def snapshot(self, deliveries, observed):
+        return {
+            'aorta_deliveries_total': {
+                'type': 'counter',
+                'help': "Deliveries.",
+                'samples': [({}, deliveries)]
+            },
+            'aorta_dispatch_seconds': {
+                'type': 'histogram',
+                'help': "",
+                'samples': [({'listener': 'foo'}, {
+                    'buckets': [(1, observed), (float('inf'), observed)],
+                    'sum': observed / 2,
+                    'count': observed
+                })]
+            }
+        }
+
+    def test_merge_sums_samples(self):
+        merged = merge([self.snapshot(1, 2), self.snapshot(3, 4)])
+        self.assertEqual(merged['aorta_deliveries_total'], {
+            'type': 'counter',
+            'help': "Deliveries.",
+            'samples': [({}, 4)]
+        })
+        labels, value = merged['aorta_dispatch_seconds']['samples'][0]
+        self.assertEqual(labels, {'listener': 'foo'})
+        self.assertEqual(value, {
+            'buckets': [(1, 6), (float('inf'), 6)],
+            'sum': 3,
+            'count': 6
+        })
+
+    def test_merge_keeps_distinct_labels(self):
+        a = self.snapshot(1, 1)
+        b = self.snapshot(1, 1)
+        b['aorta_deliveries_total']['samples'] = [({'dsn': 'foo'}, 1)]
+        merged = merge([a, b])
+        self.assertEqual(merged['aorta_deliveries_total']['samples'],
+            [({}, 1), ({'dsn': 'foo'}, 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
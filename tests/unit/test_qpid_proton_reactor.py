@@ -0,0 +1,134 @@
+import socket
+import threading
+import time
+import unittest
+import unittest.mock
+
+from aorta.backends.qpid_proton import MessagingBackend
+from aorta.backends.qpid_proton.reactor import Reactor
+
+
+class ReactorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.reactor = Reactor()
+
+    def tearDown(self):
+        self.reactor.stop()
+
+    def test_call_is_invoked_on_reactor_thread(self):
+        event = threading.Event()
+        threads = []
+
+        def func(value):
+            threads.append((threading.current_thread(), value))
+            event.set()
+
+        self.reactor.call(func, 1)
+        self.assertTrue(event.wait(5))
+        self.assertEqual(threads, [(self.reactor, 1)])
+
+    def test_calls_are_invoked_in_order(self):
+        event = threading.Event()
+        values = []
+        for i in range(100):
+            self.reactor.call(values.append, i)
+        self.reactor.call(event.set)
+        self.assertTrue(event.wait(5))
+        self.assertEqual(values, list(range(100)))
+
+    def test_failing_call_is_logged(self):
+        event = threading.Event()
+        with self.assertLogs('aorta.reactor', level='ERROR'):
+            self.reactor.call(int, 'foo')
+            self.reactor.call(event.set)
+            self.assertTrue(event.wait(5))
+
+    def test_connections_are_pooled_by_index(self):
+        connections = []
+        event = threading.Event()
+
+        def connect():
+            connections.extend([
+                self.reactor.connect('localhost:5672'),
+                self.reactor.connect('localhost:5672'),
+                self.reactor.connect('localhost:5672', 1)
+            ])
+            event.set()
+
+        self.reactor.call(connect)
+        self.assertTrue(event.wait(5))
+        self.assertIs(connections[0], connections[1])
+        self.assertIsNot(connections[0], connections[2])
+
+    def test_refused_connection_is_unavailable(self):
+        sock = socket.socket()
+        sock.bind(('localhost', 0))
+        address = 'localhost:{0}'.format(sock.getsockname()[1])
+        sock.close()
+        self.assertTrue(self.reactor.is_available(address))
+
+        self.reactor.call(self.reactor.connect, address)
+        deadline = time.monotonic() + 5
+        while self.reactor.is_available(address) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(self.reactor.is_available(address))
+
+    def test_stop_unstarted_reactor(self):
+        self.reactor.stop()
+        self.assertFalse(self.reactor.is_alive())
+
+    def test_stop_started_reactor(self):
+        event = threading.Event()
+        self.reactor.call(event.set)
+        self.assertTrue(event.wait(5))
+        self.reactor.stop()
+        self.assertFalse(self.reactor.is_alive())
+
+    def test_stop_cancels_scheduled_calls(self):
+        event = threading.Event()
+        calls = []
+        self.reactor.call(self.reactor.schedule, 60, calls.append, 1)
+        self.reactor.call(event.set)
+        self.assertTrue(event.wait(5))
+
+        started = time.monotonic()
+        self.reactor.stop()
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(calls, [])
+
+    def test_connections_are_pooled_per_address(self):
+        result = []
+        event = threading.Event()
+
+        def func():
+            a = self.reactor.connect('localhost:1')
+            b = self.reactor.connect('localhost:1')
+            c = self.reactor.connect('localhost:2')
+            result.extend([a is b, a is c])
+            self.reactor.disconnect(a)
+            result.append(self.reactor.connect('localhost:1') is b)
+            event.set()
+
+        self.reactor.call(func)
+        self.assertTrue(event.wait(5))
+        self.assertEqual(result, [True, False, True])
+
+    def test_disconnect_closes_unpooled_connection(self):
+        connection = unittest.mock.Mock()
+        event = threading.Event()
+
+        self.reactor.call(self.reactor.disconnect, connection)
+        self.reactor.call(event.set)
+        self.assertTrue(event.wait(5))
+        connection.close.assert_called_once_with()
+
+    def test_backend_shares_reactor_per_address(self):
+        backend = MessagingBackend(reactors=4)
+        self.assertIs(
+            backend.get_reactor('localhost:5672'),
+            backend.get_reactor('localhost:5672'))
+
+
+if __name__ == '__main__':
+    unittest.main()
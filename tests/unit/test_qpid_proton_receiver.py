@@ -0,0 +1,386 @@
+import unittest
+import uuid
+import zlib
+
+from proton import Delivery
+from proton import Message
+from proton.handlers import IncomingMessageHandler
+
+from aorta.backends.metrics import Metrics
+from aorta.backends.qpid_proton import envelope
+from aorta.backends.qpid_proton.receiver import Receiver
+from aorta.event import LazyEvent
+
+
+class StubReactor:
+
+    def __init__(self):
+        self.scheduled = []
+
+    def call(self, func, *args):
+        if func.__name__ != 'open':
+            func(*args)
+
+    def schedule(self, delay, func, *args):
+        self.scheduled.append((delay, func, args))
+
+
+class StubBackend:
+
+    def __init__(self):
+        self.reactor = StubReactor()
+        self.metrics = Metrics()
+        self.received = []
+        self.seen = set()
+
+    def get_reactor(self, address):
+        return self.reactor
+
+    def is_duplicate(self, dsn, message_id):
+        duplicate = message_id in self.seen
+        self.seen.add(message_id)
+        return duplicate
+
+    def forget_message(self, dsn, message_id):
+        self.seen.discard(message_id)
+
+    def put(self, receiver, message):
+        self.received.append(message)
+
+
+class StubLink:
+
+    def __init__(self):
+        self.credit = 0
+        self.flowed = []
+
+    def flow(self, n):
+        self.flowed.append(n)
+        self.credit += n
+
+
+class StubMessage:
+    content_type = None
+
+    def __init__(self, id):
+        self.id = id
+
+
+class StubDelivery:
+
+    def __init__(self):
+        self.state = None
+        self.settled = False
+
+    def update(self, state):
+        self.state = state
+
+    def settle(self):
+        self.settled = True
+
+
+class StubEvent:
+
+    def __init__(self, message, delivery=None):
+        self.message = message
+        self.delivery = delivery
+
+
+class ReceiverCreditTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = StubBackend()
+        self.receiver = Receiver(self.backend, 'localhost', 5672, 'foo',
+            options={'high_watermark': 10, 'low_watermark': 5})
+        self.link = self.receiver.receiver = StubLink()
+        self.receiver.replenish()
+
+    def deliver(self, message_id):
+        self.link.credit -= 1
+        self.receiver.on_message(StubEvent(StubMessage(message_id)))
+
+    def test_initial_credit_is_high_watermark(self):
+        self.assertEqual(self.link.flowed, [10])
+
+    def test_invalid_watermarks_raise(self):
+        with self.assertRaises(ValueError):
+            Receiver(self.backend, 'localhost', 5672, 'foo',
+                options={'high_watermark': 5, 'low_watermark': 5})
+
+    def test_credit_stalls_above_low_watermark(self):
+        for i in range(10):
+            self.deliver(i)
+        self.assertEqual(self.link.flowed, [10])
+        self.assertEqual(self.receiver.pending, 10)
+        self.assertTrue(self.receiver.stalled)
+        self.assertEqual(self.receiver.stalls.value, 1)
+
+    def test_credit_resumes_at_low_watermark(self):
+        for i in range(10):
+            self.deliver(i)
+        self.receiver.notify_dispatched(self.backend.received[:4])
+        self.assertEqual(self.link.flowed, [10])
+        self.receiver.notify_dispatched(self.backend.received[4:5])
+        self.assertEqual(self.link.flowed, [10, 5])
+        self.assertEqual(self.link.credit + self.receiver.pending, 10)
+
+    def test_duplicates_are_not_queued(self):
+        self.deliver(1)
+        self.deliver(1)
+        self.assertEqual(len(self.backend.received), 1)
+        self.assertEqual(self.receiver.pending, 1)
+
+    def test_duplicates_replenish_credit(self):
+        for i in range(6):
+            self.deliver(0)
+        self.assertEqual(self.receiver.pending, 1)
+        self.assertEqual(self.link.credit + self.receiver.pending, 10)
+
+
+class ReceiverSettlementTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = StubBackend()
+        self.receiver = Receiver(self.backend, 'localhost', 5672, 'foo',
+            options={'settlement': 'dispatch', 'settle_batch_size': 3})
+        self.receiver.receiver = StubLink()
+
+    def deliver(self, message_id):
+        delivery = StubDelivery()
+        self.receiver.on_message(
+            StubEvent(StubMessage(message_id), delivery))
+        return delivery
+
+    def is_auto_accepting(self, receiver):
+        return all(x.auto_accept for x in receiver.handlers
+            if isinstance(x, IncomingMessageHandler))
+
+    def test_auto_accept_by_default(self):
+        receiver = Receiver(self.backend, 'localhost', 5672, 'foo')
+        self.assertEqual(receiver.settlement, 'receive')
+        self.assertTrue(self.is_auto_accepting(receiver))
+
+    def test_dispatch_settlement_disables_auto_accept(self):
+        self.assertFalse(self.is_auto_accepting(self.receiver))
+
+    def test_invalid_settlement_raises(self):
+        with self.assertRaises(ValueError):
+            Receiver(self.backend, 'localhost', 5672, 'foo',
+                options={'settlement': 'never'})
+
+    def test_messages_are_not_accepted_before_dispatch(self):
+        delivery = self.deliver(1)
+        self.assertFalse(delivery.settled)
+
+    def test_dispositions_are_scheduled(self):
+        delivery = self.deliver(1)
+        self.receiver.notify_dispatched(self.backend.received)
+        self.assertFalse(delivery.settled)
+        self.assertEqual(len(self.backend.reactor.scheduled), 1)
+
+        delay, func, args = self.backend.reactor.scheduled[0]
+        self.assertEqual(delay, self.receiver.settle_interval)
+        func(*args)
+        self.assertTrue(delivery.settled)
+        self.assertEqual(delivery.state, Delivery.ACCEPTED)
+
+    def test_dispositions_are_scheduled_once(self):
+        self.deliver(1)
+        self.deliver(2)
+        for message in self.backend.received:
+            self.receiver.notify_dispatched([message])
+        self.assertEqual(len(self.backend.reactor.scheduled), 1)
+
+    def test_dispositions_are_sent_in_batches(self):
+        deliveries = [self.deliver(i) for i in range(3)]
+        self.receiver.notify_dispatched(self.backend.received)
+        self.assertTrue(all(x.settled for x in deliveries))
+        self.assertEqual(self.backend.reactor.scheduled, [])
+
+    def test_failed_messages_are_released(self):
+        failed = self.deliver(1)
+        accepted = self.deliver(2)
+        self.receiver.notify_failed(self.backend.received[:1])
+        self.receiver.notify_dispatched(self.backend.received)
+        self.receiver.flush_dispositions()
+        self.assertEqual(failed.state, Delivery.MODIFIED)
+        self.assertEqual(accepted.state, Delivery.ACCEPTED)
+        self.assertEqual(self.receiver.failed, set())
+
+    def test_failed_messages_are_not_duplicates_when_redelivered(self):
+        self.deliver(1)
+        self.receiver.notify_failed(self.backend.received)
+        self.receiver.notify_dispatched(self.backend.received)
+        self.deliver(1)
+        self.assertEqual(len(self.backend.received), 2)
+
+    def test_duplicates_are_accepted(self):
+        self.deliver(1)
+        delivery = self.deliver(1)
+        self.assertEqual(delivery.state, Delivery.ACCEPTED)
+        self.assertEqual(len(self.backend.received), 1)
+
+    def test_close_settles_dispatched_messages(self):
+        self.receiver.connection = None
+        self.receiver.reactor.disconnect = lambda connection: None
+        self.receiver.receiver.close = lambda: None
+        delivery = self.deliver(1)
+        self.receiver.notify_dispatched(self.backend.received)
+        self.receiver.close()
+        self.assertTrue(delivery.settled)
+
+    def test_malformed_messages_are_rejected(self):
+        delivery = StubDelivery()
+        msg = Message(id=1, body=None, properties={'event_type': 'foo'})
+        self.receiver.on_message(StubEvent(msg, delivery))
+        with self.assertLogs('aorta.incoming', level='WARNING'):
+            self.assertEqual(self.receiver.decode(self.backend.received), [])
+        self.receiver.notify_dispatched(self.backend.received)
+        self.receiver.flush_dispositions()
+        self.assertEqual(delivery.state, Delivery.REJECTED)
+        self.assertEqual(self.receiver.rejected, set())
+        self.assertNotIn(1, self.backend.seen)
+
+    def test_undecodable_messages_are_rejected(self):
+        delivery = StubDelivery()
+        msg = Message(id=1, body=b'{', content_type='application/json')
+        self.receiver.on_message(StubEvent(msg, delivery))
+        with self.assertLogs('aorta.incoming', level='ERROR'):
+            self.assertEqual(self.receiver.decode(self.backend.received), [])
+        self.receiver.notify_dispatched(self.backend.received)
+        self.receiver.flush_dispositions()
+        self.assertEqual(delivery.state, Delivery.REJECTED)
+
+    def test_failures_are_ignored_with_receive_settlement(self):
+        receiver = Receiver(self.backend, 'localhost', 5672, 'foo')
+        receiver.notify_failed([StubMessage(1)])
+        self.assertEqual(receiver.failed, set())
+
+
+class ReceiverEnvelopeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = StubBackend()
+        self.receiver = self.get_receiver('dispatch')
+
+    def get_receiver(self, settlement):
+        receiver = Receiver(self.backend, 'localhost', 5672, 'foo',
+            options={'settlement': settlement, 'settle_batch_size': 1})
+        receiver.receiver = StubLink()
+        return receiver
+
+    def deliver(self, *message_ids, receiver=None):
+        body = [Message(id=x, body=x).encode() for x in message_ids]
+        delivery = StubDelivery()
+        (receiver or self.receiver).on_message(StubEvent(
+            Message(body=body, content_type=envelope.CONTENT_TYPE), delivery))
+        return delivery
+
+    def test_envelope_is_unpacked(self):
+        receiver = self.get_receiver('receive')
+        self.deliver('a', 'b', receiver=receiver)
+        self.assertEqual([x.body for x in self.backend.received], ['a', 'b'])
+        self.assertEqual(receiver.pending, 2)
+
+    def test_duplicates_are_discarded(self):
+        self.deliver('a', 'b')
+        self.deliver('b', 'c')
+        self.assertEqual([x.id for x in self.backend.received], ['a', 'b', 'c'])
+
+    def test_envelope_of_duplicates_is_accepted(self):
+        self.deliver('a')
+        delivery = self.deliver('a')
+        self.assertEqual(delivery.state, Delivery.ACCEPTED)
+
+    def test_envelope_is_settled_once_dispatched(self):
+        delivery = self.deliver('a', 'b')
+        a, b = self.backend.received
+        self.receiver.notify_dispatched([a])
+        self.assertFalse(delivery.settled)
+        self.receiver.notify_dispatched([b])
+        self.assertEqual(delivery.state, Delivery.ACCEPTED)
+
+    def test_envelope_is_released_if_a_message_failed(self):
+        delivery = self.deliver('a', 'b')
+        a, b = self.backend.received
+        self.receiver.notify_failed([a])
+        self.receiver.notify_dispatched([a, b])
+        self.assertEqual(delivery.state, Delivery.MODIFIED)
+
+        # Only the failed message is dispatched again.
+        self.deliver('a', 'b')
+        self.assertEqual([x.id for x in self.backend.received], ['a', 'b', 'a'])
+
+    def test_envelope_is_rejected_if_a_message_is_malformed(self):
+        delivery = self.deliver('a', 'b')
+        a, b = self.backend.received
+        self.receiver.notify_rejected(b)
+        self.receiver.notify_dispatched([a, b])
+        self.assertEqual(delivery.state, Delivery.REJECTED)
+
+    def test_release_takes_precedence_over_rejection(self):
+        delivery = self.deliver('a', 'b')
+        a, b = self.backend.received
+        self.receiver.notify_rejected(a)
+        self.receiver.notify_failed([b])
+        self.receiver.notify_dispatched([a, b])
+        self.assertEqual(delivery.state, Delivery.MODIFIED)
+
+    def test_malformed_envelope_is_rejected(self):
+        delivery = StubDelivery()
+        event = StubEvent(Message(body=1,
+            content_type=envelope.CONTENT_TYPE), delivery)
+        with self.assertLogs('aorta.incoming', level='ERROR'):
+            self.receiver.on_message(event)
+        self.assertEqual(delivery.state, Delivery.REJECTED)
+        self.assertEqual(self.backend.received, [])
+
+    def test_malformed_envelope_is_accepted_with_receive_settlement(self):
+        receiver = self.get_receiver('receive')
+        event = StubEvent(Message(body=1,
+            content_type=envelope.CONTENT_TYPE), StubDelivery())
+        with self.assertLogs('aorta.incoming', level='ERROR'):
+            receiver.on_message(event)
+        self.assertEqual(self.backend.received, [])
+
+
+class ReceiverDecodeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.receiver = Receiver(StubBackend(), 'localhost', 5672, 'foo')
+
+    def test_plain_messages_are_decoded(self):
+        msg = Message(body=b'{"foo": 1}', content_type='application/json')
+        decoded, = self.receiver.decode([msg])
+        self.assertEqual(decoded.body, {'foo': 1})
+
+    def test_events_are_decoded_lazily(self):
+        properties = {
+            'sender_id': uuid.uuid4().hex,
+            'event_id': uuid.uuid4().hex,
+            'event_type': 'orders.OrderCreated'
+        }
+        msg = Message(body=b'{"foo": 1}', content_type='application/json',
+            properties=properties)
+        event, = self.receiver.decode([msg])
+        self.assertIsInstance(event, LazyEvent)
+        self.assertEqual(msg.body, b'{"foo": 1}')
+        self.assertEqual(event.body, {'foo': 1})
+
+    def test_compressed_messages_are_decompressed(self):
+        msg = Message(body=zlib.compress(b'{"foo": 1}'),
+            content_type='application/json', content_encoding='deflate')
+        decoded, = self.receiver.decode([msg])
+        self.assertEqual(decoded.body, {'foo': 1})
+        snapshot = self.receiver.backend.metrics.snapshot()
+        self.assertIn('aorta_decompression_seconds_total', snapshot)
+
+    def test_malformed_events_are_dropped(self):
+        msg = Message(body=None, properties={'event_type': 'foo'})
+        with self.assertLogs('aorta.incoming', level='WARNING'):
+            self.assertEqual(self.receiver.decode([msg]), [])
+        self.assertEqual(self.receiver.rejected, set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,280 @@
+import threading
+import unittest
+
+from proton import Message as ProtonMessage
+
+from aorta.backends.future import SendFuture
+from aorta.backends.metrics import Metrics
+from aorta.backends.qpid_proton import envelope
+from aorta.backends.qpid_proton.sender import BatchTimeout
+from aorta.backends.qpid_proton.sender import Sender
+from aorta.message import Message
+
+
+class StubTask:
+
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class StubReactor:
+
+    def __init__(self):
+        self.scheduled = []
+
+    def call(self, func, *args):
+        if func.__name__ != 'open':
+            func(*args)
+
+    def schedule(self, delay, func, *args):
+        self.func = func
+        self.args = args
+        self.task = StubTask()
+        self.scheduled.append((delay, func, args))
+        return self.task
+
+
+class StubOutbox:
+
+    def __init__(self):
+        self.removed = []
+
+    def append(self, dsn, messages, func, *args):
+        func(*args)
+
+    def remove(self, message_id):
+        self.removed.append(message_id)
+
+
+class StubBackend:
+
+    def __init__(self, outbox=None):
+        self.reactor = StubReactor()
+        self.metrics = Metrics()
+        self.outbox = outbox
+        self.deliveries = 0
+
+    def get_reactor(self, address, connection=0):
+        return self.reactor
+
+    def register_delivery(self):
+        self.deliveries += 1
+
+
+class StubDelivery:
+
+    def __init__(self, tag):
+        self.tag = tag
+
+
+class StubLink:
+
+    def __init__(self, credit=100):
+        self.credit = credit
+        self.transfers = []
+        self.tags = 0
+
+    def delivery_tag(self):
+        self.tags += 1
+        return str(self.tags)
+
+    def delivery(self, tag):
+        self.transfers.append([tag, b''])
+        return StubDelivery(tag)
+
+    def stream(self, data):
+        self.transfers[-1][1] += data
+
+    def advance(self):
+        self.credit -= 1
+
+
+class BatchTimeoutTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.reactor = StubReactor()
+        condition = threading.Condition()
+        self.futures = [SendFuture(str(i), condition) for i in range(3)]
+        self.timeout = BatchTimeout(self.reactor, 1.0, self.futures)
+
+    def test_expire_resolves_pending_futures(self):
+        self.futures[0].resolve(SendFuture.ACCEPTED)
+        self.reactor.func(*self.reactor.args)
+        self.assertEqual([x.state for x in self.futures],
+            [SendFuture.ACCEPTED, SendFuture.TIMEOUT, SendFuture.TIMEOUT])
+
+    def test_timer_is_cancelled_when_all_futures_are_resolved(self):
+        for future in self.futures[:-1]:
+            future.resolve(SendFuture.ACCEPTED)
+        self.assertFalse(self.reactor.task.cancelled)
+        self.futures[-1].resolve(SendFuture.REJECTED)
+        self.assertTrue(self.reactor.task.cancelled)
+
+
+class StubEvent:
+
+    def __init__(self, tag):
+        self.delivery = StubDelivery(tag)
+
+
+class SenderSettlementTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = StubBackend()
+        self.sender = Sender(self.backend, 'localhost', 5672, 'foo')
+        self.sender.sender = StubLink()
+
+    def send(self):
+        future, = self.sender.queue_many([Message(id='1', body=1)])
+        (tag, data), = self.sender.sender.transfers
+        return tag, future
+
+    def test_accepted(self):
+        tag, future = self.send()
+        self.sender.on_accepted(StubEvent(tag))
+        self.assertEqual(future.state, SendFuture.ACCEPTED)
+        self.assertEqual(self.sender.in_flight, 0)
+
+    def test_accepted_messages_are_removed_from_outbox(self):
+        self.backend.outbox = StubOutbox()
+        tag, future = self.send()
+        self.sender.on_accepted(StubEvent(tag))
+        self.assertEqual(self.backend.outbox.removed, ['1'])
+
+    def test_recorded_messages_are_not_recorded_again(self):
+        self.backend.outbox = StubOutbox()
+        self.backend.outbox.append = None
+        self.sender.queue_many([Message(id='1', body=1)], recorded=True)
+        self.assertEqual(len(self.sender.sender.transfers), 1)
+
+    def test_send_many_stops_waiting_at_timeout(self):
+        futures = self.sender.send_many(
+            [Message(id=str(i), body=i) for i in range(2)], timeout=1)
+        self.assertFalse(any(x.done() for x in futures))
+
+    def test_rejected(self):
+        tag, future = self.send()
+        with self.assertLogs('aorta.outgoing', level='WARNING'):
+            self.sender.on_rejected(StubEvent(tag))
+        self.assertEqual(future.state, SendFuture.REJECTED)
+
+    def test_released(self):
+        tag, future = self.send()
+        with self.assertLogs('aorta.outgoing', level='WARNING'):
+            self.sender.on_released(StubEvent(tag))
+        self.assertEqual(future.state, SendFuture.RELEASED)
+        self.assertEqual(self.backend.reactor.scheduled, [])
+
+
+class SenderLingerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = StubBackend()
+        self.sender = self.get_sender(self.backend)
+
+    def get_sender(self, backend, **kwargs):
+        kwargs.setdefault('linger', 0.005)
+        kwargs.setdefault('linger_size', 3)
+        sender = Sender(backend, 'localhost', 5672, 'foo', **kwargs)
+        sender.sender = StubLink()
+        return sender
+
+    def send(self, n, sender=None):
+        messages = [Message(id=str(i), body=i) for i in range(n)]
+        return (sender or self.sender).queue_many(messages)
+
+    def unpack(self, data):
+        msg = ProtonMessage()
+        msg.decode(data)
+        self.assertTrue(envelope.is_envelope(msg))
+        return [x.body for x in envelope.unpack(msg)]
+
+    def expire(self):
+        delay, func, args = self.backend.reactor.scheduled.pop(0)
+        self.assertEqual(delay, 0.005)
+        func(*args)
+
+    def test_invalid_linger_size_raises(self):
+        with self.assertRaises(ValueError):
+            self.get_sender(self.backend, linger_size=0)
+
+    def test_messages_linger(self):
+        self.send(2)
+        self.assertEqual(self.sender.sender.transfers, [])
+        self.assertEqual(self.sender.in_flight, 2)
+        self.expire()
+        (tag, data), = self.sender.sender.transfers
+        self.assertEqual(self.unpack(data), [0, 1])
+        self.assertEqual(self.sender.in_flight, 1)
+
+    def test_full_envelopes_are_transferred(self):
+        self.send(7)
+        self.assertEqual([self.unpack(x[1]) for x in self.sender.sender.transfers],
+            [[0, 1, 2], [3, 4, 5]])
+        self.assertEqual(len(self.backend.reactor.scheduled), 1)
+        self.expire()
+        self.assertEqual(len(self.sender.sender.transfers), 3)
+
+    def test_timer_is_scheduled_once(self):
+        self.send(1)
+        self.send(1)
+        self.assertEqual(len(self.backend.reactor.scheduled), 1)
+
+    def test_timer_without_lingering_messages(self):
+        self.send(1)
+        self.sender.flush_lingering()
+        self.expire()
+        self.assertEqual(len(self.sender.sender.transfers), 1)
+
+    def test_single_message_is_not_enveloped(self):
+        self.send(1)
+        self.expire()
+        (tag, data), = self.sender.sender.transfers
+        msg = ProtonMessage()
+        msg.decode(data)
+        self.assertFalse(envelope.is_envelope(msg))
+        self.assertEqual(msg.id, '0')
+
+    def test_resolved_envelopes_are_not_transferred(self):
+        futures = self.send(2)
+        for future in futures:
+            future.resolve(SendFuture.TIMEOUT)
+        self.expire()
+        self.assertEqual(self.sender.sender.transfers, [])
+
+    def test_accepted_envelope_resolves_futures(self):
+        futures = self.send(3)
+        (tag, data), = self.sender.sender.transfers
+        self.sender.notify_accepted(tag)
+        self.assertTrue(all(x.accepted for x in futures))
+        self.assertEqual(self.backend.deliveries, 3)
+        self.sender.notify_accepted(tag)
+        self.assertEqual(self.backend.deliveries, 3)
+
+    def test_rejected_envelope_resolves_futures(self):
+        backend = StubBackend(StubOutbox())
+        sender = self.get_sender(backend)
+        futures = self.send(3, sender)
+        (tag, data), = sender.sender.transfers
+        sender.notify_settled(tag, SendFuture.REJECTED)
+        self.assertEqual([x.state for x in futures], [SendFuture.REJECTED] * 3)
+        self.assertEqual(backend.outbox.removed, ['0', '1', '2'])
+        self.assertEqual(backend.reactor.scheduled, [])
+
+    def test_released_envelope_is_retried(self):
+        backend = StubBackend(StubOutbox())
+        sender = self.get_sender(backend)
+        futures = self.send(3, sender)
+        (tag, data), = sender.sender.transfers
+        sender.notify_settled(tag, SendFuture.RELEASED)
+        self.assertEqual([x.state for x in futures], [SendFuture.RELEASED] * 3)
+        (delay, func, args), = backend.reactor.scheduled
+        func(*args)
+        self.assertEqual(self.unpack(sender.sender.transfers[-1][1]), [0, 1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()